@@ -1,5 +1,6 @@
 import streamlit as st
-from src.generator import search_documents
+from src.generator import search_documents, search_documents_progressive, search_languages, warm_up_retriever
+from src.retriever import FUSED_STAGE
 
 st.set_page_config(
     page_title="Transformers Documentation Assistant",
@@ -7,11 +8,48 @@ st.set_page_config(
     layout="wide"
 )
 
+# Load indexes and models in the background so the page renders immediately
+warm_up_retriever()
+
 # Sidebar settings
 st.sidebar.header("Search Settings")
 top_k = st.sidebar.slider("Number of contexts to retrieve", 1, 15, 10, key="top_k")
 alpha = st.sidebar.slider("Dense vs Sparse balance (α)", 0.0, 1.0, 0.7, 
                          help="0.0 = pure BM25, 1.0 = pure FAISS", key="alpha")
+fusion = st.sidebar.selectbox("Score fusion", ["minmax", "zscore", "rrf", "sum"],
+                              help="How BM25 and FAISS scores are combined before reranking", key="fusion")
+language = st.sidebar.selectbox("Docs language", ["auto", "all", *search_languages()],
+                                help="Translation to search; auto detects it from the query", key="language")
+expand_aliases = st.sidebar.checkbox("Show duplicate copies", value=False,
+                                     help="List other files containing a near-identical passage", key="expand_aliases")
+progressive = st.sidebar.checkbox("Progressive results", value=True,
+                                  help="Show fused results right away, then replace them once reranking finishes",
+                                  key="progressive")
+
+def render_results(results: list, note: str = None) -> None:
+    """Show search results as expanders, the first three open."""
+    st.success(f"Found {len(results)} relevant documentation sections")
+    if note:
+        st.caption(note)
+
+    for i, result in enumerate(results, 1):
+        # Build GitHub URL
+        raw = result['source']
+        file_path = raw.rsplit("_", 1)[0].replace("\\", "/")
+        gh_url = f"https://github.com/huggingface/transformers/blob/main/docs/{file_path}"
+
+        # Use a simple title so link clicks inside the body don't toggle
+        with st.expander(f"📄 Result {i}", expanded=(i <= 3)):
+            # Render the clickable link inside the expander
+            st.markdown(f"[{file_path}]({gh_url}){{:target=\"_blank\"}}", unsafe_allow_html=True)
+            if result.get('heading_path'):
+                st.caption(result['heading_path'])
+            if result.get('aliases'):
+                st.caption("Also in: " + ", ".join(result['aliases']))
+            st.markdown("**Relevance Score:** {:.4f}".format(result.get('score', 0.0)))
+            st.markdown("**Content:**")
+            st.markdown(result['content'])
+            st.markdown("---")
 
 st.title("📚 Transformers Documentation Assistant")
 st.subheader("Retrieval-Augmented Search")
@@ -25,28 +63,27 @@ query = st.text_input(
 )
 
 if st.button("🔍 Search Documentation", key="search_button") and query:
-    with st.spinner("Searching documentation..."):
-        results = search_documents(query, top_k=top_k, alpha=alpha)
-    
-    if results:
-        st.success(f"Found {len(results)} relevant documentation sections")
-        
-        for i, result in enumerate(results, 1):
-            # Build GitHub URL
-            raw = result['source']
-            file_path = raw.rsplit("_", 1)[0].replace("\\", "/")
-            gh_url = f"https://github.com/huggingface/transformers/blob/main/docs/{file_path}"
-
-            # Use a simple title so link clicks inside the body don't toggle
-            with st.expander(f"📄 Result {i}", expanded=(i <= 3)):
-                # Render the clickable link inside the expander
-                st.markdown(f"[{file_path}]({gh_url}){{:target=\"_blank\"}}", unsafe_allow_html=True)
-                st.markdown("**Relevance Score:** {:.4f}".format(result.get('score', 0.0)))
-                st.markdown("**Content:**")
-                st.markdown(result['content'])
-                st.markdown("---")
+    if progressive:
+        # Fused results are drawn as soon as they arrive; the reranked ones replace them in place
+        placeholder = st.empty()
+        results = None
+        with st.spinner("Searching documentation..."):
+            for stage, results in search_documents_progressive(query, top_k=top_k, alpha=alpha, fusion=fusion,
+                                                               language=language, expand_aliases=expand_aliases):
+                if results:
+                    with placeholder.container():
+                        render_results(results, "Reranking…" if stage == FUSED_STAGE else None)
+        if not results:
+            placeholder.warning("No relevant documentation found. Try rephrasing your query.")
     else:
-        st.warning("No relevant documentation found. Try rephrasing your query.")
+        with st.spinner("Searching documentation..."):
+            results = search_documents(query, top_k=top_k, alpha=alpha, fusion=fusion, language=language,
+                                       expand_aliases=expand_aliases)
+
+        if results:
+            render_results(results)
+        else:
+            st.warning("No relevant documentation found. Try rephrasing your query.")
 
 
 # Sample questions
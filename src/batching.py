@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from src.metrics import REGISTRY, Histogram, BATCH_SIZE_BUCKETS, LATENCY_MS_BUCKETS
+
+# Defaults for the shared model schedulers
+MAX_BATCH_SIZE = 64
+MAX_WAIT_MS = 2.0
+
+class BatchScheduler:
+    """
+    Collect concurrent model calls into shared batches.
+
+    Callers submit a list of items and block until their slice of the batch
+    result is ready. A worker thread takes the oldest request, then keeps
+    adding queued requests for up to max_wait_ms or until max_batch_size
+    items are collected, and runs `fn` once on the concatenated items. One
+    caller's items are never split across batches, so a single large
+    submission may exceed max_batch_size.
+
+    Batch sizes (items) and queue waits (ms) are recorded in histograms,
+    exported as docu_rag_model_batch_size / docu_rag_model_queue_wait_ms
+    labelled with the scheduler name.
+    """
+
+    def __init__(self, fn: Callable[[List], Sequence], max_batch_size: int = MAX_BATCH_SIZE,
+                 max_wait_ms: float = MAX_WAIT_MS, name: str = "batch"):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(LATENCY_MS_BUCKETS)
+        REGISTRY.register("model_batch_size", "Items per batched model call", self.batch_sizes, model=name)
+        REGISTRY.register("model_queue_wait_ms", "Time requests waited for a model batch", self.queue_wait_ms,
+                          model=name)
+        self.requests = 0
+        self.batches = 0
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+
+    def submit(self, items: List) -> Sequence:
+        """Run fn on items as part of a shared batch and return the aligned results."""
+        if not items:
+            return self.fn([])
+        future = Future()
+        with self._cond:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=f"{self.name}-scheduler", daemon=True)
+                self._worker.start()
+            self._queue.append((list(items), future, time.perf_counter()))
+            self.requests += 1
+            self._cond.notify()
+        return future.result()
+
+    def _collect(self) -> List:
+        """Block for the next batch of queued requests."""
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            batch = [self._queue.popleft()]
+            size = len(batch[0][0])
+            deadline = time.perf_counter() + self.max_wait
+            while size < self.max_batch_size:
+                if self._queue:
+                    if size + len(self._queue[0][0]) > self.max_batch_size:
+                        break
+                    batch.append(self._queue.popleft())
+                    size += len(batch[-1][0])
+                    continue
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            items = [item for request_items, _, _ in batch for item in request_items]
+            self.batches += 1
+            self.batch_sizes.observe(len(items))
+            for _, _, enqueued_at in batch:
+                self.queue_wait_ms.observe((started - enqueued_at) * 1000.0)
+            try:
+                results = self.fn(items)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            offset = 0
+            for request_items, future, _ in batch:
+                future.set_result(results[offset:offset + len(request_items)])
+                offset += len(request_items)
+
+    def stats(self) -> Dict:
+        """Return request/batch counts and the batch-size and queue-wait histograms."""
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'batch_size': self.batch_sizes.snapshot(),
+            'queue_wait_ms': self.queue_wait_ms.snapshot(),
+        }
+
+class BatchedEncoder:
+    """
+    SentenceTransformer proxy whose encode() goes through a BatchScheduler.
+
+    encode() always returns normalized float32 numpy embeddings, the only
+    form the retriever asks for. Other attributes pass through to the model.
+    """
+
+    def __init__(self, model, max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS):
+        self.model = model
+        self.scheduler = BatchScheduler(self._encode_batch, max_batch_size, max_wait_ms, name="embed")
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=self.scheduler.max_batch_size, show_progress_bar=False,
+                                 convert_to_numpy=True, normalize_embeddings=True).astype('float32')
+
+    def encode(self, texts: List[str], **kwargs) -> np.ndarray:
+        return np.asarray(self.scheduler.submit(list(texts)))
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+class BatchedCrossEncoder:
+    """CrossEncoder proxy whose predict() goes through a BatchScheduler."""
+
+    def __init__(self, model, max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS):
+        self.model = model
+        self.scheduler = BatchScheduler(self._predict_batch, max_batch_size, max_wait_ms, name="rerank")
+
+    def _predict_batch(self, pairs: List) -> np.ndarray:
+        return np.asarray(self.model.predict(pairs, batch_size=self.scheduler.max_batch_size,
+                                             show_progress_bar=False))
+
+    def predict(self, pairs: List, **kwargs) -> np.ndarray:
+        return np.asarray(self.scheduler.submit(list(pairs)))
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
@@ -0,0 +1,312 @@
+import argparse
+import json
+import math
+import platform
+import resource
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.bm25_native import analyze
+from src.chunk_store import ChunkStore, CHUNK_STORE_DIR
+from src.dedup import indexed_rows
+from src.retriever import Retriever, SearchSettings
+
+# Define paths
+ROOT = Path(__file__).parent.parent
+EVAL_QUERIES_FILE = ROOT / "data" / "eval" / "queries.jsonl"
+RESULTS_DIR = ROOT / "benchmarks"
+
+STAGES = ("bm25", "encode", "faiss", "fusion", "rerank", "total")
+
+# ----------------------------------------------------------------------
+# Query sets
+# ----------------------------------------------------------------------
+
+def load_query_set(path: Path) -> List[Dict]:
+    """
+    Load a JSONL query set.
+
+    Each line holds a "query" plus its relevance labels, either chunk ids
+    ("relevant_ids") or doc paths ("relevant_files"). Labels are a list
+    (grade 1 each) or a {label: grade} object for graded relevance.
+    """
+    queries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if 'query' not in entry or not ('relevant_ids' in entry or 'relevant_files' in entry):
+                raise ValueError(f"{path}:{line_no}: expected 'query' and 'relevant_ids' or 'relevant_files'")
+            queries.append(entry)
+    return queries
+
+def generate_query_set(path: Path, num_queries: int = 200, seed: int = 0) -> List[Dict]:
+    """
+    Write a synthetic known-item query set: 3-5 terms drawn from a random
+    indexed chunk, labelled with that chunk's id and doc. Useful for regression
+    checks; hand-labelled questions give more meaningful quality numbers.
+    """
+    chunks = ChunkStore(CHUNK_STORE_DIR)
+    rng = np.random.default_rng(seed)
+    queries = []
+    rows = indexed_rows(chunks)
+    for row in rng.choice(rows, size=min(num_queries, len(rows)), replace=False):
+        terms = sorted(set(t for t in analyze(chunks.content(int(row))) if len(t) > 3 and not t.isdigit()))
+        if len(terms) < 3:
+            continue
+        size = int(rng.integers(3, 6))
+        queries.append({
+            'query': " ".join(rng.choice(terms, size=min(size, len(terms)), replace=False)),
+            'relevant_ids': [chunks.get('id', int(row))],
+            'relevant_files': [chunks.get('source_file', int(row))],
+        })
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for entry in queries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    print(f"Wrote {len(queries)} queries to {path}")
+    return queries
+
+# ----------------------------------------------------------------------
+# Metrics
+# ----------------------------------------------------------------------
+
+def relevance_labels(entry: Dict) -> Tuple[str, Dict[str, float]]:
+    """Return the result field to match ('id' or 'source_file') and label -> grade."""
+    field, labels = ('id', entry['relevant_ids']) if 'relevant_ids' in entry else ('source_file', entry['relevant_files'])
+    if isinstance(labels, dict):
+        return field, {label: float(grade) for label, grade in labels.items()}
+    return field, {label: 1.0 for label in labels}
+
+def quality_metrics(ranked: List[str], grades: Dict[str, float], k: int) -> Dict[str, float]:
+    """recall@k, reciprocal rank and nDCG@k for one ranked list of labels (repeats count once)."""
+    seen, gains = set(), []
+    first_hit = None
+    for rank, label in enumerate(ranked[:k], 1):
+        gain = grades.get(label, 0.0) if label not in seen else 0.0
+        seen.add(label)
+        gains.append(gain)
+        if gain > 0 and first_hit is None:
+            first_hit = rank
+    dcg = sum((2 ** g - 1) / math.log2(i + 2) for i, g in enumerate(gains))
+    ideal = sorted(grades.values(), reverse=True)[:k]
+    idcg = sum((2 ** g - 1) / math.log2(i + 2) for i, g in enumerate(ideal))
+    relevant = {label for label, grade in grades.items() if grade > 0}
+    return {
+        f'recall@{k}': len(relevant & seen) / len(relevant) if relevant else 0.0,
+        'mrr': 1.0 / first_hit if first_hit else 0.0,
+        f'ndcg@{k}': dcg / idcg if idcg > 0 else 0.0,
+    }
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    """Return mean/p50/p95/p99 in milliseconds."""
+    if not seconds:
+        return {}
+    ms = np.asarray(seconds) * 1000.0
+    return {'mean_ms': float(ms.mean()), 'p50_ms': float(np.percentile(ms, 50)),
+            'p95_ms': float(np.percentile(ms, 95)), 'p99_ms': float(np.percentile(ms, 99))}
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# ----------------------------------------------------------------------
+# Benchmark
+# ----------------------------------------------------------------------
+
+def run_staged(retriever: Retriever, query: str, settings: SearchSettings) -> Tuple[List[Dict], Dict[str, float], Dict]:
+    """Run retrieve()'s pipeline stage by stage, returning results, stage timings and candidate lists."""
+    timings = {}
+    start = time.perf_counter()
+    route = retriever.route(query, settings.language)
+    sparse = retriever._bm25_search(query, settings.sparse_depth, route)
+    timings['bm25'] = time.perf_counter() - start
+
+    t = time.perf_counter()
+    q_emb = retriever._encode_queries([query])
+    timings['encode'] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    dense = retriever._dense_candidates(q_emb, settings, [route])[0]
+    timings['faiss'] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    prelim = retriever._fuse_candidates(sparse, dense, settings)
+    timings['fusion'] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    rerank_scores = retriever._rerank(query, prelim, settings.top_k)
+    results = retriever._build_results(prelim, rerank_scores, settings.top_k, settings.expand_aliases)
+    timings['rerank'] = time.perf_counter() - t
+    timings['total'] = time.perf_counter() - start
+
+    candidates = {'bm25': sparse[0].tolist(), 'faiss': dense[0].tolist(), 'pool': [row for row, _ in prelim]}
+    return results, timings, candidates
+
+def run_benchmark(query_set: List[Dict], top_k: int = 10, alpha: float = 0.7, fusion: Optional[str] = None,
+                  sparse_depth: Optional[int] = None, dense_depth: Optional[int] = None,
+                  workers: List[int] = (1, 8), warmup: int = 5, language: Optional[str] = None,
+                  **retriever_kwargs) -> Dict:
+    """
+    Measure per-stage latency, concurrent throughput, memory and retrieval quality.
+
+    Caches are disabled so every query runs the full pipeline. Quality is
+    reported for the final results and, as recall, for each candidate list
+    (BM25, FAISS and the fused rerank pool) at their full depth.
+
+    Args:
+        query_set: Entries from load_query_set
+        top_k: Results per query (the k of recall@k and nDCG@k)
+        alpha, fusion, sparse_depth, dense_depth, language: Retrieval settings
+        workers: Concurrency levels for the throughput runs
+        warmup: Queries run before measuring
+        **retriever_kwargs: Passed to Retriever (e.g. bm25_backend, inference_backend, languages)
+
+    Returns:
+        Machine-readable result dict
+    """
+    retriever = Retriever(result_cache_size=0, query_embedding_cache_size=0, rerank_cache_size=0,
+                          semantic_cache_size=0, **retriever_kwargs)
+    settings = retriever.search_settings(top_k, alpha, fusion=fusion, sparse_depth=sparse_depth,
+                                         dense_depth=dense_depth, language=language)
+    retriever.warm_up(background=False)
+    chunk_store = retriever.chunk_store
+    for entry in query_set[:warmup]:
+        retriever.retrieve(entry['query'], top_k, alpha, fusion=fusion, sparse_depth=sparse_depth,
+                           dense_depth=dense_depth, language=language)
+
+    # Sequential staged run: latency breakdown and quality
+    stage_times = {stage: [] for stage in STAGES}
+    per_query = []
+    quality = {}
+    for entry in query_set:
+        results, timings, candidates = run_staged(retriever, entry['query'], settings)
+        for stage, seconds in timings.items():
+            stage_times[stage].append(seconds)
+        field, grades = relevance_labels(entry)
+        metrics = quality_metrics([r[field] for r in results], grades, top_k)
+        for name, rows in candidates.items():
+            labels = [chunk_store.get(field, row) for row in rows]
+            metrics[f'{name}_recall'] = quality_metrics(labels, grades, len(labels))[f'recall@{len(labels)}'] \
+                if labels else 0.0
+        for name, value in metrics.items():
+            quality.setdefault(name, []).append(value)
+        per_query.append({'query': entry['query'], 'total_ms': timings['total'] * 1000.0, **metrics})
+
+    # Concurrent end-to-end runs
+    concurrency = []
+    queries = [entry['query'] for entry in query_set]
+    for n in workers:
+        latencies = []
+
+        def timed_retrieve(query):
+            t = time.perf_counter()
+            retriever.retrieve(query, top_k, alpha, fusion=fusion, sparse_depth=sparse_depth, dense_depth=dense_depth,
+                               language=language)
+            latencies.append(time.perf_counter() - t)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=n) as executor:
+            list(executor.map(timed_retrieve, queries))
+        elapsed = time.perf_counter() - start
+        concurrency.append({'workers': n, 'qps': len(queries) / elapsed, **latency_summary(latencies)})
+
+    # Sharded retrievers never load the unsharded indexes; report the shards' settings instead
+    shards = retriever.shards
+    faiss_meta = next(iter(shards.values())).faiss_meta if shards else retriever.faiss_meta
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'index_version': retriever.index_version(),
+        'config': {**settings._asdict(), 'num_queries': len(query_set),
+                   'bm25_backend': "native" if shards else retriever._get("bm25")[0],
+                   'faiss_index_type': faiss_meta.get('index_type'), 'shards': sorted(shards),
+                   'model_batching': retriever.model_batching,
+                   'inference_backend': retriever.inference_backend},
+        'load_seconds': dict(retriever.load_times),
+        'stages': {stage: latency_summary(times) for stage, times in stage_times.items()},
+        'concurrency': concurrency,
+        'memory': {'peak_rss_mb': peak_rss_mb()},
+        'quality': {name: float(np.mean(values)) for name, values in quality.items()},
+        'per_query': per_query,
+    }
+
+def print_report(result: Dict, baseline: Optional[Dict] = None) -> None:
+    """Print stage latencies, throughput, memory and quality, with deltas against a baseline run."""
+    def delta(section: str, key: str, field: str) -> str:
+        if not baseline:
+            return ""
+        try:
+            old = baseline[section][key][field] if field else baseline[section][key]
+        except (KeyError, TypeError):
+            return ""
+        new = result[section][key][field] if field else result[section][key]
+        return f"  ({new - old:+.3f})"
+
+    print(f"\nQueries: {result['config']['num_queries']}  top_k={result['config']['top_k']}  "
+          f"fusion={result['config']['fusion']}  revision={result['git_revision']}")
+    print("\nStage latency (ms):")
+    for stage, stats in result['stages'].items():
+        print(f"  {stage:7s} p50={stats['p50_ms']:8.2f}  p95={stats['p95_ms']:8.2f}  "
+              f"p99={stats['p99_ms']:8.2f}{delta('stages', stage, 'p50_ms')}")
+    print("\nThroughput:")
+    for run in result['concurrency']:
+        print(f"  workers={run['workers']:3d}  qps={run['qps']:8.2f}  p50={run['p50_ms']:8.2f}ms  "
+              f"p99={run['p99_ms']:8.2f}ms")
+    print(f"\nPeak RSS: {result['memory']['peak_rss_mb']:.1f} MB{delta('memory', 'peak_rss_mb', None)}")
+    print("\nQuality:")
+    for name, value in result['quality'].items():
+        print(f"  {name:14s} {value:.4f}{delta('quality', name, None)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark retrieval latency, throughput, memory and quality.")
+    parser.add_argument("--queries", type=Path, default=EVAL_QUERIES_FILE, help="JSONL query set with relevance labels")
+    parser.add_argument("--generate", type=int, metavar="N",
+                        help="Write N synthetic known-item queries to --queries first")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--alpha", type=float, default=0.7)
+    parser.add_argument("--fusion", help="Fusion mode (default: retriever's FUSION_MODE)")
+    parser.add_argument("--sparse-depth", type=int)
+    parser.add_argument("--dense-depth", type=int)
+    parser.add_argument("--language", help="Language shards to search (default: detected per query)")
+    parser.add_argument("--serve-languages", help="Comma-separated language shards to load (default: all built)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8], help="Concurrency levels")
+    parser.add_argument("--limit", type=int, help="Use only the first N queries")
+    parser.add_argument("--output", type=Path, help="Results JSON (default: benchmarks/<timestamp>.json)")
+    parser.add_argument("--baseline", type=Path, help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    if args.generate:
+        generate_query_set(args.queries, args.generate)
+    query_set = load_query_set(args.queries)[:args.limit]
+    result = run_benchmark(query_set, args.top_k, args.alpha, args.fusion, args.sparse_depth, args.dense_depth,
+                           args.workers, language=args.language,
+                           languages=args.serve_languages.split(",") if args.serve_languages else None)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    output = args.output or RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResults saved to: {output}")
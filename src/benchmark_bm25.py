@@ -0,0 +1,138 @@
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from whoosh import scoring
+from whoosh.index import open_dir
+from whoosh.qparser import QueryParser
+
+from src.bm25_native import BM25_NATIVE_DIR, NativeBM25, analyze
+from src.chunk_store import ChunkStore, CHUNK_STORE_DIR
+from src.index_bm25 import BM25_INDEX_DIR
+
+# Sample questions from the app, plus short keyword queries
+SAMPLE_QUERIES = [
+    "How do I perform text classification using Transformers",
+    "How do I load a tokenizer in Transformers",
+    "How do I load a tokenizer in Hugging Face Transformers",
+    "transformer model attention",
+    "hugging face tokenizer",
+    "fine-tune pretrained model",
+    "pipeline sentiment analysis",
+]
+
+def sample_queries(chunks: ChunkStore, num_queries: int, seed: int = 0) -> List[str]:
+    """Build keyword queries of 2-4 terms drawn from random chunks."""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for row in rng.choice(len(chunks), size=min(num_queries, len(chunks)), replace=False):
+        terms = analyze(chunks.content(int(row)))
+        if terms:
+            size = min(len(terms), int(rng.integers(2, 5)))
+            queries.append(" ".join(rng.choice(terms, size=size, replace=False)))
+    return queries
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    """Return mean/p50/p95/p99 latency in milliseconds."""
+    ms = np.asarray(latencies) * 1000.0
+    return {'mean_ms': float(ms.mean()), 'p50_ms': float(np.percentile(ms, 50)),
+            'p95_ms': float(np.percentile(ms, 95)), 'p99_ms': float(np.percentile(ms, 99))}
+
+def run_benchmark(num_queries: int = 500, top_k: int = 10) -> Dict:
+    """
+    Compare the Whoosh and native BM25 engines on the same queries.
+
+    Measures load time, per-query latency and agreement of the native
+    results with Whoosh: overlap@k of the returned chunks, top-1 agreement
+    and the Pearson correlation of scores for chunks both engines return.
+    Scores are not bit-identical because Whoosh stores field lengths in a
+    lossy one-byte encoding.
+
+    Args:
+        num_queries: Number of sampled keyword queries (sample questions are always included)
+        top_k: Results per query
+
+    Returns:
+        Result dict with 'whoosh', 'native' and 'agreement' sections
+    """
+    chunks = ChunkStore(CHUNK_STORE_DIR)
+    queries = SAMPLE_QUERIES + sample_queries(chunks, num_queries)
+
+    start = time.perf_counter()
+    ix = open_dir(str(BM25_INDEX_DIR))
+    searcher = ix.searcher(weighting=scoring.BM25F())
+    parser = QueryParser("content", ix.schema)
+    whoosh_load = time.perf_counter() - start
+
+    start = time.perf_counter()
+    native = NativeBM25(BM25_NATIVE_DIR)
+    native_load = time.perf_counter() - start
+
+    whoosh_times, native_times, or_times = [], [], []
+    overlaps, top1, correlations = [], [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = searcher.search(parser.parse(query), limit=top_k)
+        whoosh_scores = {chunks.row_of(hit['id']): hit.score for hit in hits}
+        whoosh_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        rows, scores = native.search(query, top_k)
+        native_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        native.search(query, top_k, operator="or")
+        or_times.append(time.perf_counter() - start)
+
+        if not whoosh_scores:
+            continue
+        native_scores = dict(zip(rows.tolist(), scores.tolist()))
+        overlaps.append(len(set(whoosh_scores) & set(native_scores)) / len(whoosh_scores))
+        top1.append(float(len(rows) > 0 and int(rows[0]) == next(iter(whoosh_scores))))
+        shared = [row for row in whoosh_scores if row in native_scores]
+        if len(shared) > 1:
+            a = np.array([whoosh_scores[row] for row in shared])
+            b = np.array([native_scores[row] for row in shared])
+            if a.std() > 0 and b.std() > 0:
+                correlations.append(float(np.corrcoef(a, b)[0, 1]))
+    searcher.close()
+
+    result = {
+        'num_queries': len(queries),
+        'top_k': top_k,
+        'whoosh': {'load_seconds': whoosh_load, **percentiles(whoosh_times)},
+        'native': {'load_seconds': native_load, **percentiles(native_times)},
+        'native_or': percentiles(or_times),
+        'agreement': {
+            f'overlap@{top_k}': float(np.mean(overlaps)) if overlaps else 0.0,
+            'top1_agreement': float(np.mean(top1)) if top1 else 0.0,
+            'score_correlation': float(np.mean(correlations)) if correlations else 0.0,
+            'queries_compared': len(overlaps),
+        },
+    }
+    for name in ("whoosh", "native", "native_or"):
+        stats = result[name]
+        load = f"load={stats['load_seconds']:.3f}s  " if 'load_seconds' in stats else " " * 14
+        print(f"{name:9s} {load}mean={stats['mean_ms']:.3f}ms  p50={stats['p50_ms']:.3f}ms  "
+              f"p95={stats['p95_ms']:.3f}ms  p99={stats['p99_ms']:.3f}ms")
+    agreement = result['agreement']
+    print(f"Agreement over {agreement['queries_compared']} queries: "
+          f"overlap@{top_k}={agreement[f'overlap@{top_k}']:.3f}  top1={agreement['top1_agreement']:.3f}  "
+          f"score corr={agreement['score_correlation']:.3f}")
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the native BM25 engine against Whoosh.")
+    parser.add_argument("--queries", type=int, default=500, help="Number of sampled keyword queries")
+    parser.add_argument("--top-k", type=int, default=10, help="Results per query")
+    parser.add_argument("--output", type=Path, help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.queries, args.top_k)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"Results saved to: {args.output}")
@@ -0,0 +1,123 @@
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+
+from src.index_faiss import load_chunks, embed_chunks, create_faiss_index, search_parameters, rescore_candidates
+
+# Configurations benchmarked by default: (index type, build params, search params)
+DEFAULT_CONFIGS = [
+    ("flat", {}, {}),
+    ("ivf", {}, {'nprobe': 1}),
+    ("ivf", {}, {'nprobe': 4}),
+    ("ivf", {}, {'nprobe': 16}),
+    ("hnsw", {'hnsw_m': 32}, {'ef_search': 16}),
+    ("hnsw", {'hnsw_m': 32}, {'ef_search': 64}),
+    ("hnsw", {'hnsw_m': 32}, {'ef_search': 128}),
+    ("ivfpq", {}, {'nprobe': 16}),
+    ("opq", {}, {'nprobe': 16}),
+    ("fp16", {}, {}),
+    ("sq8", {}, {}),
+    ("sq8", {}, {'rescore': 4}),
+]
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    """Mean fraction of the exact top-k labels found by an approximate search."""
+    hits = [len(set(f[f != -1]) & set(t[t != -1])) / max(1, (t != -1).sum()) for f, t in zip(found, truth)]
+    return float(np.mean(hits))
+
+def ranking_change(found: np.ndarray, truth: np.ndarray) -> Dict[str, float]:
+    """Compare rankings with the exact ones: top-1 agreement and mean rank shift of shared results."""
+    top1 = float(np.mean(found[:, 0] == truth[:, 0]))
+    shifts = []
+    for f, t in zip(found, truth):
+        exact_rank = {label: rank for rank, label in enumerate(t) if label != -1}
+        shifts.extend(abs(rank - exact_rank[label]) for rank, label in enumerate(f) if label in exact_rank)
+    return {'top1_agreement': top1, 'mean_rank_shift': float(np.mean(shifts)) if shifts else 0.0}
+
+def benchmark_index(embeddings: np.ndarray, keys: np.ndarray, queries: np.ndarray, truth: np.ndarray,
+                    index_type: str, build_params: Dict, search_params: Dict, top_k: int) -> Dict:
+    """Build one index configuration and measure build time, size, QPS, recall@k and ranking change."""
+    start = time.perf_counter()
+    index = create_faiss_index(embeddings, keys, index_type, **build_params)
+    build_time = time.perf_counter() - start
+
+    params = search_parameters(index, search_params.get('nprobe'), search_params.get('ef_search'))
+    rescore = search_params.get('rescore', 0)
+    order = np.argsort(keys)
+    start = time.perf_counter()
+    _, labels = index.search(queries, top_k * rescore if rescore else top_k, params=params)
+    if rescore:
+        # Labels are chunk keys; embeddings are in row order
+        rows = np.where(labels >= 0, order[np.searchsorted(keys, labels, sorter=order)], -1)
+        _, rows = rescore_candidates(queries, rows, embeddings, top_k)
+        labels = np.where(rows >= 0, keys[rows], -1)
+    search_time = time.perf_counter() - start
+
+    result = {
+        'index_type': index_type,
+        'build_params': build_params,
+        'search_params': search_params,
+        f'recall@{top_k}': recall_at_k(labels, truth),
+        'qps': len(queries) / search_time if search_time > 0 else float('inf'),
+        'build_seconds': build_time,
+        'index_bytes': int(faiss.serialize_index(index).nbytes),
+    }
+    result.update(ranking_change(labels, truth))
+    return result
+
+def run_benchmark(num_queries: int = 500, top_k: int = 10, threads: Optional[int] = 1,
+                  configs=None) -> List[Dict]:
+    """
+    Benchmark FAISS index types against the exact flat index on the chunk store embeddings.
+
+    Queries are chunk embeddings sampled from the corpus, so every
+    configuration is measured on the same realistic vector distribution.
+    Search params may set 'rescore' to re-rank rescore * top_k candidates
+    with exact float32 scores, as the retriever does.
+
+    Args:
+        num_queries: Number of sampled query vectors
+        top_k: Neighbours retrieved per query (recall@k is measured at this k)
+        threads: FAISS OpenMP threads (None = FAISS default)
+        configs: List of (index type, build params, search params)
+
+    Returns:
+        One result dict per configuration
+    """
+    if threads is not None:
+        faiss.omp_set_num_threads(threads)
+    embeddings, keys = embed_chunks(load_chunks())
+    rng = np.random.default_rng(0)
+    queries = embeddings[rng.choice(len(embeddings), size=min(num_queries, len(embeddings)), replace=False)]
+
+    exact = create_faiss_index(embeddings, keys, "flat")
+    _, truth = exact.search(queries, top_k)
+
+    results = []
+    for index_type, build_params, search_params in configs or DEFAULT_CONFIGS:
+        result = benchmark_index(embeddings, keys, queries, truth, index_type, build_params, search_params, top_k)
+        results.append(result)
+        print(f"{index_type:6s} {json.dumps(build_params):16s} {json.dumps(search_params):20s} "
+              f"recall@{top_k}={result[f'recall@{top_k}']:.3f}  top1={result['top1_agreement']:.3f}  "
+              f"shift={result['mean_rank_shift']:.2f}  qps={result['qps']:9.1f}  "
+              f"build={result['build_seconds']:6.2f}s  size={result['index_bytes'] / 1e6:7.2f}MB")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index types against the flat index.")
+    parser.add_argument("--queries", type=int, default=500, help="Number of sampled query vectors")
+    parser.add_argument("--top-k", type=int, default=10, help="Neighbours per query")
+    parser.add_argument("--threads", type=int, default=1, help="FAISS OpenMP threads")
+    parser.add_argument("--output", type=Path, help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.queries, args.top_k, args.threads)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to: {args.output}")
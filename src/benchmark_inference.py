@@ -0,0 +1,132 @@
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from src.benchmark_bm25 import SAMPLE_QUERIES, sample_queries
+from src.chunk_store import ChunkStore, CHUNK_STORE_DIR
+from src.inference import (EMBEDDING_MODEL_NAME, RERANKER_MODEL_NAME, OnnxEncoder, OnnxCrossEncoder,
+                           onnx_model_dir)
+
+def timed(fn: Callable, repeats: int) -> List[float]:
+    """Call fn repeatedly and return per-call latencies in seconds."""
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def latency_stats(latencies: List[float]) -> Dict[str, float]:
+    ms = np.asarray(latencies) * 1000.0
+    return {'p50_ms': float(np.percentile(ms, 50)), 'p95_ms': float(np.percentile(ms, 95))}
+
+def rank_agreement(reference: np.ndarray, candidate: np.ndarray, k: int = 5) -> Dict[str, float]:
+    """Top-1 agreement, top-k overlap and Spearman correlation between two rows of scores."""
+    ref_order, cand_order = np.argsort(-reference), np.argsort(-candidate)
+    ref_ranks, cand_ranks = np.argsort(ref_order), np.argsort(cand_order)
+    spearman = float(np.corrcoef(ref_ranks, cand_ranks)[0, 1]) if len(reference) > 1 else 1.0
+    return {
+        'top1': float(ref_order[0] == cand_order[0]),
+        f'overlap@{k}': len(set(ref_order[:k]) & set(cand_order[:k])) / min(k, len(reference)),
+        'spearman': spearman,
+    }
+
+def run_benchmark(num_texts: int = 256, num_queries: int = 32, pool_size: int = 20, repeats: int = 20) -> Dict:
+    """
+    Compare PyTorch with ONNX Runtime (fp32 and int8) for the embedding model and the reranker.
+
+    Parity: cosine between torch and ONNX embeddings of sampled chunks, and
+    agreement of rerank order over a pool of pool_size chunks per query.
+    Speed: cold start (model load), single-query encode latency, rerank
+    latency for one pool, and batch throughput. Also reports model file sizes.
+
+    Returns:
+        Result dict keyed by backend name
+    """
+    from sentence_transformers import SentenceTransformer, CrossEncoder
+
+    chunks = ChunkStore(CHUNK_STORE_DIR)
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(chunks), size=min(num_texts, len(chunks)), replace=False)
+    texts = [chunks.content(int(row)) for row in rows]
+    queries = (SAMPLE_QUERIES + sample_queries(chunks, num_queries))[:num_queries]
+    pools = [[texts[i] for i in rng.choice(len(texts), size=min(pool_size, len(texts)), replace=False)]
+             for _ in queries]
+
+    backends = {
+        'torch': (lambda: SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu"),
+                  lambda: CrossEncoder(RERANKER_MODEL_NAME, device="cpu")),
+        'onnx-fp32': (lambda: OnnxEncoder(onnx_model_dir(EMBEDDING_MODEL_NAME), quantized=False),
+                      lambda: OnnxCrossEncoder(onnx_model_dir(RERANKER_MODEL_NAME), quantized=False)),
+        'onnx-int8': (lambda: OnnxEncoder(onnx_model_dir(EMBEDDING_MODEL_NAME), quantized=True),
+                      lambda: OnnxCrossEncoder(onnx_model_dir(RERANKER_MODEL_NAME), quantized=True)),
+    }
+
+    results = {}
+    reference = {}
+    for name, (load_encoder, load_reranker) in backends.items():
+        start = time.perf_counter()
+        encoder = load_encoder()
+        reranker = load_reranker()
+        cold_start = time.perf_counter() - start
+
+        embeddings = encoder.encode(texts, batch_size=64, convert_to_numpy=True, normalize_embeddings=True)
+        pool_scores = [np.asarray(reranker.predict([(q, p) for p in pool])) for q, pool in zip(queries, pools)]
+
+        start = time.perf_counter()
+        encoder.encode(texts, batch_size=64, convert_to_numpy=True, normalize_embeddings=True)
+        encode_throughput = len(texts) / (time.perf_counter() - start)
+        pairs = [(q, p) for q, pool in zip(queries, pools) for p in pool]
+        start = time.perf_counter()
+        reranker.predict(pairs, batch_size=128)
+        rerank_throughput = len(pairs) / (time.perf_counter() - start)
+
+        result = {
+            'cold_start_seconds': cold_start,
+            'query_encode': latency_stats(timed(
+                lambda: encoder.encode([queries[0]], convert_to_numpy=True, normalize_embeddings=True), repeats)),
+            'rerank_pool': latency_stats(timed(lambda: reranker.predict([(queries[0], p) for p in pools[0]]), repeats)),
+            'encode_texts_per_second': encode_throughput,
+            'rerank_pairs_per_second': rerank_throughput,
+        }
+        if name == 'torch':
+            reference = {'embeddings': embeddings, 'pool_scores': pool_scores}
+        else:
+            cosine = (reference['embeddings'] * embeddings).sum(axis=1)
+            agreement = [rank_agreement(ref, cand) for ref, cand in zip(reference['pool_scores'], pool_scores)]
+            result['parity'] = {
+                'embedding_cosine_mean': float(cosine.mean()),
+                'embedding_cosine_min': float(cosine.min()),
+                **{key: float(np.mean([a[key] for a in agreement])) for key in agreement[0]},
+            }
+            result['model_bytes'] = encoder.model_file.stat().st_size + reranker.model_file.stat().st_size
+        results[name] = result
+
+        line = (f"{name:9s} cold={cold_start:6.2f}s  query p50={result['query_encode']['p50_ms']:7.2f}ms  "
+                f"rerank p50={result['rerank_pool']['p50_ms']:7.2f}ms  encode={encode_throughput:7.1f}/s  "
+                f"rerank={rerank_throughput:7.1f}/s")
+        if 'parity' in result:
+            parity = result['parity']
+            line += (f"  cos={parity['embedding_cosine_mean']:.4f} (min {parity['embedding_cosine_min']:.4f})  "
+                     f"top1={parity['top1']:.3f}  spearman={parity['spearman']:.3f}")
+        print(line)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare PyTorch and ONNX Runtime inference (parity and speed).")
+    parser.add_argument("--texts", type=int, default=256, help="Sampled chunks to embed")
+    parser.add_argument("--queries", type=int, default=32, help="Queries to rerank pools for")
+    parser.add_argument("--pool-size", type=int, default=20, help="Passages per rerank pool")
+    parser.add_argument("--repeats", type=int, default=20, help="Repeats for latency percentiles")
+    parser.add_argument("--output", type=Path, help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.texts, args.queries, args.pool_size, args.repeats)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to: {args.output}")
@@ -0,0 +1,225 @@
+import json
+import re
+import shutil
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from src.chunk_store import ChunkStore, CHUNK_STORE_DIR, replace_dir
+from src.dedup import indexed_rows
+
+# Define paths
+ROOT = Path(__file__).parent.parent
+BM25_NATIVE_DIR = ROOT / "index" / "bm25_native"
+
+# BM25 parameters (Whoosh BM25F defaults)
+K1 = 1.2
+B = 0.75
+# Whoosh stores each document's field length in one byte, rounding it up to the next of these
+# 256 values (whoosh.util.numeric.length_to_byte); BM25F scores with the rounded length
+LENGTH_STEPS = np.round((1.033 ** np.arange(256) - 1) * 27).astype(np.int64)
+
+# Tokenization mirrors Whoosh's StandardAnalyzer: regex tokens, lowercase,
+# stop words and single-character tokens removed
+TOKEN_PATTERN = re.compile(r"\w+(?:\.?\w+)*", re.UNICODE)
+STOP_WORDS = frozenset(('a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can',
+                        'for', 'from', 'have', 'if', 'in', 'is', 'it', 'may',
+                        'not', 'of', 'on', 'or', 'tbd', 'that', 'the', 'this',
+                        'to', 'us', 'we', 'when', 'will', 'with', 'yet',
+                        'you', 'your'))
+
+def analyze(text: str) -> List[str]:
+    """Split text into index terms the way the Whoosh content field does."""
+    terms = []
+    for match in TOKEN_PATTERN.finditer(text):
+        term = match.group().lower()
+        if len(term) >= 2 and term not in STOP_WORDS:
+            terms.append(term)
+    return terms
+
+def stored_lengths(lengths: np.ndarray) -> np.ndarray:
+    """Round document lengths up to the values Whoosh stores (see LENGTH_STEPS)."""
+    return LENGTH_STEPS[np.minimum(np.searchsorted(LENGTH_STEPS, lengths, side='left'), len(LENGTH_STEPS) - 1)]
+
+def build_native_bm25_index(store_dir: Path = CHUNK_STORE_DIR, index_dir: Path = BM25_NATIVE_DIR,
+                            rows: Optional[np.ndarray] = None) -> Path:
+    """
+    Build a CSR-style BM25 index over the chunk store.
+
+    Postings are grouped by term: indptr[t]:indptr[t + 1] slices doc_ids
+    (chunk store rows, ascending) and impacts (precomputed BM25 term scores,
+    float32). max_impact[t] is each term's score upper bound, used for
+    MaxScore pruning at query time.
+
+    Only the rows in `rows` (ascending; default: every chunk not collapsed
+    as a near-duplicate, see src.dedup) are indexed, with collection
+    statistics of their own; doc_ids remain chunk store rows.
+    """
+    start_time = time.time()
+    chunks = ChunkStore(store_dir)
+    rows = indexed_rows(chunks) if rows is None else np.asarray(rows, dtype=np.int64)
+    num_docs = len(rows)
+
+    vocab = {}
+    term_ids: List[int] = []
+    doc_ids: List[int] = []
+    tfs: List[int] = []
+    doc_len = np.zeros(num_docs, dtype=np.float32)
+    for i, row in enumerate(rows.tolist()):
+        terms = analyze(chunks.content(row))
+        doc_len[i] = len(terms)
+        for term, tf in Counter(terms).items():
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+            doc_ids.append(i)
+            tfs.append(tf)
+
+    term_ids = np.asarray(term_ids, dtype=np.int32)
+    doc_ids = np.asarray(doc_ids, dtype=np.int32)
+    tfs = np.asarray(tfs, dtype=np.float32)
+    order = np.lexsort((doc_ids, term_ids))
+    term_ids, doc_ids, tfs = term_ids[order], doc_ids[order], tfs[order]
+
+    df = np.bincount(term_ids, minlength=len(vocab))
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(df, out=indptr[1:])
+
+    # Precompute BM25 impacts with Whoosh's idf, log(N / (df + 1)) + 1, its exact average
+    # length and its stored (rounded) document lengths
+    avgdl = float(doc_len.mean()) if num_docs and doc_len.mean() > 0 else 1.0
+    idf = (np.log(num_docs / (df + 1.0)) + 1.0).astype(np.float32)
+    norm = K1 * ((1 - B) + B * stored_lengths(doc_len)[doc_ids] / avgdl)
+    impacts = (idf[term_ids] * (tfs * (K1 + 1)) / (tfs + norm)).astype(np.float32)
+    doc_ids = rows[doc_ids].astype(np.int32)
+    max_impact = (np.maximum.reduceat(impacts, indptr[:-1]) if len(impacts)
+                  else np.zeros(0, dtype=np.float32)).astype(np.float32)
+
+    tmp_dir = Path(index_dir).with_name(Path(index_dir).name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+    np.save(tmp_dir / "indptr.npy", indptr)
+    np.save(tmp_dir / "doc_ids.npy", doc_ids)
+    np.save(tmp_dir / "impacts.npy", impacts)
+    np.save(tmp_dir / "max_impact.npy", max_impact)
+    with open(tmp_dir / "vocab.json", 'w', encoding='utf-8') as f:
+        json.dump(sorted(vocab, key=vocab.get), f, ensure_ascii=False)
+    with open(tmp_dir / "meta.json", 'w', encoding='utf-8') as f:
+        json.dump({'num_docs': num_docs, 'num_terms': len(vocab), 'num_postings': len(doc_ids),
+                   'avgdl': avgdl, 'k1': K1, 'b': B}, f, indent=2)
+
+    replace_dir(tmp_dir, index_dir)
+    print(f"Native BM25 index: {len(vocab)} terms, {len(doc_ids)} postings "
+          f"built in {time.time() - start_time:.2f} seconds")
+    print(f"Index saved to: {index_dir}")
+    return Path(index_dir)
+
+class NativeBM25:
+    """
+    In-memory BM25 search over the CSR index built by build_native_bm25_index.
+
+    Arrays are memory-mapped and the searcher holds no per-query state, so
+    one instance can serve concurrent threads. operator="and" matches the
+    Whoosh QueryParser default (every term must occur) and is what the
+    retriever uses, so its results equal the Whoosh fallback's. It scores
+    the intersection of the query terms' postings exhaustively; there is
+    nothing left to prune, since every candidate matches every term.
+    operator="or" ranks any matching chunk and uses MaxScore pruning to
+    skip scoring chunks that cannot reach the top results.
+    """
+
+    def __init__(self, index_dir: Path = BM25_NATIVE_DIR):
+        index_dir = Path(index_dir)
+        with open(index_dir / "meta.json", 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        with open(index_dir / "vocab.json", 'r', encoding='utf-8') as f:
+            self.vocab = {term: i for i, term in enumerate(json.load(f))}
+        self.indptr = np.load(index_dir / "indptr.npy", mmap_mode='r')
+        self.doc_ids = np.load(index_dir / "doc_ids.npy", mmap_mode='r')
+        self.impacts = np.load(index_dir / "impacts.npy", mmap_mode='r')
+        self.max_impact = np.load(index_dir / "max_impact.npy", mmap_mode='r')
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.indptr[term_id], self.indptr[term_id + 1]
+        return self.doc_ids[start:end], self.impacts[start:end]
+
+    def _score(self, candidates: np.ndarray, term_ids: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """Sum term impacts for sorted candidate rows."""
+        scores = np.zeros(len(candidates), dtype=np.float32)
+        for term_id, weight in zip(term_ids, weights):
+            docs, impacts = self._postings(term_id)
+            pos = np.searchsorted(docs, candidates)
+            pos_clipped = np.minimum(pos, len(docs) - 1)
+            found = (pos < len(docs)) & (docs[pos_clipped] == candidates)
+            scores[found] += weight * impacts[pos_clipped[found]]
+        return scores
+
+    def search(self, query: str, limit: int = 10, operator: str = "and") -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the top chunk store rows and BM25 scores for a query.
+
+        Args:
+            query: Free-text query
+            limit: Number of results
+            operator: "and" (all terms required, as in Whoosh) or "or" (any
+                term, with MaxScore pruning)
+
+        Returns:
+            (rows, scores) sorted by descending score
+        """
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+        terms = analyze(query)
+        known = [self.vocab[t] for t in terms if t in self.vocab]
+        if not known or limit <= 0 or (operator == "and" and len(known) < len(terms)):
+            return empty
+        # Repeated query terms count once per occurrence, as in Whoosh
+        term_ids, weights = np.unique(np.asarray(known, dtype=np.int64), return_counts=True)
+        weights = weights.astype(np.float32)
+
+        if operator == "and":
+            # Intersect postings, shortest list first
+            order = np.argsort(np.diff(self.indptr)[term_ids] if len(term_ids) > 1 else [0])
+            candidates = np.asarray(self._postings(term_ids[order[0]])[0])
+            for term_id in term_ids[order[1:]]:
+                candidates = np.intersect1d(candidates, self._postings(term_id)[0], assume_unique=True)
+        else:
+            candidates = self._maxscore_candidates(term_ids, weights, limit)
+
+        if len(candidates) == 0:
+            return empty
+        scores = self._score(candidates, term_ids, weights)
+        return self._top(candidates, scores, limit)
+
+    def _maxscore_candidates(self, term_ids: np.ndarray, weights: np.ndarray, limit: int) -> np.ndarray:
+        """
+        Return the rows that can still reach the top `limit` results (MaxScore).
+
+        The best term alone gives a lower bound (theta) on the limit-th best
+        score. Terms whose upper bounds sum to less than theta are
+        non-essential: a chunk that matches none of the other terms cannot
+        reach theta, so only postings of essential terms become candidates.
+        """
+        bounds = np.asarray(self.max_impact[term_ids]) * weights
+        order = np.argsort(bounds, kind='stable')
+        term_ids, weights, bounds = term_ids[order], weights[order], bounds[order]
+
+        top_impacts = np.asarray(self._postings(term_ids[-1])[1]) * weights[-1]
+        theta = float(np.partition(top_impacts, -limit)[-limit]) if len(top_impacts) >= limit else 0.0
+        n_nonessential = int(np.searchsorted(np.cumsum(bounds), theta, side='left'))
+
+        essential = [np.asarray(self._postings(t)[0]) for t in term_ids[n_nonessential:]]
+        return np.unique(np.concatenate(essential))
+
+    @staticmethod
+    def _top(candidates: np.ndarray, scores: np.ndarray, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Select the top `limit` candidates by score (ties broken by row)."""
+        if len(scores) > limit:
+            keep = np.argpartition(-scores, limit - 1)[:limit]
+            candidates, scores = candidates[keep], scores[keep]
+        order = np.lexsort((candidates, -scores))
+        return candidates[order].astype(np.int64), scores[order]
+
+if __name__ == "__main__":
+    build_native_bm25_index()
@@ -0,0 +1,259 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+# Define paths: index/bundles/<version>/{manifest.json, chunk_store/, bm25_index/, ...} and
+# index/bundles/current, a one-line file naming the bundle to serve
+ROOT = Path(__file__).parent.parent
+BUNDLES_DIR = ROOT / "index" / "bundles"
+CURRENT_FILE = "current"
+MANIFEST_FILE = "manifest.json"
+
+# Working directories the build scripts write to, copied into each bundle under the same name
+STAGING_DIRS = {
+    'chunk_store': ROOT / "data" / "processed_chunks" / "chunk_store",
+    'bm25_index': ROOT / "index" / "bm25_index",
+    'bm25_native': ROOT / "index" / "bm25_native",
+    'faiss_index': ROOT / "index" / "faiss_index",
+    'features': ROOT / "index" / "features",
+    'dedup': ROOT / "index" / "dedup",
+    'shards': ROOT / "index" / "shards",
+}
+# A bundle cannot serve queries without these
+REQUIRED_COMPONENTS = ("chunk_store", "faiss_index")
+
+# Bundles kept by publish_bundle() besides the current one, for rollback
+KEEP_BUNDLES = 2
+# Seconds after a bundle was built or stopped being current during which it is never pruned,
+# so retrievers still loading or pinned to it can finish
+PRUNE_GRACE_SECONDS = 300.0
+
+class IndexPaths(NamedTuple):
+    """Directories of one version of the chunk store and indexes."""
+    chunk_store: Path
+    bm25_index: Path
+    bm25_native: Path
+    faiss_index: Path
+    features: Path
+    dedup: Path
+    shards: Path
+
+def bundle_paths(bundle_dir: Path) -> IndexPaths:
+    """Component directories inside a bundle."""
+    return IndexPaths(*(Path(bundle_dir) / name for name in IndexPaths._fields))
+
+def file_sha256(path: Path) -> str:
+    """SHA-256 of a file, read in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def checksum_files(bundle_dir: Path) -> Dict[str, Dict]:
+    """Size and SHA-256 of every file in a bundle except its manifest, keyed by relative path."""
+    bundle_dir = Path(bundle_dir)
+    files = {}
+    for path in sorted(p for p in bundle_dir.rglob("*") if p.is_file()):
+        rel = path.relative_to(bundle_dir).as_posix()
+        if rel != MANIFEST_FILE:
+            files[rel] = {'size': path.stat().st_size, 'sha256': file_sha256(path)}
+    return files
+
+def current_version(bundles_dir: Path = BUNDLES_DIR) -> Optional[str]:
+    """Version named by the `current` pointer, or None when no bundle was activated."""
+    try:
+        with open(Path(bundles_dir) / CURRENT_FILE, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def list_bundles(bundles_dir: Path = BUNDLES_DIR) -> List[Dict]:
+    """Manifests of the complete bundles, oldest first."""
+    manifests = []
+    if Path(bundles_dir).exists():
+        for manifest_file in Path(bundles_dir).glob(f"*/{MANIFEST_FILE}"):
+            if manifest_file.parent.name.endswith(".tmp"):
+                continue
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                manifests.append(json.load(f))
+    return sorted(manifests, key=lambda m: (m['created'], m['version']))
+
+def build_bundle(bundles_dir: Path = BUNDLES_DIR, staging_dirs: Optional[Dict[str, Path]] = None) -> str:
+    """
+    Copy the built chunk store and indexes into a new, immutable bundle.
+
+    The bundle is written to a `.tmp` directory and renamed once its manifest
+    (file sizes and SHA-256 checksums) is complete, so a bundle directory
+    with a manifest is always whole. Files are copied with their mtimes, so
+    the chunk store fingerprints recorded by the derived indexes still match.
+
+    Returns:
+        The new bundle's version
+    """
+    start_time = time.time()
+    staging_dirs = dict(STAGING_DIRS if staging_dirs is None else staging_dirs)
+    missing = [name for name in REQUIRED_COMPONENTS if not Path(staging_dirs[name]).exists()]
+    if missing:
+        raise FileNotFoundError(f"Cannot build an index bundle without: {', '.join(missing)}")
+
+    bundles_dir = Path(bundles_dir)
+    bundles_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    # Unique per build, so concurrent builds never share (or delete) each other's work in progress
+    tmp_dir = bundles_dir / f"{stamp}-{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp"
+    tmp_dir.mkdir()
+
+    components = []
+    for name in IndexPaths._fields:
+        source = Path(staging_dirs[name])
+        if source.exists():
+            shutil.copytree(source, tmp_dir / name, ignore=shutil.ignore_patterns("*.tmp", "*WRITELOCK"))
+            components.append(name)
+    files = checksum_files(tmp_dir)
+
+    # Versions sort by time; the content digest tells apart bundles built in the same second
+    digest = hashlib.sha256(json.dumps(files, sort_keys=True).encode('utf-8')).hexdigest()
+    version = f"{stamp}-{digest[:8]}"
+    manifest = {'version': version, 'created': time.time(), 'components': components,
+                'num_files': len(files), 'total_bytes': sum(f['size'] for f in files.values()), 'files': files}
+    with open(tmp_dir / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    try:
+        if (bundles_dir / version).exists():
+            raise FileExistsError(version)
+        os.replace(tmp_dir, bundles_dir / version)
+    except OSError:
+        # The same bundle was already built, possibly by a concurrent build
+        if not (bundles_dir / version / MANIFEST_FILE).exists():
+            raise
+        shutil.rmtree(tmp_dir)
+    print(f"Index bundle {version} ({len(files)} files, {manifest['total_bytes'] / 1e6:.1f} MB) "
+          f"built in {time.time() - start_time:.2f} seconds")
+    return version
+
+def verify_bundle(version: str, bundles_dir: Path = BUNDLES_DIR) -> None:
+    """
+    Check a bundle's files against its manifest.
+
+    Raises:
+        FileNotFoundError: The bundle or its manifest does not exist
+        ValueError: A file is missing, unexpected, or its checksum differs
+    """
+    bundle_dir = Path(bundles_dir) / version
+    with open(bundle_dir / MANIFEST_FILE, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    files = checksum_files(bundle_dir)
+    bad = sorted(rel for rel in set(files) | set(manifest['files'])
+                 if files.get(rel) != manifest['files'].get(rel))
+    if bad:
+        raise ValueError(f"Index bundle {version} does not match its manifest: {', '.join(bad[:5])}"
+                         + (f" and {len(bad) - 5} more" if len(bad) > 5 else ""))
+
+def activate_bundle(version: str, bundles_dir: Path = BUNDLES_DIR, verify: bool = True) -> None:
+    """
+    Point `current` at a bundle; running retrievers swap it in on their next version check.
+
+    The pointer is written to a temporary file and renamed over the old
+    one, so readers see either the old or the new version, never a mix.
+    The previous bundle's directory mtime is set to now, which starts its
+    prune grace period.
+    """
+    if verify:
+        verify_bundle(version, bundles_dir)
+    elif not (Path(bundles_dir) / version / MANIFEST_FILE).exists():
+        raise FileNotFoundError(f"No complete index bundle {version} in {bundles_dir}")
+    previous = current_version(bundles_dir)
+    pointer = Path(bundles_dir) / CURRENT_FILE
+    tmp_pointer = pointer.with_name(CURRENT_FILE + ".tmp")
+    with open(tmp_pointer, 'w', encoding='utf-8') as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, pointer)
+    if previous is not None and previous != version and (Path(bundles_dir) / previous).is_dir():
+        os.utime(Path(bundles_dir) / previous)
+    print(f"Serving index bundle {version}")
+
+def prune_bundles(keep: int = KEEP_BUNDLES, bundles_dir: Path = BUNDLES_DIR,
+                  grace: float = PRUNE_GRACE_SECONDS) -> List[str]:
+    """
+    Delete all but the `keep` newest bundles besides the current one, and leftover .tmp builds.
+
+    Bundles and .tmp builds whose directory changed less than `grace` seconds
+    ago are skipped: a retriever may still be loading a bundle that was
+    current moments ago. Processes still serving a deleted bundle keep their
+    open and memory-mapped files on POSIX systems; elsewhere bundles in use
+    are skipped.
+
+    Returns:
+        Versions deleted
+    """
+    bundles_dir = Path(bundles_dir)
+    current = current_version(bundles_dir)
+    older = [m['version'] for m in list_bundles(bundles_dir) if m['version'] != current]
+    stale = older[:max(len(older) - keep, 0)]
+    cutoff = time.time() - grace
+    deleted = []
+    for version in stale:
+        try:
+            if (bundles_dir / version).stat().st_mtime > cutoff:
+                continue
+            shutil.rmtree(bundles_dir / version)
+            deleted.append(version)
+        except OSError as e:
+            print(f"Could not delete index bundle {version}: {e}")
+    for tmp_dir in bundles_dir.glob("*.tmp"):
+        if tmp_dir.is_dir() and tmp_dir.stat().st_mtime <= cutoff:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return deleted
+
+def publish_bundle(bundles_dir: Path = BUNDLES_DIR, keep: int = KEEP_BUNDLES,
+                   grace: float = PRUNE_GRACE_SECONDS) -> str:
+    """Build a bundle from the working indexes, make it current and prune old bundles."""
+    version = build_bundle(bundles_dir)
+    activate_bundle(version, bundles_dir, verify=False)
+    deleted = prune_bundles(keep, bundles_dir, grace)
+    if deleted:
+        print(f"Deleted old index bundles: {', '.join(deleted)}")
+    return version
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage versioned index bundles served by the retriever.")
+    parser.add_argument("command", choices=("publish", "list", "activate", "verify", "prune"),
+                        help="publish: snapshot the built indexes and serve them; activate: serve (or roll back "
+                             "to) an existing bundle; verify: check checksums; prune: delete old bundles")
+    parser.add_argument("version", nargs="?", help="Bundle for activate / verify (default: the current one)")
+    parser.add_argument("--keep", type=int, default=KEEP_BUNDLES,
+                        help="Bundles to keep besides the current one when publishing or pruning")
+    parser.add_argument("--grace", type=float, default=PRUNE_GRACE_SECONDS,
+                        help="Never prune bundles built or retired less than this many seconds ago")
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        publish_bundle(keep=args.keep, grace=args.grace)
+    elif args.command == "list":
+        current = current_version()
+        for manifest in list_bundles():
+            marker = "*" if manifest['version'] == current else " "
+            print(f"{marker} {manifest['version']}  {manifest['num_files']:5d} files  "
+                  f"{manifest['total_bytes'] / 1e6:8.1f} MB  {', '.join(manifest['components'])}")
+    elif args.command == "prune":
+        print(f"Deleted: {', '.join(prune_bundles(args.keep, grace=args.grace)) or 'nothing'}")
+    else:
+        version = args.version or current_version()
+        if version is None:
+            parser.error("no bundle is current; pass a version")
+        if args.command == "activate":
+            activate_bundle(version)
+        else:
+            verify_bundle(version)
+            print(f"Index bundle {version} matches its manifest")
@@ -0,0 +1,176 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+import numpy as np
+
+def normalize_query(query: str) -> str:
+    """Normalize a query for cache lookups: Unicode NFC, lowercase, single spaces."""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', query)).strip().lower()
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with an optional time-to-live per entry.
+
+    Entries are evicted least-recently-used first once `maxsize` is reached,
+    and expire `ttl` seconds after they were stored. A maxsize of 0 disables
+    the cache. Hit, miss and eviction counts are kept for stats().
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default on a miss or expired entry."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.evictions += 1
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entry if the cache is full."""
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every entry (counters are kept)."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Return size, hit/miss/eviction counts and hit rate."""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+class SemanticCache:
+    """
+    Thread-safe cache of values looked up by embedding similarity.
+
+    Stores up to `maxsize` unit-norm embeddings in a flat inner-product FAISS
+    index. get() returns the value of the most similar stored embedding whose
+    key is equal to the one asked for, if their cosine similarity is at least
+    `threshold`; the key holds whatever must match exactly (e.g. retrieval
+    settings). Entries are evicted least-recently-used first and expire `ttl`
+    seconds after they were stored. A maxsize of 0 disables the cache.
+    """
+
+    def __init__(self, maxsize: int = 1024, threshold: float = 0.95, ttl: Optional[float] = None,
+                 probe: int = 8):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        # Neighbours checked per lookup, for stored embeddings of other keys ranking first
+        self.probe = probe
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._index = None
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, embedding: np.ndarray, key: Hashable, default: Any = None) -> Any:
+        """Return the value stored for the nearest embedding with this key, or default below the threshold."""
+        with self._lock:
+            if self._entries:
+                query = np.asarray(embedding, dtype='float32').reshape(1, -1)
+                scores, ids = self._index.search(query, min(self.probe, len(self._entries)))
+                now = time.monotonic()
+                for score, entry_id in zip(scores[0].tolist(), ids[0].tolist()):
+                    if score < self.threshold:
+                        break
+                    if entry_id < 0:
+                        break
+                    entry_key, value, expires_at = self._entries[entry_id]
+                    if entry_key != key:
+                        continue
+                    if expires_at is not None and expires_at <= now:
+                        self._remove(entry_id)
+                        self.evictions += 1
+                        continue
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return default
+
+    def put(self, embedding: np.ndarray, key: Hashable, value: Any) -> None:
+        """Store a value under an embedding and key, evicting the least recently used entry if full."""
+        if self.maxsize <= 0:
+            return
+        import faiss
+
+        vector = np.asarray(embedding, dtype='float32').reshape(1, -1)
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if self._index is None or self._index.d != vector.shape[1]:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+                self._entries.clear()
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = (key, value, expires_at)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, entry_id: int) -> None:
+        del self._entries[entry_id]
+        self._index.remove_ids(np.array([entry_id], dtype=np.int64))
+
+    def clear(self) -> None:
+        """Drop every entry (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            if self._index is not None:
+                self._index.reset()
+
+    def stats(self) -> Dict[str, float]:
+        """Return size, hit/miss/eviction counts, hit rate and the similarity threshold."""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'threshold': self.threshold,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -1,13 +1,35 @@
 import os
-import json
 import re
+import json
+import time
+import hashlib
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
+
+from src.chunk_store import ChunkStoreWriter, CHUNK_STORE_DIR
 
 # Define paths
 ROOT = Path(__file__).parent.parent
 RAW_DOCS_DIR = ROOT / "data" / "raw_docs" / "transformers" / "docs"
 PROCESSED_DIR = ROOT / "data" / "processed_chunks"
+MANIFEST_FILE = PROCESSED_DIR / "manifest.json"
+
+# Chunks are sized in tokens of the embedding model's tokenizer (a Hub id, a directory
+# holding tokenizer.json, or the file itself). all-MiniLM-L6-v2 reads 256 tokens including
+# [CLS] and [SEP], which also leaves room for the query in the cross-encoder's 512.
+CHUNK_TOKENIZER = "sentence-transformers/all-MiniLM-L6-v2"
+MAX_CHUNK_TOKENS = 254
+# A heading starts a new chunk only once the current one holds this many tokens,
+# so short sections are merged with the ones that follow
+MIN_CHUNK_TOKENS = 64
+# Recorded in the manifest; reindex refuses to mix chunks from different chunkers
+CHUNKER_VERSION = "markdown-2"
+
+FENCE_RE = re.compile(r'^\s*(`{3,}|~{3,})')
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
 
 def clean_markdown_content(content: str) -> str:
     """Clean markdown content by removing front matter, excessive whitespace, etc."""
@@ -25,22 +47,202 @@ def clean_markdown_content(content: str) -> str:
     
     return content.strip()
 
-def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
-    """Split text into overlapping chunks based on word count."""
-    words = text.split()
-    chunks = []
-    
-    for i in range(0, len(words), chunk_size - overlap):
-        chunk_words = words[i:i + chunk_size]
-        chunk = ' '.join(chunk_words)
-        if len(chunk.strip()) > 0:
-            chunks.append(chunk.strip())
-        
-        # Break if we've reached the end
-        if i + chunk_size >= len(words):
-            break
-    
-    return chunks
+_tokenizer = None
+_tokenizer_name = CHUNK_TOKENIZER
+_max_tokens = MAX_CHUNK_TOKENS
+
+def configure_chunker(tokenizer_name: str = CHUNK_TOKENIZER, max_tokens: int = MAX_CHUNK_TOKENS) -> None:
+    """Set the chunking tokenizer and token budget (also the process pool initializer)."""
+    global _tokenizer, _tokenizer_name, _max_tokens
+    _tokenizer, _tokenizer_name, _max_tokens = None, tokenizer_name, max_tokens
+
+def get_tokenizer():
+    """Load the chunking tokenizer once per process, without truncation or padding."""
+    global _tokenizer
+    if _tokenizer is None:
+        from tokenizers import Tokenizer
+        path = Path(_tokenizer_name)
+        if path.is_dir():
+            path = path / "tokenizer.json"
+        tokenizer = Tokenizer.from_file(str(path)) if path.is_file() else Tokenizer.from_pretrained(_tokenizer_name)
+        tokenizer.no_truncation()
+        tokenizer.no_padding()
+        _tokenizer = tokenizer
+    return _tokenizer
+
+def chunker_config() -> Dict:
+    """Settings that determine chunk boundaries, saved with the manifest."""
+    return {'version': CHUNKER_VERSION, 'tokenizer': _tokenizer_name, 'max_tokens': _max_tokens,
+            'min_tokens': MIN_CHUNK_TOKENS}
+
+def split_markdown_blocks(text: str) -> List[Tuple[Tuple[str, ...], str, str]]:
+    """
+    Split Markdown into (heading path, kind, text) blocks.
+
+    Kinds are "heading", "code" (a whole fenced block, fences included) and
+    "text" (a paragraph). Headings inside code fences are ignored. A
+    heading's own path includes the heading itself.
+    """
+    blocks = []
+    path: List[Tuple[int, str]] = []
+    paragraph: List[str] = []
+    code: List[str] = []
+    fence = None
+
+    def flush_paragraph():
+        if paragraph:
+            blocks.append((tuple(title for _, title in path), "text", "\n".join(paragraph)))
+            paragraph.clear()
+
+    for line in text.split("\n"):
+        if fence is not None:
+            code.append(line)
+            match = FENCE_RE.match(line)
+            if match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence) \
+                    and not line.strip()[len(match.group(1)):].strip():
+                blocks.append((tuple(title for _, title in path), "code", "\n".join(code)))
+                code, fence = [], None
+            continue
+        match = FENCE_RE.match(line)
+        if match:
+            flush_paragraph()
+            fence, code = match.group(1), [line]
+            continue
+        match = HEADING_RE.match(line)
+        if match:
+            flush_paragraph()
+            level = len(match.group(1))
+            path = [(lvl, title) for lvl, title in path if lvl < level] + [(level, match.group(2))]
+            blocks.append((tuple(title for _, title in path), "heading", line.strip()))
+            continue
+        if line.strip():
+            paragraph.append(line)
+        else:
+            flush_paragraph()
+    flush_paragraph()
+    if code:
+        # Unclosed fence: keep what was collected as code
+        blocks.append((tuple(title for _, title in path), "code", "\n".join(code)))
+    return blocks
+
+def split_oversized(text: str, max_tokens: int, tokenizer, code: bool = False,
+                    first_max_tokens: Optional[int] = None) -> List[str]:
+    """
+    Split a block longer than max_tokens at token boundaries.
+
+    Cuts prefer the last line break, then the last sentence end, in the
+    second half of each window. Pieces of a code block are re-fenced so each
+    one is valid Markdown on its own. first_max_tokens, if given, limits the
+    first piece instead of max_tokens.
+    """
+    first_max_tokens = first_max_tokens or max_tokens
+    opening = closing = ""
+    if code:
+        lines = text.split("\n")
+        opening = lines[0]
+        closing = lines[-1] if len(lines) > 1 and FENCE_RE.match(lines[-1]) else ""
+        text = "\n".join(lines[1:-1] if closing else lines[1:])
+        fence_tokens = len(tokenizer.encode(f"{opening}\n{closing}", add_special_tokens=False).ids)
+        max_tokens = max(max_tokens - fence_tokens, 1)
+        first_max_tokens = max(first_max_tokens - fence_tokens, 1)
+
+    offsets = tokenizer.encode(text, add_special_tokens=False).offsets
+    pieces = []
+    start = 0
+    while start < len(offsets):
+        end = min(start + (max_tokens if pieces else first_max_tokens), len(offsets))
+        if end < len(offsets):
+            window_start, window_end = offsets[start][0], offsets[end][0]
+            window = text[window_start:window_end]
+            for separator in ("\n", ". ", "? ", "! "):
+                cut = window.rfind(separator)
+                if cut > len(window) // 2:
+                    cut_at = window_start + cut + len(separator)
+                    end = next(i for i in range(start + 1, end + 1) if offsets[i][0] >= cut_at)
+                    break
+        piece = text[offsets[start][0]:offsets[end - 1][1]].strip("\n")
+        if piece.strip():
+            pieces.append("\n".join(part for part in (opening, piece, closing) if part) if code else piece)
+        start = end
+    return pieces
+
+def chunk_markdown(text: str, max_tokens: Optional[int] = None, min_tokens: int = MIN_CHUNK_TOKENS) -> List[Dict]:
+    """
+    Split Markdown into chunks of at most max_tokens tokenizer tokens
+    (default: the configured budget, MAX_CHUNK_TOKENS).
+
+    Blocks (paragraphs, whole code blocks and headings) are packed in order.
+    A heading starts a new chunk once the current chunk holds min_tokens, and
+    a chunk never ends on a heading: when the block after carried headings
+    does not fit behind them, its first part is split off to fit. Otherwise
+    only blocks that do not fit in a chunk by themselves are split (see
+    split_oversized). Headings alone make a chunk only if they leave no room.
+
+    Returns:
+        List of {'content', 'heading_path', 'token_count'} dicts
+    """
+    max_tokens = max_tokens or _max_tokens
+    tokenizer = get_tokenizer()
+    blocks = split_markdown_blocks(text)
+    counts = [len(e.ids) for e in tokenizer.encode_batch([block for _, _, block in blocks], add_special_tokens=False)]
+
+    pieces = []
+    for (path, kind, block), count in zip(blocks, counts):
+        if count <= max_tokens:
+            pieces.append((path, kind, block, count))
+            continue
+        # Leave room for the heading line that usually introduces a long block
+        parts = split_oversized(block, max(max_tokens - 32, max_tokens // 2), tokenizer, code=(kind == "code"))
+        part_counts = [len(e.ids) for e in tokenizer.encode_batch(parts, add_special_tokens=False)]
+        pieces.extend((path, kind, part, part_count) for part, part_count in zip(parts, part_counts))
+
+    chunks, current, current_tokens = [], [], 0
+
+    def flush():
+        # Trailing headings move on to the chunk they introduce
+        carry = []
+        while current and current[-1][1] == "heading" and len(carry) < len(current) - 1:
+            carry.insert(0, current.pop())
+        chunks.append(current[:])
+        current[:] = carry
+
+    def split_behind_headings(piece, room):
+        # The piece's first part sized to fit behind the current headings, then the rest
+        path, kind, block, _ = piece
+        if kind == "heading" or room <= 0:
+            return []
+        parts = split_oversized(block, max_tokens, tokenizer, code=(kind == "code"), first_max_tokens=room)
+        part_counts = [len(e.ids) for e in tokenizer.encode_batch(parts, add_special_tokens=False)]
+        if not parts or part_counts[0] > room:
+            return []
+        return [(path, kind, part, part_count) for part, part_count in zip(parts, part_counts)]
+
+    queue = deque(pieces)
+    while queue:
+        piece = queue.popleft()
+        count = piece[3]
+        if current and (current_tokens + count > max_tokens
+                        or (piece[1] == "heading" and current_tokens >= min_tokens)):
+            if any(p[1] != "heading" for p in current):
+                flush()
+                current_tokens = sum(p[3] for p in current)
+            if current and current_tokens + count > max_tokens:
+                parts = split_behind_headings(piece, max_tokens - current_tokens)
+                if parts:
+                    queue.extendleft(reversed(parts))
+                    continue
+                chunks.append(current[:])
+                current.clear()
+                current_tokens = 0
+        current.append(piece)
+        current_tokens += count
+    if current:
+        chunks.append(current)
+
+    contents = ["\n\n".join(p[2] for p in chunk) for chunk in chunks]
+    token_counts = [len(e.ids) for e in tokenizer.encode_batch(contents, add_special_tokens=False)]
+    return [{'content': content, 'heading_path': " > ".join(chunk[0][0]), 'token_count': token_count}
+            for chunk, content, token_count in zip(chunks, contents, token_counts)]
 
 def process_markdown_file(file_path: Path) -> List[Dict]:
     """Process a single markdown file and return chunks with metadata."""
@@ -56,7 +258,7 @@ def process_markdown_file(file_path: Path) -> List[Dict]:
             return []
         
         # Create chunks
-        chunks = chunk_text(clean_content)
+        chunks = chunk_markdown(clean_content)
         
         # Create chunk records with metadata
         chunk_records = []
@@ -67,8 +269,10 @@ def process_markdown_file(file_path: Path) -> List[Dict]:
                 'id': f"{relative_path}_{i}",
                 'source_file': str(relative_path),
                 'chunk_index': i,
-                'content': chunk,
-                'word_count': len(chunk.split())
+                'content': chunk['content'],
+                'heading_path': chunk['heading_path'],
+                'word_count': len(chunk['content'].split()),
+                'token_count': chunk['token_count']
             }
             chunk_records.append(chunk_record)
         
@@ -78,42 +282,135 @@ def process_markdown_file(file_path: Path) -> List[Dict]:
         print(f"Error processing {file_path}: {e}")
         return []
 
-def process_all_docs():
-    """Process all markdown files in the docs directory."""
+def file_sha256(file_path: Path) -> str:
+    """Return the SHA-256 hex digest of a file's bytes."""
+    with open(file_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def file_language(relative_path: Path) -> str:
+    """Return the docs language of a file: <lang> for source/<lang>/..., else 'en'."""
+    parts = Path(relative_path).parts
+    if len(parts) > 2 and parts[0] == "source":
+        return parts[1]
+    return "en"
+
+def find_markdown_files(languages: Optional[Iterable[str]] = None) -> List[Path]:
+    """Return all markdown files in a stable order, optionally limited to some languages."""
+    md_files = sorted(RAW_DOCS_DIR.glob("**/*.md"))
+    if languages is not None:
+        languages = set(languages)
+        md_files = [p for p in md_files if file_language(p.relative_to(RAW_DOCS_DIR)) in languages]
+    return md_files
+
+def process_file_for_store(file_path: Path) -> Tuple[str, str, List[Dict]]:
+    """Worker entry point: return (relative path, content hash, chunk records) for one file."""
+    return str(file_path.relative_to(RAW_DOCS_DIR)), file_sha256(file_path), process_markdown_file(file_path)
+
+def iter_processed_files(md_files: List[Path], workers: Optional[int] = None) -> Iterator[Tuple[str, str, List[Dict]]]:
+    """
+    Chunk files in a process pool and yield results in input order.
+
+    At most a few tasks per worker are in flight at once, so memory stays
+    bounded by the window size rather than the corpus size.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for md_file in md_files:
+            yield process_file_for_store(md_file)
+        return
+
+    max_pending = workers * 4
+    with ProcessPoolExecutor(max_workers=workers, initializer=configure_chunker,
+                             initargs=(_tokenizer_name, _max_tokens)) as executor:
+        pending = deque()
+        for md_file in md_files:
+            pending.append(executor.submit(process_file_for_store, md_file))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def load_manifest() -> Dict:
+    """Load the manifest ({'languages', 'chunker', 'files': {path: {sha256, chunk_ids}}}), or {} if none exists."""
+    if not MANIFEST_FILE.exists():
+        return {}
+    with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(files: Dict[str, Dict], languages: Optional[List[str]] = None) -> None:
+    """Write the per-file manifest atomically."""
+    tmp_file = MANIFEST_FILE.with_suffix(".json.tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({'languages': languages, 'chunker': chunker_config(), 'files': files}, f, indent=2,
+                  ensure_ascii=False)
+    os.replace(tmp_file, MANIFEST_FILE)
+
+def process_all_docs(languages: Optional[List[str]] = None, workers: Optional[int] = None):
+    """
+    Process all markdown files in the docs directory into the chunk store.
+
+    Files are chunked in parallel and streamed into the store in a
+    deterministic (sorted path) order.
+
+    Args:
+        languages: Only include docs/source/<lang> trees for these languages
+        workers: Number of worker processes (defaults to all cores)
+    """
     # Create output directory
     PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
     
     # Find all markdown files
-    md_files = list(RAW_DOCS_DIR.glob("**/*.md"))
+    md_files = find_markdown_files(languages)
     print(f"Found {len(md_files)} markdown files")
     
-    all_chunks = []
     processed_files = 0
+    total_words = 0
+    total_tokens = 0
+    manifest = {}
+    start_time = time.time()
     
-    for md_file in md_files:
-        print(f"Processing: {md_file.relative_to(RAW_DOCS_DIR)}")
-        chunks = process_markdown_file(md_file)
-        all_chunks.extend(chunks)
-        processed_files += 1
-        
-        if processed_files % 10 == 0:
-            print(f"Processed {processed_files}/{len(md_files)} files...")
-    
-    # Save all chunks to JSON file
-    output_file = PROCESSED_DIR / "chunks.json"
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(all_chunks, f, indent=2, ensure_ascii=False)
+    # Stream chunks into the columnar chunk store as workers finish
+    with ChunkStoreWriter(CHUNK_STORE_DIR) as writer:
+        for relative_path, sha256, chunks in iter_processed_files(md_files, workers):
+            for chunk in chunks:
+                writer.add(chunk)
+                total_words += chunk['word_count']
+                total_tokens += chunk['token_count']
+            manifest[relative_path] = {
+                'sha256': sha256,
+                'chunk_ids': [chunk['id'] for chunk in chunks]
+            }
+            processed_files += 1
+            
+            if processed_files % 100 == 0:
+                print(f"Processed {processed_files}/{len(md_files)} files...")
+        total_chunks = len(writer)
+    save_manifest(manifest, sorted(languages) if languages else None)
+
+    # Collapse near-duplicates before indexing, then precompute chunk features
+    from src.dedup import build_dedup
+    from src.features import build_features
+    build_dedup()
+    build_features()
     
-    print(f"\nProcessing complete!")
-    print(f"Total chunks created: {len(all_chunks)}")
-    print(f"Output saved to: {output_file}")
+    print(f"\nProcessing complete in {time.time() - start_time:.2f} seconds!")
+    print(f"Total chunks created: {total_chunks}")
+    print(f"Output saved to: {CHUNK_STORE_DIR}")
     
     # Print some statistics
-    word_counts = [chunk['word_count'] for chunk in all_chunks]
-    avg_words = sum(word_counts) / len(word_counts) if word_counts else 0
+    avg_words = total_words / total_chunks if total_chunks else 0
+    avg_tokens = total_tokens / total_chunks if total_chunks else 0
     
-    print(f"Average chunk size: {avg_words:.1f} words")
+    print(f"Average chunk size: {avg_words:.1f} words, {avg_tokens:.1f} tokens")
     print(f"Processed files: {processed_files}")
 
 if __name__ == "__main__":
-    process_all_docs()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Chunk the Transformers docs into the chunk store.")
+    parser.add_argument("--languages", help="Comma-separated docs languages to include, e.g. en,de")
+    parser.add_argument("--workers", type=int, help="Number of worker processes")
+    parser.add_argument("--tokenizer", default=CHUNK_TOKENIZER,
+                        help="Tokenizer used to size chunks (Hub id, directory or tokenizer.json)")
+    parser.add_argument("--max-tokens", type=int, default=MAX_CHUNK_TOKENS, help="Token budget per chunk")
+    args = parser.parse_args()
+    configure_chunker(args.tokenizer, args.max_tokens)
+    process_all_docs(args.languages.split(",") if args.languages else None, args.workers)
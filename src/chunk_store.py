@@ -0,0 +1,220 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+# Define paths
+ROOT = Path(__file__).parent.parent
+CHUNK_STORE_DIR = ROOT / "data" / "processed_chunks" / "chunk_store"
+
+# Column layout of a chunk record
+STRING_COLUMNS = ("id", "source_file", "content", "heading_path")
+INT_COLUMNS = ("chunk_index", "word_count", "token_count")
+# Values for columns missing from a record (e.g. records copied from an older store)
+COLUMN_DEFAULTS = {"heading_path": "", "token_count": 0}
+
+def replace_dir(tmp_dir: Path, target_dir: Path) -> Path:
+    """
+    Move a fully written directory over target_dir: the old one is renamed
+    aside, the new one renamed in, then the old one deleted. Readers see the
+    old or the new directory, or for the moment between the renames none.
+    """
+    tmp_dir, target_dir = Path(tmp_dir), Path(target_dir)
+    old_dir = target_dir.with_name(target_dir.name + ".old")
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+    if target_dir.exists():
+        os.replace(target_dir, old_dir)
+    os.replace(tmp_dir, target_dir)
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+    return target_dir
+
+def chunk_key(chunk_id: str) -> int:
+    """Map a chunk ID to a stable non-negative 63-bit integer key."""
+    digest = hashlib.blake2b(chunk_id.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') & 0x7FFFFFFFFFFFFFFF
+
+class ChunkStoreWriter:
+    """
+    Stream chunk records into a columnar store directory.
+
+    Each string column is written to a UTF-8 blob with int64 offset and int32
+    length arrays; integer columns become int32 arrays. A sorted array of
+    chunk keys (see chunk_key) with matching row numbers serves as the
+    id -> row index. The store is written to a temporary directory and moved
+    into place on close(), so readers never see a half-written store. The
+    move is two renames (old store aside, new store in), so a reader opening
+    the store in between finds no directory; processes that must keep
+    serving during rebuilds should read index bundles (see src.bundle).
+    """
+
+    def __init__(self, store_dir: Path = CHUNK_STORE_DIR):
+        self.store_dir = Path(store_dir)
+        self.tmp_dir = self.store_dir.with_name(self.store_dir.name + ".tmp")
+        if self.tmp_dir.exists():
+            shutil.rmtree(self.tmp_dir)
+        self.tmp_dir.mkdir(parents=True)
+
+        self._blobs = {col: open(self.tmp_dir / f"{col}.bin", 'wb') for col in STRING_COLUMNS}
+        self._positions = {col: 0 for col in STRING_COLUMNS}
+        self._offsets: Dict[str, List[int]] = {col: [] for col in STRING_COLUMNS}
+        self._lengths: Dict[str, List[int]] = {col: [] for col in STRING_COLUMNS}
+        self._ints: Dict[str, List[int]] = {col: [] for col in INT_COLUMNS}
+        self._keys: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, record: Dict) -> int:
+        """Append one chunk record and return its row number."""
+        for col in STRING_COLUMNS:
+            data = str(record[col] if col in record else COLUMN_DEFAULTS[col]).encode('utf-8')
+            self._blobs[col].write(data)
+            self._offsets[col].append(self._positions[col])
+            self._lengths[col].append(len(data))
+            self._positions[col] += len(data)
+        for col in INT_COLUMNS:
+            self._ints[col].append(int(record[col] if col in record else COLUMN_DEFAULTS[col]))
+        self._keys.append(chunk_key(record['id']))
+        return len(self._keys) - 1
+
+    def close(self) -> Path:
+        """Write the index arrays and replace the previous store (each rename is atomic, the pair is not)."""
+        for col in STRING_COLUMNS:
+            self._blobs[col].close()
+            np.save(self.tmp_dir / f"{col}.offsets.npy", np.asarray(self._offsets[col], dtype=np.int64))
+            np.save(self.tmp_dir / f"{col}.lengths.npy", np.asarray(self._lengths[col], dtype=np.int32))
+        for col in INT_COLUMNS:
+            np.save(self.tmp_dir / f"{col}.npy", np.asarray(self._ints[col], dtype=np.int32))
+
+        keys = np.asarray(self._keys, dtype=np.int64)
+        order = np.argsort(keys, kind='stable')
+        np.save(self.tmp_dir / "keys.npy", keys[order])
+        np.save(self.tmp_dir / "key_rows.npy", order.astype(np.int32))
+
+        with open(self.tmp_dir / "meta.json", 'w', encoding='utf-8') as f:
+            json.dump({
+                'num_chunks': len(keys),
+                'string_columns': list(STRING_COLUMNS),
+                'int_columns': list(INT_COLUMNS),
+            }, f, indent=2)
+
+        # Swap the new store into place
+        return replace_dir(self.tmp_dir, self.store_dir)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            for blob in self._blobs.values():
+                blob.close()
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+def write_chunk_store(chunks, store_dir: Path = CHUNK_STORE_DIR) -> int:
+    """Write an iterable of chunk records to a chunk store and return the count."""
+    with ChunkStoreWriter(store_dir) as writer:
+        for chunk in chunks:
+            writer.add(chunk)
+        count = len(writer)
+    return count
+
+def _map_file(path: Path):
+    """Memory-map a file read-only; empty files map to an empty bytes object."""
+    if path.stat().st_size == 0:
+        return b""
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+class ChunkStore:
+    """
+    Read-only, memory-mapped view of a chunk store.
+
+    Rows follow the order chunks were written in, which is also the row order
+    of the FAISS index built from the store. Blobs and arrays are mapped
+    rather than read, so pages are shared between processes and only touched
+    passages become resident.
+    """
+
+    def __init__(self, store_dir: Path = CHUNK_STORE_DIR):
+        self.store_dir = Path(store_dir)
+        with open(self.store_dir / "meta.json", 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+
+        self._blobs = {}
+        self._offsets = {}
+        self._lengths = {}
+        for col in self.meta['string_columns']:
+            self._blobs[col] = _map_file(self.store_dir / f"{col}.bin")
+            self._offsets[col] = np.load(self.store_dir / f"{col}.offsets.npy", mmap_mode='r')
+            self._lengths[col] = np.load(self.store_dir / f"{col}.lengths.npy", mmap_mode='r')
+        self._ints = {col: np.load(self.store_dir / f"{col}.npy", mmap_mode='r')
+                      for col in self.meta['int_columns']}
+        self._keys = np.load(self.store_dir / "keys.npy", mmap_mode='r')
+        self._key_rows = np.load(self.store_dir / "key_rows.npy", mmap_mode='r')
+
+    def __len__(self) -> int:
+        return self.meta['num_chunks']
+
+    def has_column(self, column: str) -> bool:
+        """Check whether the store has a column (stores written before a column was added lack it)."""
+        return column in self._blobs or column in self._ints
+
+    def view(self, column: str, row: int) -> memoryview:
+        """Return a zero-copy view of the UTF-8 bytes of a string column."""
+        start = int(self._offsets[column][row])
+        return memoryview(self._blobs[column])[start:start + int(self._lengths[column][row])]
+
+    def get(self, column: str, row: int):
+        """Return one column value for a row."""
+        if column in self._ints:
+            return int(self._ints[column][row])
+        return str(self.view(column, row), 'utf-8')
+
+    def content(self, row: int) -> str:
+        """Return the passage text for a row."""
+        return self.get('content', row)
+
+    def column(self, column: str) -> np.ndarray:
+        """Return the memory-mapped array for an integer column."""
+        return self._ints[column]
+
+    def record(self, row: int) -> Dict:
+        """Return a full chunk record for a row."""
+        record = {col: self.get(col, row) for col in self.meta['string_columns']}
+        record.update({col: self.get(col, row) for col in self.meta['int_columns']})
+        return record
+
+    def rows_for_keys(self, keys) -> np.ndarray:
+        """Map chunk keys to rows; unknown keys map to -1."""
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(self._keys) == 0:
+            return np.full(keys.shape, -1, dtype=np.int64)
+        pos = np.searchsorted(self._keys, keys)
+        pos = np.minimum(pos, len(self._keys) - 1)
+        found = self._keys[pos] == keys
+        return np.where(found, self._key_rows[pos], -1).astype(np.int64)
+
+    def row_of(self, chunk_id: str) -> Optional[int]:
+        """Return the row for a chunk ID, or None if it is not in the store."""
+        row = int(self.rows_for_keys([chunk_key(chunk_id)])[0])
+        return row if row >= 0 else None
+
+    def iter_records(self) -> Iterator[Dict]:
+        """Iterate over all chunk records in row order."""
+        for row in range(len(self)):
+            yield self.record(row)
+
+    def close(self) -> None:
+        """Unmap the string blobs."""
+        for blob in self._blobs.values():
+            if isinstance(blob, mmap.mmap):
+                blob.close()
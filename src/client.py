@@ -0,0 +1,94 @@
+import json
+import os
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+# Set to the search service URL (e.g. http://127.0.0.1:8600) to query it instead of loading indexes locally
+SERVER_URL_ENV = "DOCU_RAG_SERVER_URL"
+CLIENT_TIMEOUT = 15.0  # seconds
+
+class SearchServiceError(RuntimeError):
+    """The search service answered with an error status."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"search service returned {status}: {message}")
+        self.status = status
+
+def server_url() -> Optional[str]:
+    """Return the configured search service URL, or None to retrieve in-process."""
+    url = os.environ.get(SERVER_URL_ENV, "").strip()
+    return url.rstrip("/") or None
+
+class SearchClient:
+    """Thin HTTP client for the search service in src.server."""
+
+    def __init__(self, base_url: str, timeout: float = CLIENT_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _post(self, path: str, payload: Dict) -> Dict:
+        response = self.session.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+        _check_status(response)
+        return response.json()
+
+    def search(self, query: str, top_k: int = 5, alpha: float = 0.7, **kwargs) -> List[Dict]:
+        """Retrieve top_k chunks for a query; same result format as retriever.retrieve()."""
+        return self._post("/search", {'query': query, 'top_k': top_k, 'alpha': alpha, **kwargs})['results']
+
+    def search_batch(self, queries: List[str], top_k: int = 5, alpha: float = 0.7, **kwargs) -> List[List[Dict]]:
+        """Retrieve top_k chunks for many queries in one request."""
+        return self._post("/search/batch", {'queries': queries, 'top_k': top_k, 'alpha': alpha, **kwargs})['results']
+
+    def search_stream(self, query: str, top_k: int = 5, alpha: float = 0.7,
+                      **kwargs) -> Iterator[Tuple[str, List[Dict]]]:
+        """Yield (stage, results) as the service streams them: fused results first, then reranked ones."""
+        payload = {'query': query, 'top_k': top_k, 'alpha': alpha, **kwargs}
+        with self.session.post(f"{self.base_url}/search/stream", json=payload, timeout=self.timeout,
+                               stream=True) as response:
+            _check_status(response)
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                message = json.loads(line)
+                if 'error' in message:
+                    raise SearchServiceError(response.status_code, message['error'])
+                yield message['stage'], message['results']
+
+    def health(self) -> Dict:
+        """Return the service's status, index version and served languages (also while it is loading)."""
+        response = self.session.get(f"{self.base_url}/health", timeout=self.timeout)
+        if response.status_code != 503:
+            response.raise_for_status()
+        return response.json()
+
+    def stats(self) -> Dict:
+        """Return the service's request, batching and cache counters."""
+        response = self.session.get(f"{self.base_url}/stats", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+def _check_status(response: requests.Response) -> None:
+    """Raise SearchServiceError with the service's error message for a non-200 response."""
+    if response.status_code != 200:
+        try:
+            message = response.json().get('error', response.text)
+        except ValueError:
+            message = response.text
+        raise SearchServiceError(response.status_code, message)
+
+_default_client: Optional[SearchClient] = None
+_default_lock = threading.Lock()
+
+def get_client() -> SearchClient:
+    """Return the process-wide client for the configured service URL."""
+    global _default_client
+    url = server_url()
+    if url is None:
+        raise RuntimeError(f"{SERVER_URL_ENV} is not set")
+    with _default_lock:
+        if _default_client is None or _default_client.base_url != url:
+            _default_client = SearchClient(url)
+    return _default_client
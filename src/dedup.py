@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import time
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from src.chunk import file_language
+from src.chunk_store import ChunkStore, CHUNK_STORE_DIR
+from src.features import store_fingerprint
+
+# Define paths
+ROOT = Path(__file__).parent.parent
+DEDUP_DIR = ROOT / "index" / "dedup"
+
+# MinHash over word shingles: NUM_PERM hash functions, split into LSH bands of BAND_ROWS rows.
+# Chunks sharing a band become candidates (~50% Jaccard for a 50% chance), and are collapsed
+# when their estimated Jaccard similarity reaches SIMILARITY_THRESHOLD.
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+BAND_ROWS = 4
+SIMILARITY_THRESHOLD = 0.8
+# "language" only collapses chunks of the same docs language, so every language shard stays
+# complete; "all" also collapses across translations (e.g. identical code blocks)
+DEDUP_SCOPE = "language"
+
+# Hash functions (a * x + b) mod p; a, b, x < p keep the product within uint64
+_MERSENNE_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(1)
+_PERM_A = _rng.integers(1, _MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64)
+_EMPTY = np.iinfo(np.uint64).max
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+def shingle_hashes(text: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """Hash the distinct lowercased word `size`-grams of a text (the whole text if it is shorter)."""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) <= size:
+        shingles = {" ".join(words)} if words else set()
+    else:
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(s.encode('utf-8')) % _MERSENNE_PRIME for s in shingles), dtype=np.uint64,
+                       count=len(shingles))
+
+def minhash_signature(text: str) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint64 values) of a text's shingles; all-max for empty text."""
+    hashes = shingle_hashes(text)
+    if len(hashes) == 0:
+        return np.full(NUM_PERM, _EMPTY, dtype=np.uint64)
+    return ((_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _MERSENNE_PRIME).min(axis=1)
+
+def find_duplicates(chunks: ChunkStore, threshold: float = SIMILARITY_THRESHOLD,
+                    scope: str = DEDUP_SCOPE) -> np.ndarray:
+    """
+    Map every chunk store row to its canonical row.
+
+    Rows are visited in store order. A row whose LSH buckets hold an
+    earlier canonical row with estimated Jaccard >= threshold becomes a
+    duplicate of the most similar one; otherwise it is canonical itself.
+    Comparing against canonical rows only keeps clusters from chaining.
+
+    Returns:
+        int64 array; canonical[row] == row for rows that stay indexed
+    """
+    if scope not in ("language", "all"):
+        raise ValueError(f"Unknown dedup scope: {scope} (expected 'language' or 'all')")
+    num_chunks = len(chunks)
+    canonical = np.arange(num_chunks, dtype=np.int64)
+    signatures = np.empty((num_chunks, NUM_PERM), dtype=np.uint64)
+    buckets: Dict[tuple, List[int]] = {}
+    bands = NUM_PERM // BAND_ROWS
+
+    for row in range(num_chunks):
+        signature = signatures[row] = minhash_signature(chunks.content(row))
+        if signature[0] == _EMPTY:
+            continue
+        group = file_language(chunks.get('source_file', row)) if scope == "language" else ""
+        keys = [(group, band, signature[band * BAND_ROWS:(band + 1) * BAND_ROWS].tobytes())
+                for band in range(bands)]
+        candidates = {other for key in keys for other in buckets.get(key, ())}
+        if candidates:
+            others = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            similarity = (signatures[others] == signature).mean(axis=1)
+            best = int(np.argmax(similarity))
+            if similarity[best] >= threshold:
+                canonical[row] = others[best]
+                continue
+        for key in keys:
+            buckets.setdefault(key, []).append(row)
+    return canonical
+
+def dedup_stats(chunks: ChunkStore, canonical: np.ndarray) -> Dict:
+    """Summarize what deduplication removed: chunks, tokens and per-language counts."""
+    duplicates = np.flatnonzero(canonical != np.arange(len(canonical)))
+    tokens = chunks.column('token_count') if chunks.has_column('token_count') else None
+    by_language = Counter(file_language(chunks.get('source_file', int(row))) for row in duplicates)
+    return {
+        'num_chunks': len(canonical),
+        'num_duplicates': len(duplicates),
+        'num_indexed': len(canonical) - len(duplicates),
+        'num_clusters': len(np.unique(canonical[duplicates])),
+        'duplicate_fraction': len(duplicates) / len(canonical) if len(canonical) else 0.0,
+        'duplicate_tokens': int(np.asarray(tokens)[duplicates].sum()) if tokens is not None else None,
+        'duplicates_by_language': dict(sorted(by_language.items())),
+    }
+
+def build_dedup(store_dir: Path = CHUNK_STORE_DIR, dedup_dir: Path = DEDUP_DIR,
+                threshold: float = SIMILARITY_THRESHOLD, scope: str = DEDUP_SCOPE) -> Dict:
+    """
+    Find near-duplicate chunks and save the row -> canonical row map next to the indexes.
+
+    The indexers then skip duplicate rows; each canonical chunk keeps its
+    duplicates as aliases (see ChunkDedup.aliases).
+
+    Returns:
+        dedup_stats() of the run
+    """
+    start_time = time.time()
+    chunks = ChunkStore(store_dir)
+    canonical = find_duplicates(chunks, threshold, scope)
+    stats = dedup_stats(chunks, canonical)
+    meta = {'store': store_fingerprint(store_dir), 'threshold': threshold, 'scope': scope,
+            'num_perm': NUM_PERM, 'band_rows': BAND_ROWS, 'shingle_size': SHINGLE_SIZE, 'stats': stats}
+
+    tmp_dir = Path(dedup_dir).with_name(Path(dedup_dir).name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+    np.save(tmp_dir / "canonical.npy", canonical)
+    with open(tmp_dir / "meta.json", 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    if Path(dedup_dir).exists():
+        shutil.rmtree(dedup_dir)
+    os.replace(tmp_dir, dedup_dir)
+
+    print(f"Collapsed {stats['num_duplicates']} of {stats['num_chunks']} chunks "
+          f"({stats['duplicate_fraction']:.1%}) into {stats['num_clusters']} canonical chunks in "
+          f"{time.time() - start_time:.2f} seconds; {stats['num_indexed']} chunks will be indexed")
+    if stats['duplicate_tokens'] is not None:
+        print(f"Duplicate tokens removed from the indexes: {stats['duplicate_tokens']}")
+    for language, count in stats['duplicates_by_language'].items():
+        print(f"  {language}: {count} duplicates")
+    return stats
+
+class ChunkDedup:
+    """
+    Row -> canonical row map of a chunk store, with alias lookup.
+
+    Loaded from build_dedup output. When none was built every row is its
+    own canonical row (nothing collapsed); when it was built for another
+    version of the store it is recomputed in memory.
+    """
+
+    def __init__(self, chunks: ChunkStore, dedup_dir: Path = DEDUP_DIR):
+        meta_file = Path(dedup_dir) / "meta.json"
+        self.meta = None
+        if meta_file.exists():
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                self.meta = json.load(f)
+        if self.meta is None:
+            self.canonical = np.arange(len(chunks), dtype=np.int64)
+        elif self.meta.get('store') == store_fingerprint(chunks.store_dir):
+            self.canonical = np.load(Path(dedup_dir) / "canonical.npy", mmap_mode='r')
+        else:
+            print(f"Chunk dedup in {dedup_dir} is stale; recomputing it in memory")
+            self.canonical = find_duplicates(chunks, self.meta['threshold'], self.meta['scope'])
+
+        # Duplicate rows grouped by canonical row, for alias lookup
+        rows = np.arange(len(self.canonical))
+        duplicates = rows[np.asarray(self.canonical) != rows]
+        order = np.argsort(np.asarray(self.canonical)[duplicates], kind='stable')
+        self._alias_rows = duplicates[order]
+        self._alias_of = np.asarray(self.canonical)[self._alias_rows]
+
+    def __len__(self) -> int:
+        return len(self.canonical)
+
+    def indexed_rows(self) -> np.ndarray:
+        """Canonical rows (ascending): the rows the indexes contain."""
+        return np.flatnonzero(np.asarray(self.canonical) == np.arange(len(self.canonical)))
+
+    def duplicate_rows(self) -> np.ndarray:
+        """Rows collapsed into another chunk (ascending)."""
+        return np.sort(self._alias_rows)
+
+    def aliases(self, row: int) -> np.ndarray:
+        """Rows collapsed into a canonical row, in store order."""
+        start, end = np.searchsorted(self._alias_of, [row, row + 1])
+        return self._alias_rows[start:end]
+
+def indexed_rows(chunks: ChunkStore, dedup_dir: Path = DEDUP_DIR) -> np.ndarray:
+    """Rows of a chunk store that the indexes should contain (all rows if dedup was never run)."""
+    return ChunkDedup(chunks, dedup_dir).indexed_rows()
+
+def duplicate_ids(chunks: ChunkStore, dedup_dir: Path = DEDUP_DIR) -> Set[str]:
+    """IDs of the chunks left out of the indexes as duplicates."""
+    return {chunks.get('id', int(row)) for row in ChunkDedup(chunks, dedup_dir).duplicate_rows()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collapse near-duplicate chunks before indexing.")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD,
+                        help="Estimated Jaccard similarity of word shingles at which chunks are collapsed")
+    parser.add_argument("--scope", default=DEDUP_SCOPE, choices=("language", "all"),
+                        help="Collapse within each docs language, or across translations too")
+    parser.add_argument("--output", type=Path, help="Write the dedup report as JSON")
+    args = parser.parse_args()
+    stats = build_dedup(threshold=args.threshold, scope=args.scope)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, indent=2)
+    print("Rebuild the indexes (`python -m src.index_bm25`, `python -m src.index_faiss`) to apply it.")
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import re
+import unicodedata
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+# Define paths
+ROOT = Path(__file__).parent.parent
+EMBEDDING_CACHE_DIR = ROOT / "index" / "embedding_cache"
+
+# On-disk vector dtype; float16 halves the cache size at a small precision cost
+EMBEDDING_CACHE_DTYPE = "float32"
+
+def normalize_text(text: str) -> str:
+    """Normalize text before hashing so whitespace-only edits still hit the cache."""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text)).strip()
+
+def text_key(text: str) -> int:
+    """Map normalized text to a stable non-negative 63-bit integer key."""
+    digest = hashlib.blake2b(normalize_text(text).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') & 0x7FFFFFFFFFFFFFFF
+
+class EmbeddingCache:
+    """
+    On-disk cache of normalized embeddings keyed by (model name, text hash).
+
+    Each model gets its own directory holding a sorted int64 key array and a
+    vector array in the same order, both memory-mapped on load. New vectors
+    are buffered in memory until save() merges them into the files.
+    """
+
+    def __init__(self, model_name: str, cache_dir: Path = EMBEDDING_CACHE_DIR,
+                 dtype: str = EMBEDDING_CACHE_DTYPE):
+        self.model_name = model_name
+        self.cache_dir = Path(cache_dir) / re.sub(r'[^\w.-]+', '__', model_name)
+        self.dtype = np.dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+
+        keys_file = self.cache_dir / "keys.npy"
+        if keys_file.exists():
+            self._keys = np.load(keys_file, mmap_mode='r')
+            self._vectors = np.load(self.cache_dir / "vectors.npy", mmap_mode='r')
+        else:
+            self._keys = np.empty(0, dtype=np.int64)
+            self._vectors = None
+        self._pending_keys: List[int] = []
+        self._pending_vectors: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._pending_keys)
+
+    def _positions(self, keys: np.ndarray) -> np.ndarray:
+        """Return the position of each key in the saved arrays, or -1 if absent."""
+        if len(self._keys) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+        return np.where(self._keys[pos] == keys, pos, -1)
+
+    def encode(self, model, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """
+        Return float32 normalized embeddings for texts, encoding only cache misses.
+
+        Args:
+            model: SentenceTransformer used for texts not yet in the cache
+            texts: Texts to embed
+            batch_size: Encoding batch size for misses
+
+        Returns:
+            Array of shape (len(texts), dim)
+        """
+        keys = np.array([text_key(t) for t in texts], dtype=np.int64)
+        positions = self._positions(keys)
+        pending = dict(zip(self._pending_keys, self._pending_vectors))
+
+        # Collect unique misses (not saved and not pending)
+        miss_index = {}
+        for i, (key, pos) in enumerate(zip(keys.tolist(), positions.tolist())):
+            if pos == -1 and key not in pending and key not in miss_index:
+                miss_index[key] = i
+        self.misses += len(miss_index)
+        self.hits += len(texts) - len(miss_index)
+
+        if miss_index:
+            miss_keys = list(miss_index)
+            miss_texts = [texts[i] for i in miss_index.values()]
+            for start in range(0, len(miss_texts), batch_size):
+                batch = miss_texts[start:start + batch_size]
+                embs = model.encode(batch, show_progress_bar=False, convert_to_numpy=True,
+                                    normalize_embeddings=True).astype(self.dtype)
+                for key, emb in zip(miss_keys[start:start + batch_size], embs):
+                    pending[key] = emb
+                    self._pending_keys.append(key)
+                    self._pending_vectors.append(emb)
+
+        dim = model.get_sentence_embedding_dimension() if self._vectors is None else self._vectors.shape[1]
+        out = np.empty((len(texts), dim), dtype=np.float32)
+        hit_rows = positions >= 0
+        if hit_rows.any():
+            out[hit_rows] = self._vectors[positions[hit_rows]]
+        for i in np.flatnonzero(~hit_rows):
+            out[i] = pending[int(keys[i])]
+        return out
+
+    def save(self) -> None:
+        """Merge pending vectors into the cache files, replacing them atomically."""
+        if not self._pending_keys:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        new_keys = np.array(self._pending_keys, dtype=np.int64)
+        new_vectors = np.stack(self._pending_vectors).astype(self.dtype)
+        if self._vectors is not None:
+            new_keys = np.concatenate([np.asarray(self._keys), new_keys])
+            new_vectors = np.concatenate([np.asarray(self._vectors, dtype=self.dtype), new_vectors])
+        order = np.argsort(new_keys, kind='stable')
+
+        for name, array in (("keys", new_keys[order]), ("vectors", new_vectors[order])):
+            tmp_file = self.cache_dir / f"{name}.tmp.npy"
+            np.save(tmp_file, array)
+            os.replace(tmp_file, self.cache_dir / f"{name}.npy")
+
+        self._keys = np.load(self.cache_dir / "keys.npy", mmap_mode='r')
+        self._vectors = np.load(self.cache_dir / "vectors.npy", mmap_mode='r')
+        self._pending_keys = []
+        self._pending_vectors = []
+
+    def report(self) -> str:
+        """Return a one-line hit/miss summary."""
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"Embedding cache: {self.hits} hits, {self.misses} misses ({rate:.1%} hit rate)"
@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.chunk import file_language
+from src.chunk_store import ChunkStore, CHUNK_STORE_DIR
+
+# Define paths
+ROOT = Path(__file__).parent.parent
+FEATURES_DIR = ROOT / "index" / "features"
+
+# Doc-category flags, one bit each, matched against the lowercased source path
+DOC_CATEGORIES = {
+    # Getting-started material (the original filename boost list)
+    'guide_doc': ("tokenizer", "quickstart", "getting_started", "quicktour", "tutorial", "usage", "installation"),
+    'model_doc': ("model_doc/",),
+    'task_guide': ("tasks/",),
+    'api_reference': ("main_classes/", "internal/"),
+}
+# Content flags
+CONTENT_FLAGS = ("has_code",)
+FLAGS = tuple(DOC_CATEGORIES) + CONTENT_FLAGS
+
+# Section types, matched against the heading path from the deepest heading up;
+# the first type with a matching keyword wins, chunks without a match are "other"
+SECTION_TYPES = (
+    ("installation", ("install", "setup", "set up", "requirements")),
+    ("troubleshooting", ("troubleshoot", "error", "debug", "faq", "common issues")),
+    ("training", ("train", "fine-tun", "finetun")),
+    ("inference", ("inference", "pipeline", "generat", "predict")),
+    ("example", ("example", "usage", "quickstart", "quick start", "how to", "tutorial")),
+    ("overview", ("overview", "introduction", "abstract")),
+    ("reference", ("config", "class", "api", "reference", "parameter", "argument")),
+)
+SECTIONS = ("other",) + tuple(name for name, _ in SECTION_TYPES)
+
+# Default boost table: flag names, "section:<type>" or "language:<code>" -> score added after fusion,
+# as a fraction of the fused score range (src.fusion.fused_score_scale), so a boost nudges the
+# rerank pool rather than overriding relevance: 0.1 is a tenth of the minmax range
+BOOSTS = {'guide_doc': 0.1, 'has_code': 0.05}
+
+def section_type(heading_path: str) -> str:
+    """Classify a chunk by its heading path ("A > B > C"), deepest heading first."""
+    for heading in reversed(heading_path.lower().split(" > ")):
+        for name, keywords in SECTION_TYPES:
+            if any(k in heading for k in keywords):
+                return name
+    return "other"
+
+def compute_features(chunks: ChunkStore) -> Dict:
+    """Compute row-aligned flag, section and language arrays for a chunk store."""
+    num_chunks = len(chunks)
+    flags = np.zeros(num_chunks, dtype=np.uint16)
+    sections = np.zeros(num_chunks, dtype=np.uint8)
+    languages = np.zeros(num_chunks, dtype=np.uint8)
+    language_codes: List[str] = []
+    has_headings = chunks.has_column('heading_path')
+
+    for row in range(num_chunks):
+        source = chunks.get('source_file', row)
+        lowered = source.lower()
+        bits = 0
+        for bit, keywords in enumerate(DOC_CATEGORIES.values()):
+            if any(k in lowered for k in keywords):
+                bits |= 1 << bit
+        if "```" in chunks.content(row):
+            bits |= 1 << FLAGS.index('has_code')
+        flags[row] = bits
+        if has_headings:
+            sections[row] = SECTIONS.index(section_type(chunks.get('heading_path', row)))
+        language = file_language(source)
+        if language not in language_codes:
+            language_codes.append(language)
+        languages[row] = language_codes.index(language)
+
+    return {'flags': flags, 'section': sections, 'language': languages,
+            'meta': {'num_chunks': num_chunks, 'flags': list(FLAGS), 'sections': list(SECTIONS),
+                     'languages': language_codes}}
+
+def store_fingerprint(store_dir: Path) -> str:
+    """Identify a chunk store version by its meta file's size and mtime."""
+    stat = (Path(store_dir) / "meta.json").stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+def build_features(store_dir: Path = CHUNK_STORE_DIR, features_dir: Path = FEATURES_DIR) -> Path:
+    """Precompute chunk features and save them next to the indexes, aligned with chunk store rows."""
+    start_time = time.time()
+    chunks = ChunkStore(store_dir)
+    features = compute_features(chunks)
+    features['meta']['store'] = store_fingerprint(store_dir)
+
+    tmp_dir = Path(features_dir).with_name(Path(features_dir).name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+    for name in ("flags", "section", "language"):
+        np.save(tmp_dir / f"{name}.npy", features[name])
+    with open(tmp_dir / "meta.json", 'w', encoding='utf-8') as f:
+        json.dump(features['meta'], f, indent=2)
+
+    if Path(features_dir).exists():
+        shutil.rmtree(features_dir)
+    os.replace(tmp_dir, features_dir)
+    print(f"Chunk features for {len(chunks)} chunks built in {time.time() - start_time:.2f} seconds")
+    return Path(features_dir)
+
+class ChunkFeatures:
+    """
+    Row-aligned per-chunk features: a flag bitmask, a section type and a language code.
+
+    Loaded from build_features output, or computed from the chunk store
+    when that is missing or was built for another version of the store.
+    """
+
+    def __init__(self, chunks: ChunkStore, features_dir: Path = FEATURES_DIR):
+        features_dir = Path(features_dir)
+        meta_file = features_dir / "meta.json"
+        meta = None
+        if meta_file.exists():
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        if meta is not None and meta.get('store') == store_fingerprint(chunks.store_dir) \
+                and meta['flags'] == list(FLAGS) and meta['sections'] == list(SECTIONS):
+            self.meta = meta
+            self.flags = np.load(features_dir / "flags.npy", mmap_mode='r')
+            self.section = np.load(features_dir / "section.npy", mmap_mode='r')
+            self.language = np.load(features_dir / "language.npy", mmap_mode='r')
+        else:
+            print(f"Chunk features in {features_dir} are missing or stale; computing them in memory")
+            features = compute_features(chunks)
+            self.meta = features['meta']
+            self.flags, self.section, self.language = features['flags'], features['section'], features['language']
+
+    def __len__(self) -> int:
+        return len(self.flags)
+
+    def mask(self, name: str) -> np.ndarray:
+        """Boolean row mask for a flag, "section:<type>" or "language:<code>"."""
+        if name in FLAGS:
+            return (self.flags >> FLAGS.index(name)) & 1 == 1
+        kind, _, value = name.partition(":")
+        if kind == "section" and value in SECTIONS:
+            return self.section == SECTIONS.index(value)
+        if kind == "language":
+            if value not in self.meta['languages']:
+                return np.zeros(len(self), dtype=bool)
+            return self.language == self.meta['languages'].index(value)
+        raise ValueError(f"Unknown chunk feature: {name} (expected one of {FLAGS}, section:<type> or "
+                         f"language:<code>)")
+
+    def boost_vector(self, boosts: Dict[str, float]) -> np.ndarray:
+        """Per-row score boost for a boost table; index it with candidate rows at query time."""
+        vector = np.zeros(len(self), dtype=np.float32)
+        for name, weight in boosts.items():
+            vector[self.mask(name)] += weight
+        return vector
+
+def load_boost_table(path: Optional[Path]) -> Dict[str, float]:
+    """Read a JSON boost table ({feature: boost}, see BOOSTS), or return the default BOOSTS for None."""
+    if path is None:
+        return dict(BOOSTS)
+    with open(path, 'r', encoding='utf-8') as f:
+        return {name: float(weight) for name, weight in json.load(f).items()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute per-chunk features for retrieval boosts.")
+    parser.parse_args()
+    build_features()
@@ -0,0 +1,82 @@
+from typing import Tuple
+
+import numpy as np
+
+# Fusion strategies for combining sparse and dense candidates:
+#   sum    - raw weighted sum (legacy: unbounded BM25 plus cosine)
+#   minmax - weighted sum of per-query min-max normalized scores
+#   zscore - weighted sum of per-query z-scores
+#   rrf    - weighted Reciprocal Rank Fusion
+FUSION_MODES = ("sum", "minmax", "zscore", "rrf")
+RRF_K = 60
+# Rough width of each mode's fused score range, the unit boost tables are given in (see
+# src.features.BOOSTS): minmax scores lie in [0, 1] and z-scores of a candidate list mostly within
+# +-2; RRF's width depends on the candidate depth (see fused_score_scale). For sum it keeps the
+# legacy +2.0 / +1.0 boosts of the default table.
+FUSED_SCORE_SCALES = {"sum": 20.0, "minmax": 1.0, "zscore": 4.0}
+
+def fused_score_scale(mode: str, depth: int = 50, rrf_k: int = RRF_K) -> float:
+    """Width of a fusion mode's score range over `depth` candidates per side, for scaling boosts to it."""
+    if mode not in FUSION_MODES:
+        raise ValueError(f"Unknown fusion mode: {mode} (expected one of {FUSION_MODES})")
+    if mode == "rrf":
+        return 1.0 / (rrf_k + 1) - 1.0 / (rrf_k + max(depth, 1))
+    return FUSED_SCORE_SCALES[mode]
+
+def normalize_scores(scores: np.ndarray, method: str) -> np.ndarray:
+    """Normalize one retriever's candidate scores (minmax to [0, 1], or zscore)."""
+    scores = np.asarray(scores, dtype=np.float32)
+    if len(scores) == 0 or method == "sum":
+        return scores
+    if method == "minmax":
+        spread = scores.max() - scores.min()
+        return (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+    if method == "zscore":
+        std = scores.std()
+        return (scores - scores.mean()) / std if std > 0 else np.zeros_like(scores)
+    raise ValueError(f"Unknown normalization: {method}")
+
+def rrf_scores(scores: np.ndarray, k: int = RRF_K) -> np.ndarray:
+    """Reciprocal rank scores 1 / (k + rank), rank 1 being the highest score."""
+    ranks = np.empty(len(scores), dtype=np.float32)
+    ranks[np.argsort(-np.asarray(scores), kind='stable')] = np.arange(1, len(scores) + 1)
+    return 1.0 / (k + ranks)
+
+def fuse_scores(sparse_rows: np.ndarray, sparse_scores: np.ndarray, dense_rows: np.ndarray,
+                dense_scores: np.ndarray, alpha: float, mode: str = "minmax",
+                rrf_k: int = RRF_K) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fuse sparse and dense candidates over the union of their rows.
+
+    Each side is converted to the mode's scale and the two are combined as
+    (1 - alpha) * sparse + alpha * dense. A candidate missing from one side
+    gets that side's floor: 0 for sum, minmax and rrf, and the lowest
+    z-score of the side for zscore.
+
+    Args:
+        sparse_rows, sparse_scores: BM25 candidates (chunk store rows) and scores
+        dense_rows, dense_scores: FAISS candidates and scores
+        alpha: Weight of the dense side (0 = sparse only, 1 = dense only)
+        mode: One of FUSION_MODES
+        rrf_k: RRF rank offset
+
+    Returns:
+        (rows, fused scores) over the union of candidates, rows ascending
+    """
+    if mode not in FUSION_MODES:
+        raise ValueError(f"Unknown fusion mode: {mode} (expected one of {FUSION_MODES})")
+    rows = np.union1d(sparse_rows, dense_rows).astype(np.int64)
+    fused = np.zeros(len(rows), dtype=np.float32)
+    for side_rows, side_scores, weight in ((sparse_rows, sparse_scores, 1.0 - alpha),
+                                           (dense_rows, dense_scores, alpha)):
+        if len(side_rows) == 0:
+            continue
+        if mode == "rrf":
+            values = rrf_scores(side_scores, rrf_k)
+        else:
+            values = normalize_scores(side_scores, mode)
+        floor = values.min() if mode == "zscore" else 0.0
+        side = np.full(len(rows), floor, dtype=np.float32)
+        side[np.searchsorted(rows, side_rows)] = values
+        fused += weight * side
+    return rows, fused
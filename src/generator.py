@@ -1,9 +1,54 @@
+import logging
+import os
 import streamlit as st
+import requests
 from pathlib import Path
-from src.retriever import retrieve
+from src.client import SearchServiceError, server_url, get_client
+from src.metrics import REGISTRY, serve_metrics
+from src.retriever import RERANKED_STAGE, retrieve, retrieve_progressive, get_retriever
+from src.shards import built_languages
 
 # Configuration
 ROOT = Path(__file__).parent.parent
+# Set to a port to expose this process's Prometheus metrics at http://<host>:<port>/metrics
+METRICS_PORT_ENV = "DOCU_RAG_METRICS_PORT"
+
+logger = logging.getLogger(__name__)
+
+@st.cache_resource
+def start_metrics_server():
+    """Start the metrics endpoint once per Streamlit process if METRICS_PORT_ENV is set."""
+    port = os.environ.get(METRICS_PORT_ENV, "").strip()
+    return serve_metrics(int(port)) if port else None
+
+def warm_up_retriever() -> None:
+    """
+    Start loading indexes and models in the background.
+
+    Safe to call on every Streamlit rerun; only the first call starts loading.
+    Nothing is loaded when searches go to a search service.
+    """
+    start_metrics_server()
+    if server_url() is None:
+        get_retriever().warm_up(background=True)
+
+@st.cache_data(ttl=60)
+def search_languages() -> list:
+    """
+    Docs languages with a built shard, for the language picker (empty when
+    the index is not sharded or the search service is unreachable).
+    """
+    if server_url() is not None:
+        try:
+            return get_client().health().get('languages') or []
+        except (SearchServiceError, requests.RequestException, ValueError):
+            return []
+    retriever = get_retriever()
+    if retriever.is_loaded("shards"):
+        return sorted(retriever.shards)
+    # Still warming up: read the shard list without loading the shards
+    languages = built_languages(retriever.snapshot.paths.shards)
+    return [lang for lang in languages if retriever.languages is None or lang in retriever.languages]
 
 def format_search_results(contexts: list) -> list:
     """
@@ -20,14 +65,17 @@ def format_search_results(contexts: list) -> list:
     for ctx in contexts:
         result = {
             'source': ctx.get('id', 'Unknown source'),
+            'heading_path': ctx.get('heading_path', ''),
             'content': ctx.get('content', ''),
-            'score': ctx.get('score', 0.0)
+            'score': ctx.get('score', 0.0),
+            'aliases': [alias['source_file'] for alias in ctx.get('aliases', [])]
         }
         results.append(result)
     
     return results
 
-def search_documents(query: str, top_k: int = 10, alpha: float = 0.7) -> list:
+def search_documents(query: str, top_k: int = 10, alpha: float = 0.7, fusion: str = None,
+                     language: str = None, expand_aliases: bool = False) -> list:
     """
     Search Transformers documentation using hybrid retrieval.
     
@@ -35,26 +83,87 @@ def search_documents(query: str, top_k: int = 10, alpha: float = 0.7) -> list:
         query: User's search query
         top_k: Number of results to return
         alpha: Balance between dense (1.0) and sparse (0.0) search
+        fusion: Score fusion mode ("minmax", "zscore", "rrf" or "sum"; None = retriever default)
+        language: Docs language to search ("de", "all"; None or "auto" = detect from the query)
+        expand_aliases: Also list the files of near-duplicate passages collapsed into each result
         
     Returns:
         List of formatted search results
+
+    Raises:
+        Exception: Unexpected retrieval failures are logged, counted and
+            re-raised rather than shown as an empty result list
     """
     try:
-        # Retrieve relevant contexts using the hybrid approach
-        contexts = retrieve(query, top_k=top_k, alpha=alpha)
+        # Retrieve relevant contexts using the hybrid approach, via the search service if one is configured
+        remote = server_url() is not None
+        if remote:
+            contexts = get_client().search(query, top_k=top_k, alpha=alpha, fusion=fusion, language=language,
+                                           expand_aliases=expand_aliases)
+        else:
+            contexts = retrieve(query, top_k=top_k, alpha=alpha, fusion=fusion, language=language,
+                                expand_aliases=expand_aliases)
         
         # Format results for display
         results = format_search_results(contexts)
         
         # Display search info in sidebar
-        st.sidebar.success(f"Retrieved {len(results)} results")
-        st.sidebar.info(f"Search mode: {'Dense-focused' if alpha > 0.7 else 'Balanced' if alpha > 0.3 else 'Sparse-focused'}")
+        show_search_info(results, alpha, remote)
         
         return results
         
-    except Exception as e:
+    except (ValueError, SearchServiceError, requests.RequestException) as e:
+        # Bad settings or an unreachable / overloaded search service: tell the user, keep the page usable
+        logger.warning("Search failed for %r: %s", query, e)
+        REGISTRY.counter("search_errors_total", "Failed searches from the app", kind=type(e).__name__).inc()
         st.sidebar.error(f"Search error: {str(e)}")
         return []
+    except Exception as e:
+        logger.exception("Search failed for %r", query)
+        REGISTRY.counter("search_errors_total", "Failed searches from the app", kind=type(e).__name__).inc()
+        raise
+
+def search_documents_progressive(query: str, top_k: int = 10, alpha: float = 0.7, fusion: str = None,
+                                 language: str = None, expand_aliases: bool = False):
+    """
+    Search like search_documents(), yielding (stage, results) as each stage finishes.
+
+    Yields the fused results (FUSED_STAGE) as soon as BM25 and FAISS are done,
+    then the reranked results (RERANKED_STAGE) that replace them. A cached
+    query yields only the reranked stage. Handled errors are shown in the
+    sidebar and end the generator early, after whatever stage was yielded.
+    """
+    try:
+        remote = server_url() is not None
+        if remote:
+            stages = get_client().search_stream(query, top_k=top_k, alpha=alpha, fusion=fusion, language=language,
+                                                expand_aliases=expand_aliases)
+        else:
+            stages = retrieve_progressive(query, top_k=top_k, alpha=alpha, fusion=fusion, language=language,
+                                          expand_aliases=expand_aliases)
+        for stage, contexts in stages:
+            results = format_search_results(contexts)
+            if stage == RERANKED_STAGE:
+                show_search_info(results, alpha, remote)
+            yield stage, results
+
+    except (ValueError, SearchServiceError, requests.RequestException) as e:
+        logger.warning("Search failed for %r: %s", query, e)
+        REGISTRY.counter("search_errors_total", "Failed searches from the app", kind=type(e).__name__).inc()
+        st.sidebar.error(f"Search error: {str(e)}")
+    except Exception as e:
+        logger.exception("Search failed for %r", query)
+        REGISTRY.counter("search_errors_total", "Failed searches from the app", kind=type(e).__name__).inc()
+        raise
+
+def show_search_info(results: list, alpha: float, remote: bool) -> None:
+    """Show the result count, search mode and service / cache info in the sidebar."""
+    st.sidebar.success(f"Retrieved {len(results)} results")
+    st.sidebar.info(f"Search mode: {'Dense-focused' if alpha > 0.7 else 'Balanced' if alpha > 0.3 else 'Sparse-focused'}")
+    if remote:
+        st.sidebar.caption(f"Search service: {server_url()}")
+    else:
+        st.sidebar.caption(f"Result cache hit rate: {get_retriever().cache_stats()['results']['hit_rate']:.0%}")
 
 def get_search_summary(query: str, results: list) -> str:
     """
@@ -1,16 +1,21 @@
 import os
-import json
+import shutil
+import argparse
 from pathlib import Path
+from typing import List, Optional
 from whoosh import fields
 from whoosh.analysis import StandardAnalyzer
-from whoosh.index import create_in, exists_in
+from whoosh.index import create_in, open_dir
 from whoosh.qparser import QueryParser
 from whoosh import scoring
 import time
 
+from src.bm25_native import build_native_bm25_index
+from src.chunk_store import ChunkStore, CHUNK_STORE_DIR, replace_dir
+from src.dedup import indexed_rows
+
 # Define paths
 ROOT = Path(__file__).parent.parent
-CHUNKS_FILE = ROOT / "data" / "processed_chunks" / "chunks.json"
 BM25_INDEX_DIR = ROOT / "index" / "bm25_index"
 
 def create_schema():
@@ -25,31 +30,34 @@ def create_schema():
     return schema
 
 def load_chunks():
-    """Load processed chunks from JSON file."""
-    print(f"Loading chunks from {CHUNKS_FILE}")
-    with open(CHUNKS_FILE, 'r', encoding='utf-8') as f:
-        chunks = json.load(f)
+    """Open the processed chunk store."""
+    print(f"Loading chunks from {CHUNK_STORE_DIR}")
+    chunks = ChunkStore(CHUNK_STORE_DIR)
     print(f"Loaded {len(chunks)} chunks")
     return chunks
 
 def build_bm25_index():
-    """Build BM25 index using Whoosh."""
-    BM25_INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    """
+    Build BM25 index using Whoosh, skipping chunks collapsed as near-duplicates.
+
+    The index is written to bm25_index.tmp and replaces the old one once committed.
+    """
     chunks = load_chunks()
     schema = create_schema()
 
-    if exists_in(str(BM25_INDEX_DIR)):
-        print("Index already exists. Removing old index...")
-        import shutil
-        shutil.rmtree(BM25_INDEX_DIR)
-        BM25_INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_dir = BM25_INDEX_DIR.with_name(BM25_INDEX_DIR.name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
 
     print("Creating new BM25 index...")
-    ix = create_in(str(BM25_INDEX_DIR), schema)
+    ix = create_in(str(tmp_dir), schema)
 
     start_time = time.time()
     writer = ix.writer()
-    for i, chunk in enumerate(chunks):
+    rows = indexed_rows(chunks)
+    for i, row in enumerate(rows.tolist()):
+        chunk = chunks.record(row)
         try:
             writer.add_document(
                 id=chunk['id'],
@@ -59,19 +67,42 @@ def build_bm25_index():
                 word_count=chunk['word_count']
             )
             if (i + 1) % 500 == 0:
-                print(f"Indexed {i + 1}/{len(chunks)} chunks...")
+                print(f"Indexed {i + 1}/{len(rows)} chunks...")
         except Exception as e:
             print(f"Error indexing chunk {chunk['id']}: {e}")
 
     print("Committing index...")
     writer.commit()
+    ix.close()
+    replace_dir(tmp_dir, BM25_INDEX_DIR)
+    ix = open_dir(str(BM25_INDEX_DIR))
     elapsed_time = time.time() - start_time
     print(f"\nBM25 indexing complete!")
     print(f"Time elapsed: {elapsed_time:.2f} seconds")
-    print(f"Indexed {len(chunks)} chunks")
+    print(f"Indexed {len(rows)} of {len(chunks)} chunks")
     print(f"Index saved to: {BM25_INDEX_DIR}")
     return ix
 
+def build_bm25_shards(languages: Optional[List[str]] = None) -> List[str]:
+    """
+    Build one native BM25 index per docs language under index/shards/<lang>/bm25_native.
+
+    Each shard has its own term statistics, so a language's idf is not
+    diluted by the other translations.
+
+    Returns:
+        The languages built
+    """
+    from src.shards import SHARDS_DIR, language_rows, save_shard_rows
+
+    chunks = load_chunks()
+    rows = language_rows(chunks, languages)
+    save_shard_rows(chunks, rows)
+    for language, shard_rows in rows.items():
+        print(f"{language} shard: {len(shard_rows)} chunks")
+        build_native_bm25_index(CHUNK_STORE_DIR, SHARDS_DIR / language / "bm25_native", shard_rows)
+    return list(rows)
+
 def test_bm25_search(ix, query_text="transformer model", top_k=5):
     """Test the BM25 index with a sample query."""
     print(f"\n--- Testing BM25 Search ---")
@@ -90,6 +121,14 @@ def test_bm25_search(ix, query_text="transformer model", top_k=5):
             print(f"   Content preview: {result['content'][:150]}...")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the Whoosh and native BM25 indexes from the chunk store.")
+    parser.add_argument("--shards", action="store_true",
+                        help="Also build per-language native BM25 shards under index/shards/<lang>")
+    parser.add_argument("--languages", help="Comma-separated languages to shard (default: all)")
+    args = parser.parse_args()
     ix = build_bm25_index()
+    build_native_bm25_index()
+    if args.shards:
+        build_bm25_shards(args.languages.split(",") if args.languages else None)
     test_bm25_search(ix, "transformer model attention", top_k=3)
     test_bm25_search(ix, "hugging face tokenizer", top_k=3)
\ No newline at end of file
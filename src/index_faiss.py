@@ -1,86 +1,294 @@
 import os
 import json
+import shutil
 import faiss
 import numpy as np
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
 import time
+import argparse
+from typing import Dict, List, Optional
+
+from src.chunk_store import ChunkStore, CHUNK_STORE_DIR, chunk_key, replace_dir
+from src.dedup import indexed_rows
+from src.embedding_cache import EmbeddingCache
+from src.inference import load_embedding_model, embedding_cache_name
 
 # Define paths
 ROOT = Path(__file__).parent.parent
-CHUNKS_FILE = ROOT / "data" / "processed_chunks" / "chunks.json"
 FAISS_INDEX_DIR = ROOT / "index" / "faiss_index"
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
 EMBED_DIM = 384  # embedding dimension for all-MiniLM-L6-v2
 
+# Supported index types (see index_factory_string) and default search settings
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq", "opq", "sq8", "fp16")
+DEFAULT_NPROBE = 16
+DEFAULT_EF_SEARCH = 64
+# Map flat code storage (flat, SQ and PQ codes, HNSW vectors) from the index file instead of copying it into
+# RAM, so processes serving the same file share its pages. Index files are always replaced, never rewritten.
+FAISS_MMAP = True
+
 def load_chunks():
-    """Load processed chunks from JSON file."""
-    with open(CHUNKS_FILE, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    """Open the processed chunk store."""
+    return ChunkStore(CHUNK_STORE_DIR)
 
-def ensure_index_dir():
-    """Create or clear the FAISS index directory."""
-    if FAISS_INDEX_DIR.exists():
-        for f in FAISS_INDEX_DIR.iterdir():
-            f.unlink()
-    else:
-        FAISS_INDEX_DIR.mkdir(parents=True)
-
-def build_faiss_index():
-    """Build a FAISS IndexFlatIP for dense retrieval."""
-    # Load chunks
-    chunks = load_chunks()
-    texts = [chunk['content'] for chunk in chunks]
-    ids = [chunk['id'] for chunk in chunks]
+def staging_dir(index_dir: Path = FAISS_INDEX_DIR) -> Path:
+    """Create an empty <index_dir>.tmp to write a new index into; replace_dir() moves it into place."""
+    tmp_dir = Path(index_dir).with_name(Path(index_dir).name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+    return tmp_dir
 
-    # Load embedding model
-    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+def embed_chunks(chunks, model=None, batch_size: int = 64, rows: Optional[np.ndarray] = None):
+    """Return (embeddings, chunk keys) for every chunk store row (or `rows`), encoding only uncached texts."""
+    rows = list(range(len(chunks))) if rows is None else [int(row) for row in rows]
+    keys = np.array([chunk_key(chunks.get('id', row)) for row in rows], dtype=np.int64)
+
+    # Load embedding model (ONNX Runtime when exported, else PyTorch)
+    if model is None:
+        model = load_embedding_model(EMBEDDING_MODEL_NAME)
     
-    # Compute embeddings in batches
-    batch_size = 64
+    # Compute embeddings in batches, encoding only texts missing from the cache
+    cache = EmbeddingCache(embedding_cache_name(model, EMBEDDING_MODEL_NAME))
     embeddings = []
+    for i in range(0, len(rows), batch_size * 16):
+        batch_texts = [chunks.content(row) for row in rows[i:i + batch_size * 16]]
+        embeddings.append(cache.encode(model, batch_texts, batch_size=batch_size))
+        print(f"Embedded {i + len(batch_texts)}/{len(rows)} chunks")
+    embeddings = np.vstack(embeddings).astype('float32') if embeddings else np.zeros((0, EMBED_DIM), dtype='float32')
+    cache.save()
+    print(cache.report())
+    return embeddings, keys
+
+def default_nlist(n_vectors: int) -> int:
+    """Pick an IVF list count: ~4*sqrt(n), keeping at least 39 training points per list."""
+    return max(1, min(int(4 * np.sqrt(n_vectors)), n_vectors // 39))
+
+def index_factory_string(index_type: str, n_vectors: int, nlist: Optional[int] = None,
+                         hnsw_m: int = 32, pq_m: int = 48) -> str:
+    """
+    Return the FAISS index_factory description for an index type.
+
+    Args:
+        index_type: One of INDEX_TYPES
+        n_vectors: Number of vectors the index will be trained on
+        nlist: IVF list count (defaults to default_nlist)
+        hnsw_m: HNSW neighbours per node
+        pq_m: PQ sub-quantizers (must divide EMBED_DIM)
+
+    Returns:
+        Factory string; every type is wrapped in IDMap2 so it is labelled by chunk key
+    """
+    nlist = nlist or default_nlist(n_vectors)
+    descriptions = {
+        "flat": "Flat",
+        "ivf": f"IVF{nlist},Flat",
+        "hnsw": f"HNSW{hnsw_m}",
+        "ivfpq": f"IVF{nlist},PQ{pq_m}",
+        "opq": f"OPQ{pq_m},IVF{nlist},PQ{pq_m}",
+        "sq8": "SQ8",        # int8 scalar quantization, 1 byte per dimension
+        "fp16": "SQfp16",    # float16 storage, 2 bytes per dimension
+    }
+    if index_type not in descriptions:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {INDEX_TYPES}")
+    return "IDMap2," + descriptions[index_type]
+
+def create_faiss_index(embeddings: np.ndarray, keys: np.ndarray, index_type: str = "flat", **params):
+    """Create, train (if needed) and fill an ID-mapped inner-product index."""
+    description = index_factory_string(index_type, len(embeddings), **params)
+    index = faiss.index_factory(embeddings.shape[1], description, faiss.METRIC_INNER_PRODUCT)
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add_with_ids(embeddings, keys)
+    return index
+
+def search_parameters(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Return per-call FAISS SearchParameters for an index, or None if nothing applies."""
+    base = faiss.downcast_index(index.index) if hasattr(index, 'id_map') else index
+    if isinstance(base, faiss.IndexPreTransform):
+        base = faiss.downcast_index(base.index)
+    if nprobe is not None and isinstance(base, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(nprobe=nprobe)
+    if ef_search is not None and isinstance(base, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=ef_search)
+    return None
+
+def rescore_candidates(q_embs: np.ndarray, rows: np.ndarray, vectors: np.ndarray, top_k: int,
+                       vector_rows: Optional[np.ndarray] = None):
+    """
+    Re-rank shortlisted chunk store rows by exact float32 inner product.
+
+    Args:
+        q_embs: Query embeddings, shape (n, dim)
+        rows: Shortlisted rows per query, shape (n, shortlist); -1 marks a miss
+        vectors: Float32 embeddings (may be memory-mapped)
+        top_k: Results kept per query
+        vector_rows: Ascending chunk store row of each vector; None when
+            vectors are in chunk store row order
+
+    Returns:
+        (scores, rows), each of shape (n, top_k), padded with -inf / -1
+    """
+    out_scores = np.full((len(q_embs), top_k), -np.inf, dtype=np.float32)
+    out_rows = np.full((len(q_embs), top_k), -1, dtype=np.int64)
+    for i, (q_emb, candidates) in enumerate(zip(q_embs, rows)):
+        candidates = candidates[candidates >= 0]
+        if len(candidates) == 0:
+            continue
+        positions = candidates if vector_rows is None else np.searchsorted(vector_rows, candidates)
+        exact = np.asarray(vectors[positions], dtype=np.float32) @ q_emb
+        order = np.argsort(-exact, kind='stable')[:top_k]
+        out_scores[i, :len(order)] = exact[order]
+        out_rows[i, :len(order)] = candidates[order]
+    return out_scores, out_rows
+
+def save_rescore_vectors(embeddings: np.ndarray, index_dir: Path = FAISS_INDEX_DIR,
+                         rows: Optional[np.ndarray] = None) -> None:
+    """Save float32 embeddings for shortlist re-scoring, with the chunk store row of each (ascending)."""
+    rows = np.arange(len(embeddings)) if rows is None else rows
+    for name, array in (("vector_rows", np.asarray(rows, dtype=np.int64)),
+                        ("vectors", np.asarray(embeddings, dtype=np.float32))):
+        tmp_file = Path(index_dir) / f"{name}.tmp.npy"
+        np.save(tmp_file, array)
+        os.replace(tmp_file, Path(index_dir) / f"{name}.npy")
+
+def load_rescore_vectors(index_dir: Path = FAISS_INDEX_DIR):
+    """
+    Memory-map the re-scoring vectors saved next to an index.
+
+    Returns:
+        (vectors, vector_rows); vector_rows is None for indexes saved
+        before it was recorded, whose vectors are in chunk store row order
+    """
+    vectors = np.load(Path(index_dir) / "vectors.npy", mmap_mode='r')
+    rows_file = Path(index_dir) / "vector_rows.npy"
+    return vectors, (np.load(rows_file) if rows_file.exists() else None)
+
+def read_faiss_index(index_file: Path, mmap: bool = FAISS_MMAP):
+    """Read a FAISS index, memory-mapping its codes read-only where the index type and faiss version allow it."""
+    flags = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if mmap and flags is not None:
+        try:
+            return faiss.read_index(str(index_file), flags | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            pass
+    return faiss.read_index(str(index_file))
+
+def load_index_meta(index_dir: Path = FAISS_INDEX_DIR) -> Dict:
+    """Load the build settings saved next to a FAISS index (flat if none were saved)."""
+    meta_file = Path(index_dir) / "index_meta.json"
+    if not meta_file.exists():
+        return {'index_type': "flat", 'params': {}, 'nprobe': None, 'ef_search': None, 'rescore': 0}
+    with open(meta_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def build_faiss_index(index_type: str = "flat", nprobe: int = DEFAULT_NPROBE,
+                      ef_search: int = DEFAULT_EF_SEARCH, rescore: int = 0, index_dir: Path = FAISS_INDEX_DIR,
+                      rows: Optional[np.ndarray] = None, **params):
+    """
+    Build an ID-mapped FAISS index for dense retrieval, labelled by chunk key.
+
+    Args:
+        index_type: "flat" (exact), "ivf", "hnsw", "ivfpq", "opq", "sq8" or "fp16"
+        nprobe: Default IVF lists probed per query, saved with the index
+        ef_search: Default HNSW search depth, saved with the index
+        rescore: If > 0, save float32 vectors and re-score a shortlist of
+            rescore * top_k candidates exactly at query time
+        index_dir: Output directory
+        rows: Chunk store rows to index (default: every chunk not collapsed
+            as a near-duplicate, see src.dedup)
+        **params: nlist, hnsw_m or pq_m overrides for index_factory_string
+    """
+    # Load chunks and embeddings
+    chunks = load_chunks()
+    rows = indexed_rows(chunks) if rows is None else rows
     start_time = time.time()
-    for i in range(0, len(texts), batch_size):
-        batch_texts = texts[i:i + batch_size]
-        batch_emb = model.encode(batch_texts, show_progress_bar=False, convert_to_numpy=True, normalize_embeddings=True)
-        embeddings.append(batch_emb)
-        print(f"Encoded {i + len(batch_texts)}/{len(texts)} chunks")
-    embeddings = np.vstack(embeddings).astype('float32')
-
-    # Create FAISS index (Inner Product for cosine similarity)
-    index = faiss.IndexFlatIP(EMBED_DIM)
-    index.add(embeddings)
+    embeddings, keys = embed_chunks(chunks, rows=rows)
+
+    # Create FAISS index (Inner Product for cosine similarity), labelled by chunk key
+    # so incremental updates can remove and re-add individual chunks
+    index = create_faiss_index(embeddings, keys, index_type, **params)
     elapsed = time.time() - start_time
-    print(f"\nComputed embeddings and built index in {elapsed:.2f} seconds")
+    print(f"\nComputed embeddings and built {index_type} index in {elapsed:.2f} seconds")
     print(f"Total vectors indexed: {index.ntotal}")
 
-    # Save index and metadata
-    ensure_index_dir()
-    faiss.write_index(index, str(FAISS_INDEX_DIR / "index.faiss"))
-    with open(FAISS_INDEX_DIR / "ids.json", 'w', encoding='utf-8') as f:
-        json.dump(ids, f, indent=2, ensure_ascii=False)
-    print(f"FAISS index saved to: {FAISS_INDEX_DIR}")
+    # Save index and metadata next to the live index, then swap the directory in, so the
+    # retriever and bundle builds never read a half-written index
+    index_dir = Path(index_dir)
+    tmp_dir = staging_dir(index_dir)
+    faiss.write_index(index, str(tmp_dir / "index.faiss"))
+    with open(tmp_dir / "ids.json", 'w', encoding='utf-8') as f:
+        json.dump([chunks.get('id', int(row)) for row in rows], f, indent=2, ensure_ascii=False)
+    if rescore:
+        save_rescore_vectors(embeddings, tmp_dir, rows)
+    with open(tmp_dir / "index_meta.json", 'w', encoding='utf-8') as f:
+        json.dump({'index_type': index_type, 'params': params,
+                   'nprobe': nprobe, 'ef_search': ef_search, 'rescore': rescore}, f, indent=2)
+    replace_dir(tmp_dir, index_dir)
+    print(f"FAISS index saved to: {index_dir}")
+
+    return index, chunks
+
+def build_faiss_shards(languages: Optional[List[str]] = None, index_type: str = "flat",
+                       nprobe: int = DEFAULT_NPROBE, ef_search: int = DEFAULT_EF_SEARCH, rescore: int = 0,
+                       **params) -> List[str]:
+    """
+    Build one FAISS index per docs language under index/shards/<lang>/faiss_index.
 
-    return index, ids
+    Vectors come from the embedding cache, so shards built after the main
+    index cost no extra encoding. IVF list counts default to each shard's size.
+
+    Returns:
+        The languages built
+    """
+    from src.shards import SHARDS_DIR, language_rows, save_shard_rows
+
+    chunks = load_chunks()
+    rows = language_rows(chunks, languages)
+    save_shard_rows(chunks, rows)
+    for language, shard_rows in rows.items():
+        print(f"\n--- Building {language} shard ({len(shard_rows)} chunks) ---")
+        build_faiss_index(index_type, nprobe, ef_search, rescore, SHARDS_DIR / language / "faiss_index",
+                          shard_rows, **params)
+    return list(rows)
 
-def test_faiss_search(index, ids, query_text="transformer model", top_k=5):
+def test_faiss_search(index, chunks, query_text="transformer model", top_k=5):
     """Test FAISS index by encoding a query and retrieving nearest chunks."""
-    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    model = load_embedding_model(EMBEDDING_MODEL_NAME)
     q_emb = model.encode([query_text], convert_to_numpy=True, normalize_embeddings=True).astype('float32')
     
     start = time.time()
-    scores, idxs = index.search(q_emb, top_k)
+    meta = load_index_meta()
+    scores, idxs = index.search(q_emb, top_k, params=search_parameters(index, meta['nprobe'], meta['ef_search']))
     elapsed = time.time() - start
 
     print(f"\n--- Testing FAISS Search ---")
     print(f"Query: '{query_text}'")
     print(f"Search completed in {elapsed:.4f} seconds")
-    for rank, (score, idx) in enumerate(zip(scores[0], idxs[0]), start=1):
-        chunk_id = ids[idx]
+    rows = chunks.rows_for_keys(idxs[0])
+    for rank, (score, row) in enumerate(zip(scores[0], rows), start=1):
+        chunk_id = chunks.get('id', row)
         print(f"\n{rank}. Score: {score:.4f}")
         print(f"   ID: {chunk_id}")
 
 if __name__ == "__main__":
-    index, ids = build_faiss_index()
-    test_faiss_search(index, ids, "transformer attention", top_k=3)
-    test_faiss_search(index, ids, "tokenizer hugging face", top_k=3)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build the FAISS index from the chunk store.")
+    parser.add_argument("--type", default="flat", choices=INDEX_TYPES, help="Index type")
+    parser.add_argument("--nlist", type=int, help="IVF list count")
+    parser.add_argument("--hnsw-m", type=int, help="HNSW neighbours per node")
+    parser.add_argument("--pq-m", type=int, help="PQ sub-quantizers")
+    parser.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE, help="Default IVF lists probed per query")
+    parser.add_argument("--ef-search", type=int, default=DEFAULT_EF_SEARCH, help="Default HNSW search depth")
+    parser.add_argument("--rescore", type=int, default=0,
+                        help="Re-score rescore * top_k candidates with float32 vectors (0 = off)")
+    parser.add_argument("--shards", action="store_true",
+                        help="Also build per-language shard indexes under index/shards/<lang>")
+    parser.add_argument("--languages", help="Comma-separated languages to shard (default: all)")
+    args = parser.parse_args()
+    params = {k: v for k, v in (("nlist", args.nlist), ("hnsw_m", args.hnsw_m), ("pq_m", args.pq_m)) if v is not None}
+    if args.shards:
+        build_faiss_shards(args.languages.split(",") if args.languages else None, args.type, args.nprobe,
+                           args.ef_search, args.rescore, **params)
+    index, chunks = build_faiss_index(args.type, args.nprobe, args.ef_search, args.rescore, **params)
+    test_faiss_search(index, chunks, "transformer attention", top_k=3)
+    test_faiss_search(index, chunks, "tokenizer hugging face", top_k=3)
\ No newline at end of file
@@ -0,0 +1,243 @@
+import argparse
+import importlib.util
+import json
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+# Define paths
+ROOT = Path(__file__).parent.parent
+ONNX_MODEL_DIR = ROOT / "models" / "onnx"
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+RERANKER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# "torch" (sentence-transformers), "onnx" (ONNX Runtime), or "auto" (onnx when an exported model exists)
+INFERENCE_BACKEND = "auto"
+# Prefer the dynamically int8-quantized ONNX model when one was exported
+ONNX_QUANTIZED = True
+# ONNX Runtime intra-op threads (None = one per physical core)
+ONNX_THREADS = None
+
+def onnx_model_dir(model_name: str, root: Path = ONNX_MODEL_DIR) -> Path:
+    """Directory holding the exported ONNX files for a model."""
+    return Path(root) / re.sub(r'[^\w.-]+', '__', model_name)
+
+def resolve_backend(model_name: str, backend: str = INFERENCE_BACKEND) -> str:
+    """Resolve "auto" to "onnx" if the model was exported and onnxruntime is installed, else "torch"."""
+    if backend not in ("auto", "torch", "onnx"):
+        raise ValueError(f"Unknown inference backend: {backend}")
+    if backend != "auto":
+        return backend
+    exported = (onnx_model_dir(model_name) / "onnx_config.json").exists()
+    return "onnx" if exported and importlib.util.find_spec("onnxruntime") else "torch"
+
+# ----------------------------------------------------------------------
+# Export
+# ----------------------------------------------------------------------
+
+def _export_transformer(model, tokenizer, output: str, output_dir: Path, meta: Dict, quantize: bool) -> Path:
+    """Export a Hugging Face model's last_hidden_state or logits to ONNX, optionally int8-quantized."""
+    import torch
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    sample = tokenizer(["export sample text"], ["second segment"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class Wrapper(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, *inputs):
+            return getattr(self.inner(**dict(zip(input_names, inputs))), output)
+
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["output"] = {0: "batch", 1: "sequence"} if output == "last_hidden_state" else {0: "batch"}
+    model.eval()
+    with torch.no_grad():
+        torch.onnx.export(Wrapper(model), tuple(sample[name] for name in input_names),
+                          str(output_dir / "model.onnx"), input_names=input_names, output_names=["output"],
+                          dynamic_axes=dynamic_axes, opset_version=17, dynamo=False)
+    tokenizer.save_pretrained(str(output_dir))
+
+    files = {'fp32': "model.onnx"}
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(output_dir / "model.onnx"), str(output_dir / "model_int8.onnx"),
+                         weight_type=QuantType.QInt8)
+        files['int8'] = "model_int8.onnx"
+
+    meta.update({'inputs': input_names, 'files': files,
+                 'pad_token': tokenizer.pad_token, 'pad_token_id': tokenizer.pad_token_id})
+    with open(output_dir / "onnx_config.json", 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    print(f"Exported {meta['model_name']} to {output_dir} ({', '.join(files.values())})")
+    return output_dir
+
+def export_embedding_model(model_name: str = EMBEDDING_MODEL_NAME, quantize: bool = True) -> Path:
+    """Export a SentenceTransformer (transformer + mean/CLS pooling) to ONNX."""
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    pooling = next((m for m in model if type(m).__name__ == "Pooling"), None)
+    if pooling is None:
+        pooling_mode = "mean"
+    elif hasattr(pooling, "get_pooling_mode_str"):
+        pooling_mode = pooling.get_pooling_mode_str()
+    else:
+        pooling_mode = pooling.pooling_mode
+    if pooling_mode not in ("mean", "cls"):
+        raise ValueError(f"Unsupported pooling mode for ONNX export: {pooling_mode}")
+    meta = {
+        'kind': "embedding",
+        'model_name': model_name,
+        'max_length': model.max_seq_length,
+        'pooling': pooling_mode,
+        'normalize': any(type(m).__name__ == "Normalize" for m in model),
+        'dim': model.get_sentence_embedding_dimension(),
+    }
+    return _export_transformer(model[0].auto_model, model.tokenizer, "last_hidden_state",
+                               onnx_model_dir(model_name), meta, quantize)
+
+def export_cross_encoder(model_name: str = RERANKER_MODEL_NAME, quantize: bool = True) -> Path:
+    """Export a CrossEncoder (sequence classification logits) to ONNX."""
+    from sentence_transformers import CrossEncoder
+
+    model = CrossEncoder(model_name, device="cpu")
+    activation = type(getattr(model, "activation_fn", None)).__name__
+    meta = {
+        'kind': "cross_encoder",
+        'model_name': model_name,
+        'max_length': model.max_length or model.tokenizer.model_max_length,
+        'activation': "sigmoid" if activation == "Sigmoid" else "identity",
+        'num_labels': model.config.num_labels,
+    }
+    return _export_transformer(model.model, model.tokenizer, "logits", onnx_model_dir(model_name), meta, quantize)
+
+# ----------------------------------------------------------------------
+# ONNX Runtime models
+# ----------------------------------------------------------------------
+
+class _OnnxModel:
+    """ONNX Runtime session plus a `tokenizers` tokenizer; needs neither torch nor transformers."""
+
+    def __init__(self, model_dir: Path, quantized: bool = ONNX_QUANTIZED, threads: Optional[int] = ONNX_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = Path(model_dir)
+        with open(model_dir / "onnx_config.json", 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.quantized = quantized and 'int8' in self.meta['files']
+        self.model_file = model_dir / self.meta['files']['int8' if self.quantized else 'fp32']
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(self.model_file), options, providers=["CPUExecutionProvider"])
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.meta['max_length'])
+        self.tokenizer.enable_padding(pad_id=self.meta['pad_token_id'] or 0, pad_token=self.meta['pad_token'] or "[PAD]")
+        self.model_name = self.meta['model_name']
+        self.cache_name = f"{self.model_name}@onnx{'-int8' if self.quantized else ''}"
+
+    def _run(self, inputs: List) -> tuple:
+        """Tokenize a batch (texts or text pairs) and return (model output, attention mask)."""
+        encodings = self.tokenizer.encode_batch(inputs)
+        feed = {
+            'input_ids': np.array([e.ids for e in encodings], dtype=np.int64),
+            'attention_mask': np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            'token_type_ids': np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        output = self.session.run(None, {name: feed[name] for name in self.meta['inputs']})[0]
+        return output, feed['attention_mask']
+
+    @staticmethod
+    def _length_order(inputs: List) -> np.ndarray:
+        """Sort inputs longest first so each batch pads to similar lengths."""
+        lengths = [len(x) if isinstance(x, str) else sum(len(part) for part in x) for x in inputs]
+        return np.argsort([-length for length in lengths], kind='stable')
+
+class OnnxEncoder(_OnnxModel):
+    """Drop-in for SentenceTransformer.encode backed by ONNX Runtime."""
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.meta['dim']
+
+    def encode(self, texts: Union[str, List[str]], batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        out = np.zeros((len(texts), self.meta['dim']), dtype=np.float32)
+        order = self._length_order(texts)
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            hidden, mask = self._run([texts[i] for i in idx])
+            if self.meta['pooling'] == "cls":
+                pooled = hidden[:, 0]
+            else:
+                mask = mask[:, :, None].astype(np.float32)
+                pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            out[idx] = pooled
+        if self.meta['normalize'] or normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out[0] if single else out
+
+class OnnxCrossEncoder(_OnnxModel):
+    """Drop-in for CrossEncoder.predict backed by ONNX Runtime."""
+
+    def predict(self, pairs: List, batch_size: int = 32, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        pairs = [tuple(pair) for pair in pairs]
+        scores = np.zeros((len(pairs), self.meta['num_labels']), dtype=np.float32)
+        order = self._length_order(pairs)
+        for start in range(0, len(pairs), batch_size):
+            idx = order[start:start + batch_size]
+            scores[idx] = self._run([pairs[i] for i in idx])[0]
+        if self.meta['activation'] == "sigmoid":
+            scores = 1.0 / (1.0 + np.exp(-scores))
+        return scores[:, 0] if self.meta['num_labels'] == 1 else scores
+
+# ----------------------------------------------------------------------
+# Loading
+# ----------------------------------------------------------------------
+
+def load_embedding_model(model_name: str = EMBEDDING_MODEL_NAME, backend: str = INFERENCE_BACKEND,
+                         threads: Optional[int] = None):
+    """
+    Load a query/passage encoder with the requested backend (torch is the fallback).
+
+    threads sets ONNX Runtime's intra-op threads (default ONNX_THREADS); torch
+    uses the process-wide torch.set_num_threads() setting.
+    """
+    if resolve_backend(model_name, backend) == "onnx":
+        return OnnxEncoder(onnx_model_dir(model_name), threads=threads or ONNX_THREADS)
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+def load_cross_encoder(model_name: str = RERANKER_MODEL_NAME, backend: str = INFERENCE_BACKEND,
+                       threads: Optional[int] = None):
+    """Load a cross-encoder reranker with the requested backend (torch is the fallback); see load_embedding_model."""
+    if resolve_backend(model_name, backend) == "onnx":
+        return OnnxCrossEncoder(onnx_model_dir(model_name), threads=threads or ONNX_THREADS)
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(model_name)
+
+def embedding_cache_name(model, model_name: str = EMBEDDING_MODEL_NAME) -> str:
+    """Embedding cache namespace for a loaded model; ONNX and torch vectors are cached separately."""
+    return getattr(model, 'cache_name', model_name)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the embedding and reranker models to ONNX.")
+    parser.add_argument("--no-quantize", action="store_true", help="Skip dynamic int8 quantization")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    export_embedding_model(EMBEDDING_MODEL_NAME, quantize=not args.no_quantize)
+    export_cross_encoder(RERANKER_MODEL_NAME, quantize=not args.no_quantize)
+    print(f"Export complete in {time.time() - start_time:.2f} seconds")
@@ -0,0 +1,200 @@
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+# Bucket upper bounds for batch sizes (items) and waits/latencies (milliseconds)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+LATENCY_MS_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# Pipeline stage durations (seconds, the Prometheus convention)
+STAGE_SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class Histogram:
+    """
+    Thread-safe fixed-bucket histogram.
+
+    Buckets are upper bounds (value <= bound); values above the last bound
+    land in an overflow bucket. Percentiles are estimated as the upper bound
+    of the bucket holding the requested rank, capped at the largest value seen.
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_MS_BUCKETS):
+        self.bounds = sorted(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """Record one value."""
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        """Estimate the q-th percentile (0-100)."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = q / 100.0 * self.count
+            cumulative = 0
+            for bound, count in zip(self.bounds, self.counts):
+                cumulative += count
+                if cumulative >= rank:
+                    return min(bound, self.max)
+            return self.max
+
+    def snapshot(self) -> Dict:
+        """Return count, sum, mean, max, estimated p50/p95/p99 and cumulative bucket counts."""
+        percentiles = {f'p{q}': self.percentile(q) for q in (50, 95, 99)}
+        with self._lock:
+            cumulative, buckets = 0, {}
+            for bound, count in zip(self.bounds, self.counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            buckets['+Inf'] = self.count
+            return {
+                'count': self.count,
+                'sum': self.sum,
+                'mean': self.sum / self.count if self.count else 0.0,
+                'max': self.max,
+                **percentiles,
+                'buckets': buckets,
+            }
+
+class Counter:
+    """Thread-safe monotonically increasing counter."""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+class Callback:
+    """Counter or gauge whose value is read from a callable at export time."""
+
+    def __init__(self, fn: Callable[[], float], kind: str = "gauge"):
+        if kind not in ("counter", "gauge"):
+            raise ValueError(f"Unknown callback metric kind: {kind}")
+        self.fn = fn
+        self.kind = kind
+
+Metric = Union[Counter, Histogram, Callback]
+
+class MetricsRegistry:
+    """
+    Named, labelled metrics exported in the Prometheus text format.
+
+    counter() and histogram() return the existing metric for a name and
+    label set, creating it on first use. register() attaches a metric that
+    already exists elsewhere (e.g. a scheduler's histogram or a cache's
+    hit counter through a Callback); registering the same name and labels
+    again replaces the previous metric.
+    """
+
+    def __init__(self, prefix: str = "docu_rag_"):
+        self.prefix = prefix
+        self._families: Dict[str, Tuple[str, Dict[Tuple, Metric]]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(labels: Dict[str, str]) -> Tuple:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def _get_or_create(self, name: str, help: str, factory: Callable[[], Metric], labels: Dict) -> Metric:
+        key = self._key(labels)
+        with self._lock:
+            family = self._families.setdefault(self.prefix + name, (help, {}))[1]
+            if key not in family:
+                family[key] = factory()
+            return family[key]
+
+    def counter(self, name: str, help: str, **labels) -> Counter:
+        """Return the counter for name and labels, creating it on first use."""
+        return self._get_or_create(name, help, Counter, labels)
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = STAGE_SECONDS_BUCKETS,
+                  **labels) -> Histogram:
+        """Return the histogram for name and labels, creating it on first use."""
+        return self._get_or_create(name, help, lambda: Histogram(buckets), labels)
+
+    def register(self, name: str, help: str, metric: Metric, **labels) -> Metric:
+        """Attach an existing metric under name and labels."""
+        with self._lock:
+            self._families.setdefault(self.prefix + name, (help, {}))[1][self._key(labels)] = metric
+        return metric
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            families = [(name, help, list(series.items())) for name, (help, series) in sorted(self._families.items())]
+        lines = []
+        for name, help, series in families:
+            kinds = {_kind(metric) for _, metric in series}
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kinds.pop() if len(kinds) == 1 else 'untyped'}")
+            for labels, metric in series:
+                lines.extend(_samples(name, labels, metric))
+        return "\n".join(lines) + "\n"
+
+def _kind(metric: Metric) -> str:
+    if isinstance(metric, Callback):
+        return metric.kind
+    return "histogram" if isinstance(metric, Histogram) else "counter"
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+def _samples(name: str, labels: Tuple, metric: Metric) -> List[str]:
+    if isinstance(metric, Histogram):
+        snapshot = metric.snapshot()
+        lines = [f"{name}_bucket{_format_labels(labels + (('le', bound),))} {count}"
+                 for bound, count in snapshot['buckets'].items()]
+        lines.append(f"{name}_sum{_format_labels(labels)} {snapshot['sum']}")
+        lines.append(f"{name}_count{_format_labels(labels)} {snapshot['count']}")
+        return lines
+    if isinstance(metric, Callback):
+        try:
+            value = float(metric.fn())
+        except Exception:
+            return []
+    else:
+        value = metric.value
+    return [f"{name}{_format_labels(labels)} {value}"]
+
+# Process-wide registry used by the retriever, batch schedulers and search service
+REGISTRY = MetricsRegistry()
+
+def serve_metrics(port: int, host: str = "0.0.0.0", registry: Optional[MetricsRegistry] = None) -> ThreadingHTTPServer:
+    """Serve GET /metrics from a daemon thread (for processes without their own HTTP server)."""
+    registry = registry or REGISTRY
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,113 @@
+import asyncio
+import gc
+import os
+import sys
+import time
+from typing import Dict, Optional
+
+from src.metrics import REGISTRY, Callback
+from src.retriever import Retriever
+from src.server import HOST, PORT, serve
+
+# Environment variables sizing the OpenMP / BLAS thread pools of runtimes started after they are set
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+def available_cores() -> int:
+    """CPU cores this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def limit_threads(threads: int) -> None:
+    """Size this process's intra-op thread pools: OpenMP / BLAS, FAISS and torch (when loaded)."""
+    import faiss
+
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    faiss.omp_set_num_threads(threads)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+
+def process_memory() -> Dict[str, int]:
+    """
+    Resident, proportional, private and shared memory of this process in bytes.
+
+    Private memory is what a forked worker costs on top of the pages it shares
+    with the parent and the other workers. Empty where /proc is not available.
+    """
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup", 'r') as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[name] = int(value.split()[0]) * 1024
+    except OSError:
+        return {}
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'private': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+        'shared': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+    }
+
+def preload(retriever: Retriever) -> None:
+    """Load every index and model, then freeze the heap so forked workers keep sharing it."""
+    retriever.warm_up(background=False)
+    gc.collect()
+    # The collector never scans frozen objects again, so collections in the workers
+    # do not write to (and un-share) the pages holding them
+    gc.freeze()
+
+def serve_prefork(host: str = HOST, port: int = PORT, processes: Optional[int] = None,
+                  threads: Optional[int] = None, retriever_kwargs: Optional[Dict] = None,
+                  **service_kwargs) -> None:
+    """
+    Serve from several worker processes forked from a parent that loaded everything once.
+
+    The parent binds the socket and loads the chunk store, the indexes (FAISS
+    codes memory-mapped, see src.index_faiss.FAISS_MMAP) and both models with
+    single-threaded math libraries, so no thread pool exists when it forks.
+    Each worker sizes its own thread pools to `threads` and runs the
+    micro-batching service on the shared socket. Model weights and index
+    arrays stay shared (copy-on-write, or through the page cache), so a worker
+    adds its caches and interpreter state, not another copy of the models.
+    ONNX Runtime sessions are created in the parent and run single-threaded
+    in every worker. The parent restarts workers that die; each worker swaps
+    in new index bundles on its own.
+
+    Args:
+        host: Address to listen on
+        port: Port to listen on
+        processes: Worker processes (None = one per core)
+        threads: Intra-op threads per worker (None = cores // processes, at least 1)
+        retriever_kwargs: Passed to Retriever
+        **service_kwargs: Passed to SearchService
+    """
+    from tornado.netutil import bind_sockets
+    from tornado.process import fork_processes
+
+    cores = available_cores()
+    processes = processes or cores
+    threads = threads or max(1, cores // processes)
+
+    # Thread pools started before the fork would be missing (with their locks held) in the workers
+    limit_threads(1)
+    start = time.perf_counter()
+    retriever = Retriever(**{**(retriever_kwargs or {}), 'inference_threads': 1})
+    preload(retriever)
+    sockets = bind_sockets(port, address=host)
+    memory = process_memory()
+    print(f"Loaded indexes and models in {time.perf_counter() - start:.2f} seconds"
+          + (f" ({memory['rss'] / 1e6:.0f} MB resident)" if memory else "")
+          + f"; forking {processes} workers with {threads} threads each")
+
+    # Returns in each worker; the parent stays inside, restarting workers that exit abnormally
+    worker = fork_processes(processes)
+    limit_threads(threads)
+    for name, key in (("process_resident_bytes", 'rss'), ("process_private_bytes", 'private')):
+        REGISTRY.register(name, f"Memory of this serving process ({key})",
+                          Callback(lambda key=key: process_memory().get(key, 0)), worker=str(worker))
+    print(f"Worker {worker} started (pid {os.getpid()})")
+    asyncio.run(serve(host, port, sockets=sockets, retriever=retriever, **service_kwargs))
@@ -0,0 +1,221 @@
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from whoosh.index import open_dir
+
+from src.chunk import (RAW_DOCS_DIR, CHUNKER_VERSION, configure_chunker, find_markdown_files,
+                       iter_processed_files, file_sha256, load_manifest, save_manifest)
+from src.bm25_native import build_native_bm25_index
+from src.bundle import current_version, publish_bundle
+from src.chunk_store import ChunkStore, ChunkStoreWriter, CHUNK_STORE_DIR, chunk_key
+from src.dedup import build_dedup, duplicate_ids, indexed_rows
+from src.embedding_cache import EmbeddingCache
+from src.features import build_features
+from src.inference import load_embedding_model, embedding_cache_name
+from src.index_bm25 import BM25_INDEX_DIR, build_bm25_shards
+from src.index_faiss import (FAISS_INDEX_DIR, EMBEDDING_MODEL_NAME, build_faiss_shards, create_faiss_index,
+                             embed_chunks, load_index_meta, save_rescore_vectors)
+from src.shards import SHARDS_DIR, built_languages
+
+def diff_docs(manifest: Dict[str, Dict], languages: Optional[List[str]] = None) -> Dict[str, List[str]]:
+    """Compare the docs checkout against the manifest by content hash."""
+    current = {str(p.relative_to(RAW_DOCS_DIR)): p for p in find_markdown_files(languages)}
+    hashes = {rel: file_sha256(path) for rel, path in current.items()}
+
+    added = sorted(rel for rel in current if rel not in manifest)
+    changed = sorted(rel for rel in current
+                     if rel in manifest and manifest[rel]['sha256'] != hashes[rel])
+    removed = sorted(rel for rel in manifest if rel not in current)
+    return {'added': added, 'changed': changed, 'removed': removed}
+
+def update_chunk_store(stale_ids: set, new_chunks: List[Dict]) -> int:
+    """Rewrite the chunk store without stale chunks and with new chunks appended."""
+    old_store = ChunkStore(CHUNK_STORE_DIR)
+    with ChunkStoreWriter(CHUNK_STORE_DIR) as writer:
+        for record in old_store.iter_records():
+            if record['id'] not in stale_ids:
+                writer.add(record)
+        for chunk in new_chunks:
+            writer.add(chunk)
+        count = len(writer)
+    old_store.close()
+    return count
+
+def apply_dedup(stale_ids: set, new_chunks: List[Dict], old_duplicates: set) -> Tuple[set, List[Dict]]:
+    """
+    Adjust an index update for the re-run near-duplicate detection.
+
+    Chunks that are now duplicates leave (or never enter) the indexes, and
+    former duplicates that are canonical again are re-added from the store.
+
+    Returns:
+        (ids to remove, chunk records to add)
+    """
+    store = ChunkStore(CHUNK_STORE_DIR)
+    duplicates = duplicate_ids(store)
+    stale_ids = stale_ids | (duplicates - old_duplicates)
+    kept = [chunk for chunk in new_chunks if chunk['id'] not in duplicates]
+    added = {chunk['id'] for chunk in kept}
+    for chunk_id in sorted(old_duplicates - duplicates - added):
+        row = store.row_of(chunk_id)
+        if row is not None:
+            kept.append(store.record(row))
+    store.close()
+    return stale_ids, kept
+
+def update_bm25_index(stale_ids: set, new_chunks: List[Dict]) -> None:
+    """Delete stale documents from the Whoosh index and add the new ones."""
+    ix = open_dir(str(BM25_INDEX_DIR))
+    writer = ix.writer()
+    for cid in stale_ids:
+        writer.delete_by_term('id', cid)
+    for chunk in new_chunks:
+        writer.add_document(
+            id=chunk['id'],
+            content=chunk['content'],
+            source_file=chunk['source_file'],
+            chunk_index=chunk['chunk_index'],
+            word_count=chunk['word_count']
+        )
+    writer.commit()
+
+def update_faiss_index(stale_ids: set, new_chunks: List[Dict]) -> int:
+    """
+    Remove stale vectors from the ID-mapped FAISS index and add embeddings for new chunks.
+
+    Index types that cannot remove vectors (HNSW) are rebuilt from the
+    updated chunk store instead; the embedding cache keeps that cheap. The
+    float32 re-scoring vectors, if any, are rewritten in the new row order.
+    """
+    index_file = FAISS_INDEX_DIR / "index.faiss"
+    index = faiss.read_index(str(index_file))
+    meta = load_index_meta()
+    if not hasattr(index, 'id_map'):
+        raise RuntimeError(f"{index_file} is not ID-mapped; rebuild it with `python -m src.index_faiss` first")
+
+    try:
+        if stale_ids:
+            index.remove_ids(np.array([chunk_key(cid) for cid in stale_ids], dtype=np.int64))
+    except RuntimeError:
+        print(f"{meta['index_type']} index does not support removal; rebuilding from the embedding cache")
+        store = ChunkStore(CHUNK_STORE_DIR)
+        embeddings, keys = embed_chunks(store, rows=indexed_rows(store))
+        index = create_faiss_index(embeddings, keys, meta['index_type'], **meta['params'])
+        new_chunks = []
+
+    if new_chunks:
+        model = load_embedding_model(EMBEDDING_MODEL_NAME)
+        cache = EmbeddingCache(embedding_cache_name(model, EMBEDDING_MODEL_NAME))
+        embeddings = cache.encode(model, [chunk['content'] for chunk in new_chunks])
+        cache.save()
+        print(cache.report())
+        keys = np.array([chunk_key(chunk['id']) for chunk in new_chunks], dtype=np.int64)
+        index.add_with_ids(embeddings, keys)
+
+    if meta.get('rescore'):
+        store = ChunkStore(CHUNK_STORE_DIR)
+        rows = indexed_rows(store)
+        embeddings, _ = embed_chunks(store, rows=rows)
+        save_rescore_vectors(embeddings, FAISS_INDEX_DIR, rows)
+
+    # Write next to the live index and swap it in
+    tmp_file = index_file.with_suffix(".faiss.tmp")
+    faiss.write_index(index, str(tmp_file))
+    os.replace(tmp_file, index_file)
+    return index.ntotal
+
+def rebuild_shards() -> List[str]:
+    """
+    Rebuild the language shards that were built before, with their saved FAISS settings.
+
+    Shards address chunk store rows, which move whenever the store is
+    rewritten; the embedding cache keeps the FAISS rebuilds encoding-free.
+    """
+    languages = built_languages()
+    if not languages:
+        return []
+    build_bm25_shards(languages)
+    for language in languages:
+        meta = load_index_meta(SHARDS_DIR / language / "faiss_index")
+        build_faiss_shards([language], meta['index_type'], meta['nprobe'], meta['ef_search'], meta['rescore'],
+                           **meta['params'])
+    return languages
+
+def reindex_changed_docs() -> Dict[str, List[str]]:
+    """
+    Re-chunk and re-index only the docs whose content hash changed.
+
+    Uses the manifest written by `python -m src.chunk` to find added, changed
+    and removed files, then updates the chunk store, the Whoosh index and the
+    ID-mapped FAISS index for those files only. Near-duplicate detection,
+    the native BM25 index, the chunk features and any language shards are
+    rebuilt from the updated store (a few seconds of numpy work; shard
+    vectors come from the embedding cache). When the indexes are served from
+    versioned bundles, the result is published as a new bundle, which running
+    retrievers swap in.
+
+    Returns:
+        The diff that was applied
+    """
+    saved = load_manifest()
+    if not saved:
+        raise RuntimeError("No manifest found; run the full pipeline (`python -m src.chunk`) first")
+    manifest, languages = saved['files'], saved['languages']
+    chunker = saved.get('chunker') or {}
+    if chunker.get('version') != CHUNKER_VERSION:
+        raise RuntimeError(f"The chunk store was built by chunker {chunker.get('version', 'word-window')}, not "
+                           f"{CHUNKER_VERSION}; rebuild it with `python -m src.chunk` first")
+    # Re-chunk with the tokenizer and budget the store was built with
+    configure_chunker(chunker['tokenizer'], chunker['max_tokens'])
+
+    start_time = time.time()
+    diff = diff_docs(manifest, languages)
+    print(f"Added: {len(diff['added'])}, changed: {len(diff['changed'])}, removed: {len(diff['removed'])}")
+    if not (diff['added'] or diff['changed'] or diff['removed']):
+        print("Index is up to date.")
+        return diff
+
+    # Chunk IDs of every changed or removed file are stale
+    stale_ids = set()
+    for rel in diff['changed'] + diff['removed']:
+        stale_ids.update(manifest[rel]['chunk_ids'])
+
+    # Re-chunk added and changed files
+    new_chunks = []
+    to_process = [RAW_DOCS_DIR / rel for rel in diff['added'] + diff['changed']]
+    for rel, sha256, chunks in iter_processed_files(to_process):
+        new_chunks.extend(chunks)
+        manifest[rel] = {
+            'sha256': sha256,
+            'chunk_ids': [chunk['id'] for chunk in chunks]
+        }
+    for rel in diff['removed']:
+        del manifest[rel]
+    print(f"Removing {len(stale_ids)} stale chunks, adding {len(new_chunks)} new chunks")
+
+    old_store = ChunkStore(CHUNK_STORE_DIR)
+    old_duplicates = duplicate_ids(old_store)
+    old_store.close()
+    total_chunks = update_chunk_store(stale_ids, new_chunks)
+    build_dedup()
+    build_features()
+    stale_ids, new_chunks = apply_dedup(stale_ids, new_chunks, old_duplicates)
+    update_bm25_index(stale_ids, new_chunks)
+    # The native index is keyed by chunk store row, so rebuild it against the new store
+    build_native_bm25_index()
+    total_vectors = update_faiss_index(stale_ids, new_chunks)
+    rebuild_shards()
+    save_manifest(manifest, languages)
+    if current_version() is not None:
+        publish_bundle()
+
+    print(f"\nIncremental re-index complete in {time.time() - start_time:.2f} seconds")
+    print(f"Chunks in store: {total_chunks}, vectors in FAISS: {total_vectors}")
+    return diff
+
+if __name__ == "__main__":
+    reindex_changed_docs()
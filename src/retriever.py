@@ -1,102 +1,1152 @@
-import json
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-import faiss
+from typing import Iterator, List, Dict, NamedTuple, Tuple, Optional
+
 import numpy as np
-from whoosh.index import open_dir
-from whoosh.qparser import QueryParser
-from whoosh import scoring
-from sentence_transformers import SentenceTransformer, CrossEncoder
+
+from src.bundle import IndexPaths, bundle_paths, current_version
+from src.cache import SemanticCache, TTLCache, normalize_query
+from src.features import BOOSTS
+from src.fusion import FUSION_MODES, fuse_scores, fused_score_scale
+from src.metrics import REGISTRY, BATCH_SIZE_BUCKETS, Callback
+from src.router import normalize_language, route_languages
+from src.tracing import span
 
 # Paths
 ROOT = Path(__file__).parent.parent
 BM25_INDEX_DIR = ROOT / "index" / "bm25_index"
+BM25_NATIVE_DIR = ROOT / "index" / "bm25_native"
+FEATURES_DIR = ROOT / "index" / "features"
+DEDUP_DIR = ROOT / "index" / "dedup"
 FAISS_INDEX_DIR = ROOT / "index" / "faiss_index"
-CHUNKS_FILE = ROOT / "data" / "processed_chunks" / "chunks.json"
+SHARDS_DIR = ROOT / "index" / "shards"
+CHUNK_STORE_DIR = ROOT / "data" / "processed_chunks" / "chunk_store"
+# Versioned index bundles (src.bundle); when one is current it is served instead of the directories above
+BUNDLES_DIR = ROOT / "index" / "bundles"
+
+# Models
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+RERANKER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+# "torch", "onnx", or "auto" (ONNX Runtime when `python -m src.inference` has exported the models)
+INFERENCE_BACKEND = "auto"
+# ONNX Runtime intra-op threads per model (None = src.inference.ONNX_THREADS)
+INFERENCE_THREADS = None
+
+# Candidates pulled from each retriever before fusion (at least top_k)
+SPARSE_DEPTH = 50
+DENSE_DEPTH = 50
+# Score fusion: "minmax", "zscore", "rrf", or "sum" (legacy raw BM25 + cosine); see src.fusion
+FUSION_MODE = "minmax"
+
+# Number of fused candidates sent to the cross-encoder per query
+RERANK_DEPTH = 20
+# Cross-encoder batch size used when reranking many queries at once
+RERANK_BATCH_SIZE = 128
+
+# Sparse search backend: "native" (numpy CSR index), "whoosh", or "auto" (native when it has been built)
+BM25_BACKEND = "auto"
+
+# Languages to serve from the per-language shards (index/shards/<lang>); None serves every built shard.
+# Without shards the unsharded indexes are searched and the query language is ignored.
+SERVED_LANGUAGES = None
+
+# Components in the order warm_up() loads them
+COMPONENTS = ("chunks", "boosts", "dedup", "shards", "bm25", "faiss", "embed_model", "reranker")
+# Unsharded indexes, not needed while language shards are served
+UNSHARDED_COMPONENTS = ("bm25", "faiss")
+# Components shared by every index version; the others are loaded per IndexSnapshot
+MODEL_COMPONENTS = ("embed_model", "reranker")
+
+# Query caches
+RESULT_CACHE_SIZE = 1024
+RESULT_CACHE_TTL = 3600.0  # seconds
+QUERY_EMBEDDING_CACHE_SIZE = 4096
+RERANK_CACHE_SIZE = 32768
+# Semantic cache: a query whose embedding has cosine similarity >= SEMANTIC_CACHE_THRESHOLD with a recent
+# query's (same settings and language route) gets that query's results without BM25, fusion or reranking.
+# Size 0 disables it.
+SEMANTIC_CACHE_SIZE = 1024
+SEMANTIC_CACHE_THRESHOLD = 0.95
+# Per-query cross-encoder time budget in milliseconds (None = always score the whole pool)
+RERANK_BUDGET_MS = None
+# Pairs scored per query and cross-encoder call when reranking under a budget
+RERANK_STEP_SIZE = 8
+# Shared micro-batching of concurrent embedding / cross-encoder calls (see src.batching);
+# query batches hold up to MODEL_BATCH_SIZE texts, rerank batches up to RERANK_BATCH_SIZE pairs
+MODEL_BATCHING = True
+MODEL_BATCH_SIZE = 64
+MODEL_BATCH_WAIT_MS = 2.0
+# Stages yielded by retrieve_progressive(): fusion order first, then the cross-encoder order
+FUSED_STAGE = "fused"
+RERANKED_STAGE = "reranked"
+# Minimum seconds between checks of the on-disk index version (and the current bundle)
+VERSION_CHECK_INTERVAL = 1.0
 
-# Load BM25
-bm25_ix = open_dir(str(BM25_INDEX_DIR))
-bm25_searcher = bm25_ix.searcher(weighting=scoring.BM25F())
-bm25_parser = QueryParser("content", bm25_ix.schema)
+# Texts / pairs sent to each model per retrieval call (before any cross-request batching)
+_MODEL_INPUTS = {model: REGISTRY.histogram("model_call_inputs", "Inputs passed to a model per retrieval call",
+                                           BATCH_SIZE_BUCKETS, model=model) for model in ("embed", "rerank")}
 
-# Load FAISS
-faiss_index = faiss.read_index(str(FAISS_INDEX_DIR / "index.faiss"))
-with open(FAISS_INDEX_DIR / "ids.json", 'r', encoding='utf-8') as f:
-    faiss_ids = json.load(f)
+class SearchSettings(NamedTuple):
+    """Per-query retrieval settings; part of the result cache key."""
+    top_k: int
+    alpha: float
+    nprobe: Optional[int]
+    ef_search: Optional[int]
+    fusion: str
+    sparse_depth: int
+    dense_depth: int
+    language: Optional[str]
+    expand_aliases: bool
 
-# Load chunks metadata
-with open(CHUNKS_FILE, 'r', encoding='utf-8') as f:
-    chunk_data = {chunk['id']: chunk for chunk in json.load(f)}
+class IndexSnapshot:
+    """One version of the chunk store and indexes, with the components loaded from it."""
 
-# Embedding & reranker models
-embed_model = SentenceTransformer("all-MiniLM-L6-v2")
-reranker = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+    def __init__(self, version: Optional[str], paths: IndexPaths):
+        # Bundle version, or None for the working index directories
+        self.version = version
+        self.paths = paths
+        self.components: Dict[str, object] = {}
+        self.locks = {name: threading.Lock() for name in COMPONENTS if name not in MODEL_COMPONENTS}
 
-def retrieve(query: str, top_k: int = 5, alpha: float = 0.7):
+class Retriever:
     """
-    Retrieve top_k chunks using BM25+FAISS fusion, heuristic boosts,
-    and cross-encoder reranking.
+    Hybrid BM25 + FAISS retriever with cross-encoder reranking.
+
+    Indexes and models are loaded lazily on first use, so constructing a
+    Retriever (or importing this module) is cheap. Call warm_up() to load
+    everything ahead of the first query, optionally in a background thread.
+    Per-component load times are recorded in `load_times`. Concurrent
+    embedding and cross-encoder calls from different threads are merged
+    into shared batches (MODEL_BATCHING). Sparse search
+    uses the native numpy BM25 index when it has been built and falls back
+    to Whoosh otherwise (see BM25_BACKEND).
+
+    BM25 and FAISS each contribute their own candidate depth; the two lists
+    are fused over their union with the configured FUSION_MODE (normalized
+    weighted sum or reciprocal rank fusion) before boosts and reranking.
+    Boosts come from a configurable table (`boosts`) over per-chunk features
+    precomputed at chunking time (src.features), applied to candidate arrays
+    in units of the fusion mode's score range.
+
+    When per-language shards are built (`--shards` in the index scripts),
+    each query is routed to the shards of an explicit `language` or of its
+    detected language (src.router), and only the SERVED_LANGUAGES shards
+    are loaded. Candidates from several shards are merged by score before
+    fusion, so everything downstream works on chunk store rows as before.
+
+    Near-duplicate chunks are collapsed at index time (src.dedup); with
+    `expand_aliases` each result lists the chunks collapsed into it.
+
+    Indexes are served from the current versioned bundle (src.bundle) when
+    one has been published, else from the working index directories. When
+    the `current` pointer moves, the new bundle's indexes are loaded in the
+    background into a fresh IndexSnapshot and swapped in; the models are
+    kept. Every query pins the snapshot it started on, so in-flight queries
+    finish on the old version and never mix rows of two versions.
+
+    Results are cached per (normalized query, search settings) with LRU and TTL
+    eviction, query embeddings get a cache of their own, and cross-encoder
+    scores are cached per (query, chunk id) pair. A semantic cache also
+    serves the results of recent queries to paraphrases of them (queries
+    whose embeddings are nearly identical). Result, semantic and pair caches
+    are cleared whenever the on-disk index version changes.
+
+    Each numbered pipeline stage runs in a src.tracing span: stage latency,
+    candidate counts and cache hits go to the metrics registry (Prometheus
+    text via src.metrics) and, when a tracer is set, to OpenTelemetry.
+
+    With a rerank budget set, the cross-encoder scores the pool in small
+    steps in fused-score order and stops when the budget would be exceeded
+    or a whole step fails to change the top_k; unscored candidates keep
+    their fusion order behind the reranked ones.
     """
-    # 1) BM25 search
-    q = bm25_parser.parse(query)
-    bm25_results = bm25_searcher.search(q, limit=top_k)
-    bm25_scores = {hit['id']: hit.score for hit in bm25_results}
-
-    # 2) FAISS search
-    q_emb = embed_model.encode([query], convert_to_numpy=True, normalize_embeddings=True).astype('float32')
-    scores, idxs = faiss_index.search(q_emb, top_k)
-    dense_scores = {faiss_ids[idx]: float(scores[0][i]) for i, idx in enumerate(idxs[0])}
-
-    # 3) Combine scores
-    combined = {}
-    for cid, score in bm25_scores.items():
-        combined[cid] = combined.get(cid, 0) + (1 - alpha) * score
-    for cid, score in dense_scores.items():
-        combined[cid] = combined.get(cid, 0) + alpha * score
-
-    # 4) Heuristic filename boost
-    for cid in list(combined.keys()):
-        src = chunk_data[cid]['source_file'].lower()
-        if any(k in src for k in ("tokenizer", "quickstart", "getting_started",
-                                   "quicktour", "tutorial", "usage", "installation")):
-            combined[cid] += 2.0
-
-    # 5) Heuristic code‐block boost
-        for cid in list(combined.keys()):
-            if "```" in chunk_data[cid]['content']:
-                combined[cid] += 1.0
-
-    # 6) Preliminary top_N for reranking
-    top_N = min(len(combined), 20)
-    # prelim is a list of (cid, combined_score)
-    prelim = sorted(combined.items(), key=lambda x: x[1], reverse=True)[:top_N]
-
-    # 7) Cross‐encoder rerank
-    rerank_inputs = []
-    for item in prelim:
-        cid = item[0]                 # first element is chunk ID
-        text = chunk_data[cid]['content']
-        rerank_inputs.append((query, text))
-    rerank_scores = reranker.predict(rerank_inputs)
-    final = [(cid, rr_score) for (cid, _), rr_score in zip(prelim, rerank_scores)]
-
-    # 8) Final top_k selection
-    final = []
-    for idx, item in enumerate(prelim):
-        cid = item[0]
-        score = rerank_scores[idx]   # aligned by index
-        final.append((cid, score))
-
-    # 9) Build results
-    top_final = sorted(final, key=lambda x: x[1], reverse=True)[:top_k]
-
-    # 10) Build results
-    results = []
-    for cid, score in top_final:
-        chunk = chunk_data[cid]
-        results.append({
-            'id': cid,
-            'source_file': chunk['source_file'],
-            'content': chunk['content'],
-            'score': score
-        })
-    return results
\ No newline at end of file
+
+    def __init__(self, bm25_index_dir: Path = BM25_INDEX_DIR, faiss_index_dir: Path = FAISS_INDEX_DIR,
+                 chunk_store_dir: Path = CHUNK_STORE_DIR, embedding_model_name: str = EMBEDDING_MODEL_NAME,
+                 reranker_model_name: str = RERANKER_MODEL_NAME, result_cache_size: int = RESULT_CACHE_SIZE,
+                 result_cache_ttl: Optional[float] = RESULT_CACHE_TTL,
+                 query_embedding_cache_size: int = QUERY_EMBEDDING_CACHE_SIZE,
+                 rerank_cache_size: int = RERANK_CACHE_SIZE, rerank_budget_ms: Optional[float] = RERANK_BUDGET_MS,
+                 bm25_native_dir: Path = BM25_NATIVE_DIR, bm25_backend: str = BM25_BACKEND,
+                 model_batching: bool = MODEL_BATCHING, model_batch_size: int = MODEL_BATCH_SIZE,
+                 model_batch_wait_ms: float = MODEL_BATCH_WAIT_MS, inference_backend: str = INFERENCE_BACKEND,
+                 features_dir: Path = FEATURES_DIR, boosts: Optional[Dict[str, float]] = None,
+                 shards_dir: Path = SHARDS_DIR, languages: Optional[List[str]] = SERVED_LANGUAGES,
+                 dedup_dir: Path = DEDUP_DIR, bundles_dir: Optional[Path] = BUNDLES_DIR,
+                 inference_threads: Optional[int] = INFERENCE_THREADS,
+                 semantic_cache_size: int = SEMANTIC_CACHE_SIZE,
+                 semantic_cache_threshold: float = SEMANTIC_CACHE_THRESHOLD):
+        self.bm25_index_dir = Path(bm25_index_dir)
+        self.bm25_native_dir = Path(bm25_native_dir)
+        self.features_dir = Path(features_dir)
+        self.dedup_dir = Path(dedup_dir)
+        # Score added after fusion per chunk feature (see src.features.BOOSTS)
+        self.boosts = dict(BOOSTS if boosts is None else boosts)
+        self.shards_dir = Path(shards_dir)
+        self.languages = None if languages is None else sorted(languages)
+        self.bm25_backend = bm25_backend
+        self.model_batching = model_batching
+        self.model_batch_size = model_batch_size
+        self.model_batch_wait_ms = model_batch_wait_ms
+        self.inference_backend = inference_backend
+        self.inference_threads = inference_threads
+        self.faiss_index_dir = Path(faiss_index_dir)
+        self.chunk_store_dir = Path(chunk_store_dir)
+        self.embedding_model_name = embedding_model_name
+        self.reranker_model_name = reranker_model_name
+        # None serves the directories above and ignores bundles
+        self.bundles_dir = None if bundles_dir is None else Path(bundles_dir)
+
+        self.load_times: Dict[str, float] = {}
+        self._models: Dict[str, object] = {}
+        self._locks = {name: threading.Lock() for name in MODEL_COMPONENTS}
+        self._warm_up_thread: Optional[threading.Thread] = None
+        self._snapshot = self._open_snapshot(current_version(self.bundles_dir) if self.bundles_dir else None)
+        self._swapping: Optional[IndexSnapshot] = None
+        self._pinned = threading.local()
+        self._version_lock = threading.Lock()
+
+        self.result_cache = TTLCache(result_cache_size, result_cache_ttl)
+        self.query_embedding_cache = TTLCache(query_embedding_cache_size)
+        self.rerank_cache = TTLCache(rerank_cache_size)
+        self.semantic_cache = SemanticCache(semantic_cache_size, semantic_cache_threshold, result_cache_ttl)
+        self.rerank_budget_ms = rerank_budget_ms
+        self._register_cache_metrics()
+        # index_version() of the snapshot being served, and of the one being loaded by a version check
+        self._index_version: Optional[str] = None
+        self._loading_version: Optional[str] = None
+        self._version_checked_at = 0.0
+        # Whoosh searchers are not safe to share between threads; the native index is
+        self._whoosh_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Lazy loading
+    # ------------------------------------------------------------------
+
+    def _get(self, name: str):
+        """Return a loaded component (indexes from this thread's snapshot), loading it on first access."""
+        if name in MODEL_COMPONENTS:
+            snapshot, components, locks = None, self._models, self._locks
+        else:
+            snapshot = self.snapshot
+            components, locks = snapshot.components, snapshot.locks
+        component = components.get(name)
+        if component is not None:
+            return component
+        with locks[name]:
+            if name not in components:
+                start = time.perf_counter()
+                if snapshot is None:
+                    components[name] = getattr(self, f"_load_{name}")()
+                else:
+                    # Components a loader depends on come from the same snapshot
+                    with self.pinned(snapshot):
+                        components[name] = getattr(self, f"_load_{name}")(snapshot.paths)
+                self.load_times[name] = time.perf_counter() - start
+        return components[name]
+
+    def _load_chunks(self, paths: IndexPaths):
+        from src.chunk_store import ChunkStore
+        return ChunkStore(paths.chunk_store)
+
+    def _load_boosts(self, paths: IndexPaths):
+        from src.features import ChunkFeatures
+        return ChunkFeatures(self.chunk_store, paths.features).boost_vector(self.boosts)
+
+    def _load_dedup(self, paths: IndexPaths):
+        from src.dedup import ChunkDedup
+        return ChunkDedup(self.chunk_store, paths.dedup)
+
+    def _load_shards(self, paths: IndexPaths):
+        from src.shards import load_shards
+        return load_shards(self.chunk_store, paths.shards, self.languages)
+
+    def _load_bm25(self, paths: IndexPaths):
+        backend = self.bm25_backend
+        if backend == "auto":
+            backend = "native" if (paths.bm25_native / "meta.json").exists() else "whoosh"
+        if backend == "native":
+            from src.bm25_native import NativeBM25
+            return backend, NativeBM25(paths.bm25_native), None
+
+        from whoosh.index import open_dir
+        from whoosh.qparser import QueryParser
+        from whoosh import scoring
+
+        bm25_ix = open_dir(str(paths.bm25_index))
+        searcher = bm25_ix.searcher(weighting=scoring.BM25F())
+        parser = QueryParser("content", bm25_ix.schema)
+        return backend, searcher, parser
+
+    def _load_faiss(self, paths: IndexPaths):
+        from src.index_faiss import load_index_meta, load_rescore_vectors, read_faiss_index
+
+        index = read_faiss_index(paths.faiss_index / "index.faiss")
+        meta = load_index_meta(paths.faiss_index)
+        # Float32 vectors for shortlist re-scoring stay on disk, memory-mapped
+        vectors, vector_rows = None, None
+        if meta.get('rescore'):
+            vectors, vector_rows = load_rescore_vectors(paths.faiss_index)
+        return index, meta, vectors, vector_rows
+
+    def _dense_rows(self, index, labels: np.ndarray) -> np.ndarray:
+        """Map FAISS result labels to chunk store rows (-1 for misses)."""
+        if hasattr(index, 'id_map'):
+            # ID-mapped index: labels are chunk keys
+            return self.chunk_store.rows_for_keys(labels)
+        # Plain index: labels are chunk store rows
+        return np.asarray(labels, dtype=np.int64)
+
+    def _load_embed_model(self):
+        from src.inference import load_embedding_model
+        model = load_embedding_model(self.embedding_model_name, self.inference_backend, self.inference_threads)
+        if self.model_batching:
+            from src.batching import BatchedEncoder
+            return BatchedEncoder(model, self.model_batch_size, self.model_batch_wait_ms)
+        return model
+
+    def _load_reranker(self):
+        from src.inference import load_cross_encoder
+        model = load_cross_encoder(self.reranker_model_name, self.inference_backend, self.inference_threads)
+        if self.model_batching:
+            from src.batching import BatchedCrossEncoder
+            return BatchedCrossEncoder(model, RERANK_BATCH_SIZE, self.model_batch_wait_ms)
+        return model
+
+    # ------------------------------------------------------------------
+    # Index snapshots
+    # ------------------------------------------------------------------
+
+    def _open_snapshot(self, version: Optional[str]) -> IndexSnapshot:
+        """Unloaded snapshot of a bundle, or of the working index directories when version is None."""
+        if version is None:
+            return IndexSnapshot(None, IndexPaths(self.chunk_store_dir, self.bm25_index_dir, self.bm25_native_dir,
+                                                  self.faiss_index_dir, self.features_dir, self.dedup_dir,
+                                                  self.shards_dir))
+        return IndexSnapshot(version, bundle_paths(self.bundles_dir / version))
+
+    @property
+    def snapshot(self) -> IndexSnapshot:
+        """Index snapshot serving this thread: the pinned one, else the current one."""
+        return getattr(self._pinned, 'snapshot', None) or self._snapshot
+
+    @contextmanager
+    def pinned(self, snapshot: Optional[IndexSnapshot] = None):
+        """
+        Serve this thread's index lookups from one snapshot: the given one, the
+        one already pinned, or the current one. Yields the pinned snapshot.
+        """
+        previous = getattr(self._pinned, 'snapshot', None)
+        self._pinned.snapshot = snapshot or previous or self._snapshot
+        try:
+            yield self._pinned.snapshot
+        finally:
+            self._pinned.snapshot = previous
+
+    def call_pinned(self, snapshot: IndexSnapshot, fn, *args):
+        """Call fn(*args) pinned to a snapshot, e.g. to run one query's stages on worker threads."""
+        with self.pinned(snapshot):
+            return fn(*args)
+
+    def _caching(self) -> bool:
+        """Whether results computed on this thread's snapshot may be cached (it is still current)."""
+        return self.snapshot is self._snapshot
+
+    def swap_index(self, version: Optional[str], background: bool = True,
+                   index_version: Optional[str] = None) -> Optional[threading.Thread]:
+        """
+        Load an index bundle (None: the working index directories) and make it current.
+
+        The new snapshot's indexes are loaded while queries keep running on
+        the current one; the models are shared and stay loaded. Queries that
+        already started finish on the snapshot they pinned. The result, semantic
+        and rerank caches are cleared once the new snapshot is current.
+
+        Args:
+            version: Bundle to serve
+            background: Load in a daemon thread and return immediately
+            index_version: The index_version() being swapped in, recorded once it is current
+
+        Returns:
+            The loading thread when loading in the background, else None
+        """
+        snapshot = self._open_snapshot(version)
+        self._swapping = snapshot
+
+        def load_and_swap():
+            start = time.perf_counter()
+            try:
+                with self.pinned(snapshot):
+                    for name in self._needed_components():
+                        if name not in MODEL_COMPONENTS:
+                            self._get(name)
+            except Exception as e:
+                with self._version_lock:
+                    # Retried at the next version check
+                    if self._loading_version == index_version:
+                        self._loading_version = None
+                REGISTRY.counter("index_swaps_total", "Index snapshot swaps", outcome="failed").inc()
+                print(f"Could not load index {version or 'directories'}: {e}; "
+                      f"still serving {self._snapshot.version or 'the index directories'}")
+                return
+            with self._version_lock:
+                if self._loading_version == index_version:
+                    self._loading_version = None
+                # A newer swap started meanwhile; let it win
+                if self._swapping is not snapshot:
+                    return
+                self._snapshot = snapshot
+                self._swapping = None
+                self._index_version = index_version
+            self._clear_caches()
+            REGISTRY.counter("index_swaps_total", "Index snapshot swaps", outcome="swapped").inc()
+            print(f"Swapped in index {version or 'directories'} in {time.perf_counter() - start:.2f} seconds")
+
+        if not background:
+            load_and_swap()
+            return None
+        thread = threading.Thread(target=load_and_swap, name="retriever-index-swap", daemon=True)
+        thread.start()
+        return thread
+
+    @property
+    def chunk_store(self):
+        return self._get("chunks")
+
+    @property
+    def bm25_searcher(self):
+        return self._get("bm25")[1]
+
+    @property
+    def bm25_parser(self):
+        return self._get("bm25")[2]
+
+    @property
+    def faiss_index(self):
+        return self._get("faiss")[0]
+
+    @property
+    def faiss_meta(self) -> Dict:
+        return self._get("faiss")[1]
+
+    @property
+    def faiss_vectors(self) -> Optional[np.ndarray]:
+        return self._get("faiss")[2]
+
+    @property
+    def shards(self) -> Dict:
+        """Loaded language shards by language code (empty when unsharded)."""
+        return self._get("shards")
+
+    @property
+    def embed_model(self):
+        return self._get("embed_model")
+
+    @property
+    def reranker(self):
+        return self._get("reranker")
+
+    def _needed_components(self) -> List[str]:
+        """Components used to serve queries; the unsharded indexes are skipped when shards are served."""
+        if self._get("shards"):
+            return [name for name in COMPONENTS if name not in UNSHARDED_COMPONENTS]
+        return list(COMPONENTS)
+
+    def is_loaded(self, name: Optional[str] = None) -> bool:
+        """Check whether one component (or every component in use) has been loaded."""
+        loaded = set(self.snapshot.components) | set(self._models)
+        if name is not None:
+            return name in loaded
+        return "shards" in loaded and all(n in loaded for n in self._needed_components())
+
+    def warm_up(self, background: bool = True) -> Optional[threading.Thread]:
+        """
+        Load every component ahead of the first query.
+
+        Args:
+            background: Load in a daemon thread and return immediately
+
+        Returns:
+            The warm-up thread when loading in the background, else None
+        """
+        def load_all():
+            with self.pinned():
+                for name in self._needed_components():
+                    self._get(name)
+
+        if not background:
+            load_all()
+            return None
+        if self._warm_up_thread is None:
+            self._warm_up_thread = threading.Thread(target=load_all, name="retriever-warm-up", daemon=True)
+            self._warm_up_thread.start()
+        return self._warm_up_thread
+
+    # ------------------------------------------------------------------
+    # Caching
+    # ------------------------------------------------------------------
+
+    def index_version(self) -> str:
+        """
+        Return the current bundle's version, or without bundles a fingerprint
+        (sizes and mtimes) of the working chunk store and indexes.
+        """
+        if self.bundles_dir is not None:
+            version = current_version(self.bundles_dir)
+            if version is not None:
+                return version
+        paths = [self.chunk_store_dir / "meta.json", self.faiss_index_dir / "index.faiss",
+                 self.bm25_native_dir / "meta.json", self.features_dir / "meta.json", self.shards_dir / "meta.json",
+                 self.dedup_dir / "meta.json"]
+        paths.extend(sorted(self.bm25_index_dir.glob("*.toc")))
+        parts = []
+        for path in paths:
+            try:
+                stat = path.stat()
+                parts.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}")
+            except FileNotFoundError:
+                parts.append(f"{path}:missing")
+        return hashlib.sha1("|".join(parts).encode('utf-8')).hexdigest()[:12]
+
+    def _check_index_version(self) -> None:
+        """
+        Swap in a newly activated bundle, or reload the working indexes when
+        they changed on disk. A swap that fails to load is retried at the next
+        check; the current snapshot keeps serving meanwhile.
+        """
+        now = time.monotonic()
+        if now - self._version_checked_at < VERSION_CHECK_INTERVAL:
+            return
+        with self._version_lock:
+            self._version_checked_at = now
+            version = self.index_version()
+            if version in (self._index_version, self._loading_version):
+                return
+            bundle = current_version(self.bundles_dir) if self.bundles_dir is not None else None
+            if self._index_version is None and self._swapping is None and bundle == self._snapshot.version:
+                # First check: the current snapshot was opened from this version
+                self._index_version = version
+                return
+            self._loading_version = version
+        self.swap_index(bundle, index_version=version)
+
+    def _clear_caches(self) -> None:
+        """Drop cached results and rerank scores, which depend on the index version (embeddings do not)."""
+        self.result_cache.clear()
+        self.semantic_cache.clear()
+        self.rerank_cache.clear()
+
+    def _register_cache_metrics(self) -> None:
+        """Export the caches' hit, miss and eviction counters and sizes."""
+        for name, cache in (('results', self.result_cache), ('query_embeddings', self.query_embedding_cache),
+                            ('rerank_pairs', self.rerank_cache), ('semantic', self.semantic_cache)):
+            REGISTRY.register("cache_hits_total", "Cache lookups that found an entry",
+                              Callback(lambda c=cache: c.hits, "counter"), cache=name)
+            REGISTRY.register("cache_misses_total", "Cache lookups that found no entry",
+                              Callback(lambda c=cache: c.misses, "counter"), cache=name)
+            REGISTRY.register("cache_evictions_total", "Entries evicted to stay within the cache size",
+                              Callback(lambda c=cache: c.evictions, "counter"), cache=name)
+            REGISTRY.register("cache_entries", "Entries currently cached", Callback(lambda c=cache: len(c)),
+                              cache=name)
+
+    def cache_stats(self) -> Dict[str, Dict[str, float]]:
+        """Return hit-rate metrics for the result, query embedding, rerank and semantic caches."""
+        return {
+            'results': self.result_cache.stats(),
+            'query_embeddings': self.query_embedding_cache.stats(),
+            'rerank_pairs': self.rerank_cache.stats(),
+            'semantic': self.semantic_cache.stats(),
+        }
+
+    @staticmethod
+    def search_settings(top_k: int = 5, alpha: float = 0.7, nprobe: Optional[int] = None,
+                        ef_search: Optional[int] = None, fusion: Optional[str] = None,
+                        sparse_depth: Optional[int] = None, dense_depth: Optional[int] = None,
+                        language: Optional[str] = None, expand_aliases: bool = False) -> SearchSettings:
+        """Resolve retrieval settings, filling in module defaults."""
+        fusion = fusion or FUSION_MODE
+        if fusion not in FUSION_MODES:
+            raise ValueError(f"Unknown fusion mode: {fusion} (expected one of {FUSION_MODES})")
+        return SearchSettings(top_k, alpha, nprobe, ef_search, fusion,
+                              max(top_k, sparse_depth or SPARSE_DEPTH), max(top_k, dense_depth or DENSE_DEPTH),
+                              normalize_language(language), bool(expand_aliases))
+
+    @staticmethod
+    def result_key(query: str, settings: SearchSettings) -> Tuple:
+        """Result cache key for one query and its retrieval settings."""
+        return (normalize_query(query),) + tuple(settings)
+
+    def route(self, query: str, language: Optional[str] = None) -> Optional[Tuple[str, ...]]:
+        """
+        Languages whose shards a query searches, or None when no shards are built.
+
+        Args:
+            query: Search query, used to detect its language
+            language: None to detect, "all", or comma-separated language codes
+
+        Raises:
+            ValueError: An explicitly requested language is not served
+        """
+        shards = self._get("shards")
+        if not shards:
+            return None
+        return route_languages(query, normalize_language(language), shards)
+
+    def batching_stats(self) -> Dict[str, Dict]:
+        """Return batch-size and queue-wait histograms of the loaded model schedulers."""
+        stats = {}
+        for name in MODEL_COMPONENTS:
+            scheduler = getattr(self._models.get(name), 'scheduler', None)
+            if scheduler is not None:
+                stats[name] = scheduler.stats()
+        return stats
+
+    def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed queries, reusing cached embeddings and encoding the rest in one pass."""
+        with span("encode", queries=len(queries)) as stage:
+            keys = [normalize_query(q) for q in queries]
+            embs = [self.query_embedding_cache.get(key) for key in keys]
+            missing = [i for i, emb in enumerate(embs) if emb is None]
+            stage.set(cache_hits=len(queries) - len(missing))
+            if missing:
+                _MODEL_INPUTS['embed'].observe(len(missing))
+                new_embs = self.embed_model.encode([queries[i] for i in missing], convert_to_numpy=True,
+                                                   normalize_embeddings=True).astype('float32')
+                for i, emb in zip(missing, new_embs):
+                    embs[i] = emb
+                    self.query_embedding_cache.put(keys[i], emb)
+            return np.vstack(embs).astype('float32')
+
+    # ------------------------------------------------------------------
+    # Retrieval
+    # ------------------------------------------------------------------
+
+    def _bm25_search(self, query: str, limit: int,
+                     languages: Optional[Tuple[str, ...]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Run a BM25 search (on the given language shards, if any) and return (chunk store rows, scores)."""
+        if languages is not None:
+            from src.shards import merge_candidates
+
+            shards = self._get("shards")
+            with span("bm25", backend="native", shards=len(languages)) as stage:
+                # BM25 scores depend on each shard's statistics; merge them relative to each shard's best hit
+                parts = [shards[lang].bm25.search(query, limit) for lang in languages]
+                rows, scores = merge_candidates(parts, limit, normalize=True)
+                stage.set(candidates=len(rows))
+                return rows, scores
+
+        backend, searcher, parser = self._get("bm25")
+        with span("bm25", backend=backend) as stage:
+            if backend == "native":
+                # The native index is keyed by chunk store row already; "and" matching like the Whoosh parser
+                rows, scores = searcher.search(query, limit)
+                stage.set(candidates=len(rows))
+                return rows, scores
+
+            chunk_store = self.chunk_store
+            rows, scores = [], []
+            with self._whoosh_lock:
+                q = parser.parse(query)
+                bm25_results = searcher.search(q, limit=limit)
+                for hit in bm25_results:
+                    row = chunk_store.row_of(hit['id'])
+                    if row is not None:
+                        rows.append(row)
+                        scores.append(hit.score)
+            stage.set(candidates=len(rows))
+            return np.array(rows, dtype=np.int64), np.array(scores, dtype=np.float32)
+
+    def _dense_search(self, q_embs: np.ndarray, limit: int, nprobe: Optional[int] = None,
+                      ef_search: Optional[int] = None, shard=None):
+        """
+        Search FAISS and return (scores, chunk store rows), each of shape (n, limit).
+
+        Searches one language shard's index when given, else the unsharded
+        index. Uses the index's saved nprobe/efSearch unless overridden.
+        Indexes built with re-scoring fetch a larger shortlist and re-rank it
+        with exact float32 inner products.
+        """
+        from src.index_faiss import search_parameters, rescore_candidates
+
+        if shard is not None:
+            index, meta = shard.faiss_index, shard.faiss_meta
+            vectors, vector_rows = shard.faiss_vectors, shard.vector_rows
+        else:
+            index, meta, vectors, vector_rows = self._get("faiss")
+        params = search_parameters(index,
+                                   nprobe if nprobe is not None else meta.get('nprobe'),
+                                   ef_search if ef_search is not None else meta.get('ef_search'))
+        rescore = meta.get('rescore') or 0
+        scores, labels = index.search(q_embs, limit * rescore if rescore else limit, params=params)
+        rows = self._dense_rows(index, labels)
+        if rescore:
+            scores, rows = rescore_candidates(q_embs, rows, vectors, limit, vector_rows)
+        return scores, rows
+
+    def _fuse_candidates(self, sparse: Tuple[np.ndarray, np.ndarray], dense: Tuple[np.ndarray, np.ndarray],
+                         settings: SearchSettings) -> List[Tuple[int, float]]:
+        """Fuse sparse and dense candidates, apply feature boosts and return the rerank pool."""
+        # 3) Combine scores over the union of both candidate sets
+        with span("fusion", mode=settings.fusion) as stage:
+            rows, fused = fuse_scores(sparse[0], sparse[1], dense[0], dense[1], settings.alpha, settings.fusion)
+            stage.set(candidates=len(rows))
+
+        with span("boosts") as stage:
+            # 4-5) Doc-category, code-block and other feature boosts, precomputed per row and
+            # scaled to the fusion mode's score range
+            scale = fused_score_scale(settings.fusion, max(settings.sparse_depth, settings.dense_depth))
+            combined = fused.astype(np.float64) + self._get("boosts")[rows] * scale
+
+            # 6) Preliminary top_N for reranking
+            top = np.argsort(-combined, kind='stable')[:RERANK_DEPTH]
+            stage.set(candidates=len(top))
+            # prelim is a list of (row, combined_score)
+            return list(zip(rows[top].tolist(), combined[top].tolist()))
+
+    def _rerank(self, query: str, prelim: List[Tuple[int, float]], top_k: int) -> List[Optional[float]]:
+        """
+        Score the rerank pool with the cross-encoder, using cached pair scores.
+
+        Returns scores aligned with prelim; None marks candidates left
+        unscored because the rerank budget ran out.
+        """
+        with span("rerank", candidates=len(prelim)) as stage:
+            return self._score_pools([query], [prelim], top_k, stage)[0]
+
+    def _score_pools(self, queries: List[str], prelims: List[List[Tuple[int, float]]], top_k: int,
+                     stage) -> List[List[Optional[float]]]:
+        """
+        Cross-encoder scores for several rerank pools, aligned with prelims (None = left unscored).
+
+        The uncached pairs of every query share each cross-encoder call. Under a rerank budget the pools
+        are scored in rounds of up to RERANK_STEP_SIZE pairs per query in fused-score order: the first
+        round always runs, a query drops out once a whole step fails to enter its top_k, and no round
+        starts that would likely overrun the budget. A single query therefore gets the same scores
+        whether it is reranked alone or in a batch.
+        """
+        chunk_store = self.chunk_store
+        pair_keys = [[(normalize_query(query), chunk_store.get('id', row)) for row, _ in prelim]
+                     for query, prelim in zip(queries, prelims)]
+        scores = [[self.rerank_cache.get(key) for key in keys] for keys in pair_keys]
+        todo = [[i for i, score in enumerate(pool) if score is None] for pool in scores]
+        stage.set(cache_hits=sum(map(len, prelims)) - sum(map(len, todo)), scored=0)
+
+        def score_round(steps):
+            inputs = [(queries[q], chunk_store.content(prelims[q][i][0])) for q, step in steps for i in step]
+            _MODEL_INPUTS['rerank'].observe(len(inputs))
+            stage.set(scored=stage.attributes['scored'] + len(inputs))
+            new_scores = iter(self.reranker.predict(inputs, batch_size=RERANK_BATCH_SIZE))
+            caching = self._caching()
+            for q, step in steps:
+                for i in step:
+                    scores[q][i] = float(next(new_scores))
+                    if caching:
+                        self.rerank_cache.put(pair_keys[q][i], scores[q][i])
+
+        active = [q for q, pending in enumerate(todo) if pending]
+        # No budget: score every uncached pair in one pass
+        if self.rerank_budget_ms is None:
+            if active:
+                score_round([(q, todo[q]) for q in active])
+            return scores
+
+        # Budgeted: one small step per query and round
+        budget = self.rerank_budget_ms / 1000.0
+        start = time.perf_counter()
+        last_round = 0.0
+        step_start = 0
+        while active:
+            if step_start > 0 and time.perf_counter() - start + last_round > budget:
+                break
+            # Each query's current top_k threshold, before this round's scores
+            thresholds = {}
+            for q in active:
+                known = sorted((s for s in scores[q] if s is not None), reverse=True)
+                thresholds[q] = known[top_k - 1] if len(known) >= top_k else None
+            steps = [(q, todo[q][step_start:step_start + RERANK_STEP_SIZE]) for q in active]
+            round_began = time.perf_counter()
+            score_round(steps)
+            last_round = time.perf_counter() - round_began
+            step_start += RERANK_STEP_SIZE
+            # Stop a query once its top_k is full and a whole step failed to enter it
+            active = [q for q, step in steps if step_start < len(todo[q])
+                      and (thresholds[q] is None or any(scores[q][i] > thresholds[q] for i in step))]
+        return scores
+
+    def _build_results(self, prelim: List[Tuple[int, float]], rerank_scores, top_k: int,
+                       expand_aliases: bool = False) -> List[Dict]:
+        """Order the rerank pool by cross-encoder score and attach chunk metadata (and aliases if asked)."""
+        with span("results"):
+            chunk_store = self.chunk_store
+            has_headings = chunk_store.has_column('heading_path')
+            dedup = self._get("dedup") if expand_aliases else None
+
+            # 8) Final top_k selection; unscored candidates follow in fusion order
+            final = []
+            unscored = []
+            for idx, item in enumerate(prelim):
+                row = item[0]
+                score = rerank_scores[idx]   # aligned by index
+                if score is None:
+                    unscored.append(item)
+                else:
+                    final.append((row, float(score)))
+
+            # 9) Build results
+            top_final = (sorted(final, key=lambda x: x[1], reverse=True) + unscored)[:top_k]
+
+            # 10) Build results
+            results = []
+            for row, score in top_final:
+                result = {
+                    'id': chunk_store.get('id', row),
+                    'source_file': chunk_store.get('source_file', row),
+                    'heading_path': chunk_store.get('heading_path', row) if has_headings else "",
+                    'content': chunk_store.content(row),
+                    'score': score
+                }
+                if dedup is not None:
+                    # Near-duplicates collapsed into this chunk at index time
+                    result['aliases'] = [{
+                        'id': chunk_store.get('id', int(alias)),
+                        'source_file': chunk_store.get('source_file', int(alias)),
+                        'heading_path': chunk_store.get('heading_path', int(alias)) if has_headings else "",
+                    } for alias in dedup.aliases(row)]
+                results.append(result)
+            return results
+
+    def retrieve(self, query: str, top_k: int = 5, alpha: float = 0.7, nprobe: Optional[int] = None,
+                 ef_search: Optional[int] = None, fusion: Optional[str] = None, sparse_depth: Optional[int] = None,
+                 dense_depth: Optional[int] = None, language: Optional[str] = None,
+                 expand_aliases: bool = False) -> List[Dict]:
+        """
+        Retrieve top_k chunks using BM25+FAISS fusion, heuristic boosts,
+        and cross-encoder reranking.
+
+        nprobe (IVF indexes) and ef_search (HNSW indexes) override the search
+        settings saved with the FAISS index. fusion picks the score fusion
+        mode (FUSION_MODE by default), and sparse_depth / dense_depth the
+        number of candidates taken from BM25 / FAISS before fusion. language
+        ("de", "en,fr" or "all") picks the language shards to search instead
+        of detecting the query's language. expand_aliases adds an 'aliases'
+        list to each result: the near-duplicate chunks collapsed into it.
+        """
+        # 0) Result cache
+        settings = self.search_settings(top_k, alpha, nprobe, ef_search, fusion, sparse_depth, dense_depth,
+                                        language, expand_aliases)
+        with span("retrieve", top_k=top_k, fusion=settings.fusion) as stage:
+            self._check_index_version()
+            cache_key = self.result_key(query, settings)
+            cached = self.result_cache.get(cache_key)
+            stage.set(cache_hit=cached is not None)
+            if cached is not None:
+                return [dict(r) for r in cached]
+
+            with self.pinned():
+                results = self._retrieve_uncached(query, settings)
+                if self._caching():
+                    self.result_cache.put(cache_key, results)
+            return [dict(r) for r in results]
+
+    def retrieve_progressive(self, query: str, top_k: int = 5, alpha: float = 0.7, nprobe: Optional[int] = None,
+                             ef_search: Optional[int] = None, fusion: Optional[str] = None,
+                             sparse_depth: Optional[int] = None, dense_depth: Optional[int] = None,
+                             language: Optional[str] = None,
+                             expand_aliases: bool = False) -> Iterator[Tuple[str, List[Dict]]]:
+        """
+        Retrieve like retrieve(), yielding (stage, results) as stages finish.
+
+        First yields (FUSED_STAGE, results) in fusion + boost order, scored
+        with the fused scores, as soon as BM25, FAISS and fusion are done.
+        Then it yields (RERANKED_STAGE, results) once the cross-encoder has
+        scored the pool; these are the results retrieve() returns. A result
+        cache hit yields only the reranked stage. Closing the generator
+        after the first stage skips the cross-encoder entirely.
+        """
+        settings = self.search_settings(top_k, alpha, nprobe, ef_search, fusion, sparse_depth, dense_depth,
+                                        language, expand_aliases)
+        self._check_index_version()
+        cache_key = self.result_key(query, settings)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            yield RERANKED_STAGE, [dict(r) for r in cached]
+            return
+
+        # Both stages run on one snapshot, pinned per stage since the caller runs between them.
+        # Stage spans are timed from the start of each stage: time to first results, then rerank time.
+        snapshot = self.snapshot
+        with span(f"progressive_{FUSED_STAGE}", top_k=top_k, fusion=settings.fusion), self.pinned(snapshot):
+            q_embs, similar = self._semantic_lookup([query], settings)
+            if similar[0] is None:
+                prelim = self._candidate_pool(query, settings, q_embs)
+                fused = self._build_results(prelim, [None] * len(prelim), settings.top_k, settings.expand_aliases)
+            elif self._caching():
+                self.result_cache.put(cache_key, similar[0])
+        if similar[0] is not None:
+            yield RERANKED_STAGE, [dict(r) for r in similar[0]]
+            return
+        yield FUSED_STAGE, [dict(r) for r in fused]
+
+        with span(f"progressive_{RERANKED_STAGE}", top_k=top_k), self.pinned(snapshot):
+            rerank_scores = self._rerank(query, prelim, settings.top_k)
+            results = self._build_results(prelim, rerank_scores, settings.top_k, settings.expand_aliases)
+            if self._caching():
+                self.result_cache.put(cache_key, results)
+                self._semantic_store([query], q_embs, settings, [results])
+        yield RERANKED_STAGE, [dict(r) for r in results]
+
+    def _candidate_pool(self, query: str, settings: SearchSettings,
+                        q_embs: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Run BM25, FAISS, fusion and boosts for one query and return the rerank pool (q_embs: its embedding)."""
+        route = self.route(query, settings.language)
+
+        # 1) BM25 search
+        sparse = self._bm25_search(query, settings.sparse_depth, route)
+
+        # 2) FAISS search
+        if q_embs is None:
+            q_embs = self._encode_queries([query])
+        dense = self._dense_candidates(q_embs, settings, [route])[0]
+
+        # 3-6) Fusion, boosts and rerank pool
+        return self._fuse_candidates(sparse, dense, settings)
+
+    def _retrieve_uncached(self, query: str, settings: SearchSettings) -> List[Dict]:
+        """Run the full retrieval pipeline for one query."""
+        # 0) Semantic cache: results of a near-identical recent query
+        q_embs, similar = self._semantic_lookup([query], settings)
+        if similar[0] is not None:
+            return similar[0]
+
+        # 1-6) Candidates, fusion, boosts and rerank pool
+        prelim = self._candidate_pool(query, settings, q_embs)
+
+        # 7) Cross‐encoder rerank
+        rerank_scores = self._rerank(query, prelim, settings.top_k)
+
+        # 8-10) Final ordering and results
+        results = self._build_results(prelim, rerank_scores, settings.top_k, settings.expand_aliases)
+        if self._caching():
+            self._semantic_store([query], q_embs, settings, [results])
+        return results
+
+    def retrieve_batch(self, queries: List[str], top_k: int = 5, alpha: float = 0.7, nprobe: Optional[int] = None,
+                       ef_search: Optional[int] = None, fusion: Optional[str] = None,
+                       sparse_depth: Optional[int] = None, dense_depth: Optional[int] = None,
+                       language: Optional[str] = None, expand_aliases: bool = False) -> List[List[Dict]]:
+        """
+        Retrieve top_k chunks for many queries at once.
+
+        Encodes all queries in one forward pass, runs a single multi-row FAISS
+        search and scores every (query, passage) pair in shared cross-encoder
+        batches. Results match calling retrieve() on each query in turn, and
+        share its result cache.
+
+        Args:
+            queries: List of search queries
+            top_k: Number of results to return per query
+            alpha: Balance between dense (1.0) and sparse (0.0) search
+            nprobe: IVF lists probed per query (defaults to the index's setting)
+            ef_search: HNSW search depth (defaults to the index's setting)
+            fusion: Score fusion mode (defaults to FUSION_MODE)
+            sparse_depth: BM25 candidates per query (defaults to SPARSE_DEPTH)
+            dense_depth: FAISS candidates per query (defaults to DENSE_DEPTH)
+            language: Language shards to search (default: detected per query)
+            expand_aliases: List the near-duplicates collapsed into each result
+
+        Returns:
+            List of result lists, aligned with queries
+        """
+        if not queries:
+            return []
+
+        # 0) Serve what we can from the result cache
+        settings = self.search_settings(top_k, alpha, nprobe, ef_search, fusion, sparse_depth, dense_depth,
+                                        language, expand_aliases)
+        with span("retrieve_batch", queries=len(queries), top_k=top_k, fusion=settings.fusion) as stage:
+            self._check_index_version()
+            cache_keys = [self.result_key(q, settings) for q in queries]
+            results = [self.result_cache.get(key) for key in cache_keys]
+            missing = [i for i, r in enumerate(results) if r is None]
+            stage.set(cache_hits=len(queries) - len(missing))
+            if missing:
+                with self.pinned():
+                    computed = self._retrieve_batch_uncached([queries[i] for i in missing], settings)
+                    caching = self._caching()
+                for i, query_results in zip(missing, computed):
+                    results[i] = query_results
+                    if caching:
+                        self.result_cache.put(cache_keys[i], query_results)
+            return [[dict(r) for r in query_results] for query_results in results]
+
+    def _retrieve_batch_uncached(self, queries: List[str], settings: SearchSettings) -> List[List[Dict]]:
+        """Run the full retrieval pipeline for many queries with shared model calls."""
+        # 0) Semantic cache, after encoding all queries in one pass
+        q_embs, results = self._semantic_lookup(queries, settings)
+        missing = [i for i, r in enumerate(results) if r is None]
+        if not missing:
+            return results
+        # Paraphrases of an earlier query in the batch reuse its results
+        sources = self._semantic_duplicates([queries[i] for i in missing], q_embs[missing], settings, missing)
+        unique = [i for i, source in zip(missing, sources) if source == i]
+        todo = [queries[i] for i in unique]
+
+        # 1) BM25 search (no batched search, but the searcher is shared)
+        all_sparse = self._sparse_search_batch(todo, settings)
+
+        # 2) FAISS search for all queries in a single call
+        all_dense = self._dense_search_batch(todo, settings, q_embs[unique])
+
+        # 3-6) Fusion, boosts and rerank pool per query
+        prelims = [self._fuse_candidates(sparse, dense, settings) for sparse, dense in zip(all_sparse, all_dense)]
+
+        # 7-10) Shared cross-encoder batches and results
+        computed = self._rerank_batch(todo, prelims, settings.top_k, settings.expand_aliases)
+        for i, query_results in zip(unique, computed):
+            results[i] = query_results
+        for i, source in zip(missing, sources):
+            results[i] = results[source]
+        if self._caching():
+            self._semantic_store(todo, q_embs[unique], settings, computed)
+        return results
+
+    def _semantic_key(self, query: str, settings: SearchSettings) -> Tuple:
+        """What a semantic cache entry must match exactly: the settings and the query's language route."""
+        return settings, self.route(query, settings.language)
+
+    def _semantic_lookup(self, queries: List[str],
+                         settings: SearchSettings) -> Tuple[np.ndarray, List[Optional[List[Dict]]]]:
+        """Encode queries and return their embeddings with the semantic cache's results (None on a miss)."""
+        q_embs = self._encode_queries(queries)
+        if self.semantic_cache.maxsize <= 0:
+            return q_embs, [None] * len(queries)
+        with span("semantic_cache", queries=len(queries)) as stage:
+            results = [self.semantic_cache.get(emb, self._semantic_key(query, settings))
+                       for query, emb in zip(queries, q_embs)]
+            stage.set(cache_hits=sum(r is not None for r in results))
+        return q_embs, results
+
+    def _semantic_duplicates(self, queries: List[str], q_embs: np.ndarray, settings: SearchSettings,
+                             positions: Optional[List[int]] = None) -> List[int]:
+        """
+        For each query that missed the semantic cache, the position of the query
+        whose results it reuses.
+
+        A query reuses the results of the most similar earlier query of the
+        batch that is computed itself, as retrieve() called on each query in
+        turn would find them in the semantic cache; others map to themselves.
+
+        Args:
+            queries: Queries that missed the semantic cache, in batch order
+            q_embs: Their embeddings
+            settings: Retrieval settings of the batch
+            positions: Position of each query in the caller's list (default: 0..n-1)
+        """
+        positions = list(range(len(queries))) if positions is None else positions
+        sources = list(positions)
+        if self.semantic_cache.maxsize <= 0 or len(queries) < 2:
+            return sources
+        keys = [self._semantic_key(query, settings) for query in queries]
+        similarity = q_embs @ q_embs.T
+        for j in range(1, len(queries)):
+            earlier = [i for i in range(j) if sources[i] == positions[i] and keys[i] == keys[j]
+                       and similarity[j, i] >= self.semantic_cache.threshold]
+            if earlier:
+                sources[j] = positions[max(earlier, key=lambda i: similarity[j, i])]
+        return sources
+
+    def _semantic_store(self, queries: List[str], q_embs: np.ndarray, settings: SearchSettings,
+                        results: List[List[Dict]]) -> None:
+        """Add computed results to the semantic cache."""
+        for query, emb, query_results in zip(queries, q_embs, results):
+            self.semantic_cache.put(emb, self._semantic_key(query, settings), query_results)
+
+    def _sparse_search_batch(self, queries: List[str], settings: SearchSettings) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """BM25 (rows, scores) for each query."""
+        return [self._bm25_search(query, settings.sparse_depth, self.route(query, settings.language))
+                for query in queries]
+
+    def _dense_search_batch(self, queries: List[str], settings: SearchSettings,
+                            q_embs: Optional[np.ndarray] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Encode queries in one pass (unless q_embs is given), run one FAISS
+        search per index and return (rows, scores) per query.
+        """
+        routes = [self.route(query, settings.language) for query in queries]
+        if q_embs is None:
+            q_embs = self._encode_queries(queries)
+        return self._dense_candidates(q_embs, settings, routes)
+
+    def _dense_candidates(self, q_embs: np.ndarray, settings: SearchSettings,
+                          routes: Optional[List[Optional[Tuple[str, ...]]]] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Run FAISS for encoded queries and return (rows, scores) per query.
+
+        Without shards (routes of None) all queries share one search of the
+        unsharded index. Otherwise each shard is searched once for the
+        queries routed to it, and a query's shard results are merged.
+        """
+        if routes is None or routes[0] is None:
+            with span("faiss", queries=len(q_embs)) as stage:
+                scores, rows = self._dense_search(q_embs, settings.dense_depth, settings.nprobe, settings.ef_search)
+                found = rows >= 0
+                stage.set(candidates=int(found.sum()) // max(len(q_embs), 1))
+            return [(rows[i][found[i]].astype(np.int64), scores[i][found[i]].astype(np.float32))
+                    for i in range(len(q_embs))]
+
+        from src.shards import merge_candidates
+
+        shards = self._get("shards")
+        parts: List[List[Tuple[np.ndarray, np.ndarray]]] = [[] for _ in routes]
+        with span("faiss", queries=len(q_embs)) as stage:
+            for language in sorted({lang for route in routes for lang in route}):
+                members = [i for i, route in enumerate(routes) if language in route]
+                scores, rows = self._dense_search(q_embs[members], settings.dense_depth, settings.nprobe,
+                                                  settings.ef_search, shards[language])
+                for j, i in enumerate(members):
+                    found = rows[j] >= 0
+                    parts[i].append((rows[j][found].astype(np.int64), scores[j][found].astype(np.float32)))
+            candidates = [merge_candidates(query_parts, settings.dense_depth) for query_parts in parts]
+            stage.set(candidates=sum(len(c[0]) for c in candidates) // max(len(q_embs), 1),
+                      shards=len({lang for route in routes for lang in route}))
+        return candidates
+
+    def _rerank_batch(self, queries: List[str], prelims: List[List[Tuple[int, float]]],
+                      top_k: int, expand_aliases: bool = False) -> List[List[Dict]]:
+        """Rerank every query's pool in shared cross-encoder batches within the rerank budget; build results."""
+        # 7) Cross‐encoder rerank of every uncached (query, passage) pair in shared batches
+        with span("rerank", queries=len(queries)) as stage:
+            stage.set(candidates=sum(map(len, prelims)) // max(len(queries), 1))
+            pool_scores = self._score_pools(queries, prelims, top_k, stage)
+
+        # 8-10) Build each query's results
+        return [self._build_results(prelim, scores, top_k, expand_aliases)
+                for prelim, scores in zip(prelims, pool_scores)]
+
+_default_retriever: Optional[Retriever] = None
+_default_lock = threading.Lock()
+
+def get_retriever() -> Retriever:
+    """Return the process-wide Retriever, creating it (without loading anything) on first call."""
+    global _default_retriever
+    if _default_retriever is None:
+        with _default_lock:
+            if _default_retriever is None:
+                _default_retriever = Retriever()
+    return _default_retriever
+
+def retrieve(query: str, top_k: int = 5, alpha: float = 0.7, **kwargs) -> List[Dict]:
+    """Retrieve top_k chunks for a query with the process-wide Retriever."""
+    return get_retriever().retrieve(query, top_k=top_k, alpha=alpha, **kwargs)
+
+def retrieve_batch(queries: List[str], top_k: int = 5, alpha: float = 0.7, **kwargs) -> List[List[Dict]]:
+    """Retrieve top_k chunks for many queries with the process-wide Retriever."""
+    return get_retriever().retrieve_batch(queries, top_k=top_k, alpha=alpha, **kwargs)
+
+def retrieve_progressive(query: str, top_k: int = 5, alpha: float = 0.7,
+                         **kwargs) -> Iterator[Tuple[str, List[Dict]]]:
+    """Yield (stage, results) for a query with the process-wide Retriever: fused, then reranked."""
+    return get_retriever().retrieve_progressive(query, top_k=top_k, alpha=alpha, **kwargs)
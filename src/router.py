@@ -0,0 +1,119 @@
+import re
+from typing import Dict, Iterable, Optional, Tuple
+
+# Language of queries with no detectable language signal (plain English words and
+# code identifiers look the same in every translation of the docs)
+DEFAULT_LANGUAGE = "en"
+
+# Scripts that identify a language on their own, checked in order
+# (kana before Han, since Japanese text mixes both)
+SCRIPT_LANGUAGES = (
+    ("ko", re.compile(r"[\uac00-\ud7af\u1100-\u11ff\u3130-\u318f]")),   # Hangul
+    ("ja", re.compile(r"[\u3040-\u30ff]")),                             # Hiragana, Katakana
+    ("zh", re.compile(r"[\u4e00-\u9fff]")),                             # CJK ideographs
+    ("ar", re.compile(r"[\u0600-\u06ff]")),                             # Arabic
+    ("hi", re.compile(r"[\u0900-\u097f]")),                             # Devanagari
+    ("te", re.compile(r"[\u0c00-\u0c7f]")),                             # Telugu
+    ("ru", re.compile(r"[\u0400-\u04ff]")),                             # Cyrillic
+)
+
+# Function words of Latin-script languages; a query's language is the one with the most hits
+STOP_WORDS: Dict[str, frozenset] = {
+    'en': frozenset(("the", "how", "what", "is", "are", "do", "does", "to", "with", "for", "and", "of",
+                     "can", "my", "why", "which", "use", "using", "in", "on", "from")),
+    'de': frozenset(("der", "die", "das", "und", "ist", "wie", "mit", "ich", "ein", "eine", "einen", "nicht",
+                     "was", "für", "auf", "kann", "den", "dem", "zu", "von", "verwende")),
+    'es': frozenset(("el", "la", "los", "las", "cómo", "como", "qué", "que", "es", "un", "una", "para",
+                     "con", "del", "por", "puedo", "usar", "en", "y")),
+    'fr': frozenset(("le", "la", "les", "comment", "est", "un", "une", "pour", "avec", "des", "du", "je",
+                     "et", "dans", "sur", "quel", "quelle", "utiliser")),
+    'it': frozenset(("il", "lo", "la", "gli", "come", "che", "è", "un", "una", "per", "con", "del", "della",
+                     "posso", "usare", "di", "e")),
+    'pt': frozenset(("o", "os", "as", "como", "que", "é", "um", "uma", "para", "com", "do", "da", "posso",
+                     "usar", "em", "e", "não")),
+    'tr': frozenset(("bir", "ve", "nasıl", "ile", "için", "bu", "ne", "mi", "nedir", "kullanılır")),
+    'ms': frozenset(("yang", "dan", "untuk", "dengan", "ini", "adalah", "bagaimana", "apa", "saya")),
+}
+# Letters that only occur in some Latin-script languages; each one counts as a stop word hit
+LANGUAGE_LETTERS = {
+    'de': frozenset("äöüß"),
+    'es': frozenset("ñ¿¡"),
+    'fr': frozenset("œçêàèù"),
+    'pt': frozenset("ãõç"),
+    'tr': frozenset("ğış"),
+}
+KNOWN_LANGUAGES = tuple(sorted({code for code, _ in SCRIPT_LANGUAGES} | set(STOP_WORDS)))
+
+WORD_PATTERN = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+def detect_languages(query: str) -> Tuple[str, ...]:
+    """
+    Guess a query's language from its script and function words.
+
+    Returns:
+        The most likely language codes (several on a tie), or () when the
+        query carries no language signal, e.g. only identifiers
+    """
+    for language, pattern in SCRIPT_LANGUAGES:
+        if pattern.search(query):
+            return (language,)
+
+    lowered = query.lower()
+    words = WORD_PATTERN.findall(lowered)
+    hits = {language: sum(word in stop_words for word in words) for language, stop_words in STOP_WORDS.items()}
+    for language, letters in LANGUAGE_LETTERS.items():
+        hits[language] += sum(ch in letters for ch in lowered)
+    best = max(hits.values())
+    if best == 0:
+        return ()
+    return tuple(sorted(language for language, count in hits.items() if count == best))
+
+def normalize_language(language: Optional[str]) -> Optional[str]:
+    """
+    Canonicalize a language selection: None for automatic detection, "all",
+    or comma-separated codes in sorted order (e.g. "de,en").
+    """
+    if language is None:
+        return None
+    codes = sorted({code.strip().lower() for code in str(language).split(",") if code.strip()})
+    if not codes or codes == ["auto"]:
+        return None
+    if "all" in codes:
+        return "all"
+    for code in codes:
+        if not re.fullmatch(r"[a-z]{2,3}(-[a-z]+)?", code):
+            raise ValueError(f"Invalid language code: {code!r}")
+    return ",".join(codes)
+
+def route_languages(query: str, language: Optional[str], available: Iterable[str]) -> Tuple[str, ...]:
+    """
+    Pick the language shards to search for a query.
+
+    Args:
+        query: Search query, used for detection when no language is given
+        language: normalize_language() output: None (detect), "all" or codes
+        available: Languages with a loaded shard
+
+    Returns:
+        Languages to search, sorted; results of several are merged
+
+    Raises:
+        ValueError: An explicitly requested language has no shard
+    """
+    available = tuple(sorted(available))
+    if language == "all":
+        return available
+    if language is not None:
+        requested = tuple(language.split(","))
+        missing = [code for code in requested if code not in available]
+        if missing:
+            raise ValueError(f"Language not served: {', '.join(missing)} (available: {', '.join(available)})")
+        return requested
+
+    detected = tuple(code for code in detect_languages(query) if code in available)
+    if detected:
+        return detected
+    # No signal, or a language we do not serve: fall back to the source docs, else search everything
+    if DEFAULT_LANGUAGE in available:
+        return (DEFAULT_LANGUAGE,)
+    return available
@@ -0,0 +1,531 @@
+import argparse
+import asyncio
+import contextvars
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import tornado.iostream
+import tornado.web
+
+from src.metrics import REGISTRY, PROMETHEUS_CONTENT_TYPE, Callback
+from src.features import load_boost_table
+from src.retriever import Retriever, SearchSettings, get_retriever
+from src.tracing import enable_opentelemetry, span
+
+HOST = "127.0.0.1"
+PORT = 8600
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+# Micro-batching: requests arriving within MAX_BATCH_WAIT_MS share one batch
+MAX_BATCH_SIZE = 32
+MAX_BATCH_WAIT_MS = 5.0
+# Batches running at once (each uses up to two pool threads)
+MAX_CONCURRENT_BATCHES = 2
+# Backpressure: outstanding requests beyond this are rejected with 503
+MAX_PENDING = 256
+# Seconds before a request is answered with 504
+REQUEST_TIMEOUT = 10.0
+# Threads for BM25, encoding/FAISS and reranking
+WORKERS = 4
+
+class ServiceOverloaded(Exception):
+    """Raised when too many requests are already waiting."""
+
+class _PendingRequest:
+    __slots__ = ("query", "settings", "future")
+
+    def __init__(self, query: str, settings: SearchSettings, future: asyncio.Future):
+        self.query = query
+        self.settings = settings
+        self.future = future
+
+class SearchService:
+    """
+    Asyncio front end to a Retriever that micro-batches concurrent requests.
+
+    Requests are queued and collected for up to max_batch_wait_ms (or
+    max_batch_size requests). Each batch is split by retrieval settings;
+    per group, BM25 and the query encoder + FAISS search run concurrently
+    on a bounded thread pool, then one shared cross-encoder pass reranks
+    every query's pool. Results go through the retriever's result cache.
+    """
+
+    def __init__(self, retriever: Optional[Retriever] = None, max_batch_size: int = MAX_BATCH_SIZE,
+                 max_batch_wait_ms: float = MAX_BATCH_WAIT_MS, max_concurrent_batches: int = MAX_CONCURRENT_BATCHES,
+                 max_pending: int = MAX_PENDING, request_timeout: float = REQUEST_TIMEOUT, workers: int = WORKERS):
+        self.retriever = retriever or get_retriever()
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait = max_batch_wait_ms / 1000.0
+        self.max_concurrent_batches = max_concurrent_batches
+        self.max_pending = max_pending
+        self.request_timeout = request_timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="search")
+
+        self.pending = 0
+        self.counters = {'requests': 0, 'batches': 0, 'batched_requests': 0, 'rejected': 0, 'timeouts': 0,
+                         'errors': 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._batcher: Optional[asyncio.Task] = None
+        for name in self.counters:
+            REGISTRY.register(f"service_{name}_total", f"Search service {name.replace('_', ' ')}",
+                              Callback(lambda name=name: self.counters[name], "counter"))
+        REGISTRY.register("service_pending", "Search requests waiting for results", Callback(lambda: self.pending))
+
+    async def start(self) -> None:
+        """Start the batching loop on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._batcher = asyncio.create_task(self._batch_loop())
+
+    async def stop(self) -> None:
+        """Stop batching and shut the thread pool down."""
+        if self._batcher is not None:
+            self._batcher.cancel()
+        self.executor.shutdown(wait=False)
+
+    async def search(self, query: str, top_k: int = 5, alpha: float = 0.7, nprobe: Optional[int] = None,
+                     ef_search: Optional[int] = None, fusion: Optional[str] = None,
+                     sparse_depth: Optional[int] = None, dense_depth: Optional[int] = None,
+                     language: Optional[str] = None, expand_aliases: bool = False) -> List[Dict]:
+        """
+        Queue a query for the next batch and wait for its results.
+
+        Raises:
+            ValueError: Invalid arguments
+            ServiceOverloaded: Too many outstanding requests
+            asyncio.TimeoutError: No result within request_timeout
+        """
+        self._validate(query, top_k, alpha)
+        settings = self.retriever.search_settings(int(top_k), float(alpha), nprobe, ef_search, fusion,
+                                                  sparse_depth, dense_depth, language, expand_aliases)
+        self._admit()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_PendingRequest(query, settings, future))
+        try:
+            return await asyncio.wait_for(future, self.request_timeout)
+        except asyncio.TimeoutError:
+            self.counters['timeouts'] += 1
+            raise
+        finally:
+            self.pending -= 1
+
+    async def search_stream(self, query: str, top_k: int = 5, alpha: float = 0.7,
+                            **kwargs) -> AsyncIterator[Tuple[str, List[Dict]]]:
+        """
+        Yield (stage, results) as a query progresses: fused results, then reranked ones.
+
+        Runs Retriever.retrieve_progressive() outside the request micro-batches;
+        its model calls still share batches through the retriever's schedulers.
+        Each stage must finish within request_timeout.
+        """
+        self._validate(query, top_k, alpha)
+        self.retriever.search_settings(int(top_k), float(alpha), **kwargs)
+        self._admit()
+        try:
+            stages = self.retriever.retrieve_progressive(query, int(top_k), float(alpha), **kwargs)
+            step = None
+            try:
+                while True:
+                    # Shielded: a timed-out stage keeps running on its worker thread
+                    step = self._in_executor(next, stages, None)
+                    try:
+                        stage = await asyncio.wait_for(asyncio.shield(step), self.request_timeout)
+                    except asyncio.TimeoutError:
+                        self.counters['timeouts'] += 1
+                        raise
+                    if stage is None:
+                        return
+                    yield stage
+            finally:
+                if step is not None and not step.done():
+                    # The generator is still executing; close it once the stage finishes
+                    def close_stages(finished):
+                        if not finished.cancelled():
+                            finished.exception()  # a late failure is not an unhandled error
+                        stages.close()
+
+                    step.add_done_callback(close_stages)
+                else:
+                    stages.close()
+        finally:
+            self.pending -= 1
+
+    @staticmethod
+    def _validate(query: str, top_k: int, alpha: float) -> None:
+        if not isinstance(query, str) or not query.strip():
+            raise ValueError("query must be a non-empty string")
+        if not 1 <= int(top_k) <= 100 or not 0.0 <= float(alpha) <= 1.0:
+            raise ValueError("top_k must be in [1, 100] and alpha in [0, 1]")
+
+    def _admit(self) -> None:
+        """Count a new request, or reject it when too many are outstanding."""
+        if self.pending >= self.max_pending:
+            self.counters['rejected'] += 1
+            raise ServiceOverloaded(f"{self.pending} requests pending")
+        self.counters['requests'] += 1
+        self.pending += 1
+
+    async def _batch_loop(self) -> None:
+        """Collect queued requests into batches and dispatch them."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_batch_wait
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Requests that already timed out are dropped before any work is done
+            batch = [request for request in batch if not request.future.done()]
+            if not batch:
+                continue
+            await self._slots.acquire()
+            task = asyncio.create_task(self._run_batch(batch))
+            task.add_done_callback(lambda _: self._slots.release())
+
+    async def _run_batch(self, batch: List[_PendingRequest]) -> None:
+        """Run one batch, grouped by retrieval settings."""
+        self.counters['batches'] += 1
+        self.counters['batched_requests'] += len(batch)
+        groups: Dict[SearchSettings, List[_PendingRequest]] = {}
+        for request in batch:
+            groups.setdefault(request.settings, []).append(request)
+        await asyncio.gather(*(self._run_group(settings, requests) for settings, requests in groups.items()))
+
+    async def _run_group(self, settings: SearchSettings, requests: List[_PendingRequest]) -> None:
+        """Serve cache hits, then run the staged pipeline once for the distinct missing queries."""
+        retriever = self.retriever
+        try:
+            with span("search_group", queries=len(requests), top_k=settings.top_k) as stage:
+                retriever._check_index_version()
+                # Every stage of the group runs on this index snapshot, even if a new one is swapped in
+                snapshot = retriever.snapshot
+                keys = [retriever.result_key(request.query, settings) for request in requests]
+                results = {key: retriever.result_cache.get(key) for key in set(keys)}
+                missing = {}
+                for request, key in zip(requests, keys):
+                    if results[key] is None:
+                        missing.setdefault(key, request.query)
+                stage.set(cache_hits=len(results) - len(missing))
+
+                if missing:
+                    # Encode first, so paraphrases of recent queries are answered from the semantic cache
+                    q_embs, similar = await self._in_executor(retriever.call_pinned, snapshot,
+                                                              retriever._semantic_lookup, list(missing.values()),
+                                                              settings)
+                    todo = [i for i, query_results in enumerate(similar) if query_results is None]
+                    for key, query_results in zip(list(missing), similar):
+                        if query_results is not None:
+                            results[key] = query_results
+                            del missing[key]
+                            if snapshot is retriever.snapshot:
+                                retriever.result_cache.put(key, query_results)
+                    stage.set(semantic_hits=len(similar) - len(todo))
+
+                if missing:
+                    # Paraphrases of an earlier query in the group reuse its results
+                    sources = await self._in_executor(retriever.call_pinned, snapshot,
+                                                      retriever._semantic_duplicates, list(missing.values()),
+                                                      q_embs[todo], settings)
+                    missing_keys = list(missing)
+                    unique = [j for j, source in enumerate(sources) if source == j]
+                    queries = [missing[missing_keys[j]] for j in unique]
+                    q_embs = q_embs[todo][unique]
+                    # BM25 and FAISS run concurrently
+                    sparse = self._in_executor(retriever.call_pinned, snapshot, retriever._sparse_search_batch,
+                                               queries, settings)
+                    dense = self._in_executor(retriever.call_pinned, snapshot, retriever._dense_search_batch,
+                                              queries, settings, q_embs)
+                    all_sparse, all_dense = await asyncio.gather(sparse, dense)
+
+                    def fuse_and_rerank():
+                        prelims = [retriever._fuse_candidates(sparse, dense, settings)
+                                   for sparse, dense in zip(all_sparse, all_dense)]
+                        return retriever._rerank_batch(queries, prelims, settings.top_k, settings.expand_aliases)
+
+                    computed = await self._in_executor(retriever.call_pinned, snapshot, fuse_and_rerank)
+                    for j, query_results in zip(unique, computed):
+                        results[missing_keys[j]] = query_results
+                    for key, source in zip(missing_keys, sources):
+                        results[key] = results[missing_keys[source]]
+                        if snapshot is retriever.snapshot:
+                            retriever.result_cache.put(key, results[key])
+                    if snapshot is retriever.snapshot:
+                        retriever._semantic_store(queries, q_embs, settings, computed)
+
+            for request, key in zip(requests, keys):
+                if not request.future.done():
+                    request.future.set_result([dict(r) for r in results[key]])
+        except Exception as e:
+            self.counters['errors'] += 1
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+
+    def _in_executor(self, fn, *args) -> asyncio.Future:
+        """Run fn on the thread pool inside the caller's context, so its spans nest under the current one."""
+        return asyncio.get_running_loop().run_in_executor(self.executor, contextvars.copy_context().run, fn, *args)
+
+    def stats(self) -> Dict:
+        """Return request/batch counters, queue depth and retriever cache stats."""
+        batches = self.counters['batches']
+        return {
+            **self.counters,
+            'pending': self.pending,
+            'mean_batch_size': self.counters['batched_requests'] / batches if batches else 0.0,
+            'caches': self.retriever.cache_stats(),
+            'model_batching': self.retriever.batching_stats(),
+        }
+
+class _JSONHandler(tornado.web.RequestHandler):
+    def initialize(self, service: SearchService):
+        self.service = service
+
+    def write_json(self, payload, status: int = 200) -> None:
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json")
+        self.finish(json.dumps(payload))
+
+    def read_json(self) -> Dict:
+        try:
+            body = json.loads(self.request.body or b"{}")
+        except json.JSONDecodeError as e:
+            raise ValueError(f"invalid JSON body: {e}")
+        if not isinstance(body, dict):
+            raise ValueError("JSON body must be an object")
+        return body
+
+    @staticmethod
+    def search_kwargs(body: Dict) -> Dict:
+        """Retrieval settings from a JSON request body."""
+        return {'top_k': body.get('top_k', 5), 'alpha': body.get('alpha', 0.7), 'nprobe': body.get('nprobe'),
+                'ef_search': body.get('ef_search'), 'fusion': body.get('fusion'),
+                'sparse_depth': body.get('sparse_depth'), 'dense_depth': body.get('dense_depth'),
+                'language': body.get('language'), 'expand_aliases': bool(body.get('expand_aliases', False))}
+
+    async def run_search(self, coro) -> None:
+        """Await a search and map service errors to HTTP status codes."""
+        start = time.perf_counter()
+        try:
+            results = await coro
+        except Exception as e:
+            return self.write_search_error(e)
+        self.write_json({'results': results, 'took_ms': (time.perf_counter() - start) * 1000.0})
+
+    def write_search_error(self, error: Exception) -> None:
+        """Answer a failed search with the status code for its error."""
+        if isinstance(error, (ValueError, TypeError)):
+            self.write_json({'error': str(error)}, 400)
+        elif isinstance(error, ServiceOverloaded):
+            self.set_header("Retry-After", "1")
+            self.write_json({'error': f"server overloaded: {error}"}, 503)
+        elif isinstance(error, asyncio.TimeoutError):
+            self.write_json({'error': "request timed out"}, 504)
+        else:
+            self.write_json({'error': f"search failed: {error}"}, 500)
+
+class SearchHandler(_JSONHandler):
+    """GET /search?q=...&top_k=5&alpha=0.7&language=de&expand_aliases=1 or POST /search with a JSON body."""
+
+    async def get(self):
+        await self.run_search(self._search_args())
+
+    async def post(self):
+        await self.run_search(self._search_body())
+
+    async def _search_args(self):
+        return await self.service.search(self.get_argument("q", ""), top_k=int(self.get_argument("top_k", "5")),
+                                         alpha=float(self.get_argument("alpha", "0.7")),
+                                         fusion=self.get_argument("fusion", None),
+                                         language=self.get_argument("language", None),
+                                         expand_aliases=self.get_argument("expand_aliases", "0") in ("1", "true"))
+
+    async def _search_body(self):
+        body = self.read_json()
+        return await self.service.search(body.get('query', ''), **self.search_kwargs(body))
+
+class BatchSearchHandler(_JSONHandler):
+    """POST /search/batch with {"queries": [...], "top_k": ..., "alpha": ...}."""
+
+    async def post(self):
+        await self.run_search(self._search_batch())
+
+    async def _search_batch(self):
+        body = self.read_json()
+        queries = body.get('queries')
+        if not isinstance(queries, list):
+            raise ValueError("queries must be a list")
+        kwargs = self.search_kwargs(body)
+        # Queued together, so they land in the same micro-batch
+        return await asyncio.gather(*(self.service.search(query, **kwargs) for query in queries))
+
+class StreamSearchHandler(_JSONHandler):
+    """
+    GET /search/stream?q=... or POST /search/stream: newline-delimited JSON, one line per stage.
+
+    Each line is {"stage": "fused" | "reranked", "results": [...], "took_ms": ...}
+    and is flushed as soon as the stage finishes. Errors before the first line
+    get the same status codes as /search; later ones end the stream with an
+    {"error": ...} line.
+    """
+
+    async def get(self):
+        try:
+            kwargs = {'top_k': int(self.get_argument("top_k", "5")), 'alpha': float(self.get_argument("alpha", "0.7")),
+                      'fusion': self.get_argument("fusion", None), 'language': self.get_argument("language", None),
+                      'expand_aliases': self.get_argument("expand_aliases", "0") in ("1", "true")}
+        except ValueError as e:
+            return self.write_json({'error': str(e)}, 400)
+        await self.stream_search(self.get_argument("q", ""), kwargs)
+
+    async def post(self):
+        try:
+            body = self.read_json()
+        except ValueError as e:
+            return self.write_json({'error': str(e)}, 400)
+        await self.stream_search(body.get('query', ''), self.search_kwargs(body))
+
+    async def stream_search(self, query: str, kwargs: Dict) -> None:
+        start = time.perf_counter()
+        stages = self.service.search_stream(query, **kwargs)
+        try:
+            stage, results = await stages.__anext__()
+        except StopAsyncIteration:
+            return self.write_json({'error': "search returned no results"}, 500)
+        except Exception as e:
+            return self.write_search_error(e)
+
+        self.set_header("Content-Type", NDJSON_CONTENT_TYPE)
+        try:
+            while True:
+                self.write(json.dumps({'stage': stage, 'results': results,
+                                       'took_ms': (time.perf_counter() - start) * 1000.0}) + "\n")
+                await self.flush()
+                try:
+                    stage, results = await stages.__anext__()
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    self.write(json.dumps({'error': "request timed out"}) + "\n")
+                    break
+                except Exception as e:
+                    self.write(json.dumps({'error': f"search failed: {e}"}) + "\n")
+                    break
+        except tornado.iostream.StreamClosedError:
+            # Client went away; the remaining stages are not computed
+            pass
+        finally:
+            await stages.aclose()
+        if not self._finished:
+            self.finish()
+
+class HealthHandler(_JSONHandler):
+    """GET /health: 200 once every component is loaded, 503 while warming up."""
+
+    def get(self):
+        retriever = self.service.retriever
+        ready = retriever.is_loaded()
+        languages = sorted(retriever.shards) if retriever.is_loaded("shards") else None
+        self.write_json({'status': 'ok' if ready else 'loading', 'index_version': retriever.index_version(),
+                         'serving_bundle': retriever.snapshot.version, 'languages': languages,
+                         'load_times': retriever.load_times}, 200 if ready else 503)
+
+class StatsHandler(_JSONHandler):
+    """GET /stats: service counters and cache hit rates."""
+
+    def get(self):
+        self.write_json(self.service.stats())
+
+class MetricsHandler(tornado.web.RequestHandler):
+    """GET /metrics: stage latencies, candidate counts, caches, model batching and service counters."""
+
+    def get(self):
+        self.set_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+        self.finish(REGISTRY.render())
+
+def make_app(service: SearchService) -> tornado.web.Application:
+    """Create the Tornado application for a search service."""
+    handler_args = {'service': service}
+    return tornado.web.Application([
+        (r"/search", SearchHandler, handler_args),
+        (r"/search/batch", BatchSearchHandler, handler_args),
+        (r"/search/stream", StreamSearchHandler, handler_args),
+        (r"/health", HealthHandler, handler_args),
+        (r"/stats", StatsHandler, handler_args),
+        (r"/metrics", MetricsHandler),
+    ])
+
+async def serve(host: str = HOST, port: int = PORT, sockets: Optional[List] = None, **service_kwargs) -> None:
+    """Warm up the retriever and serve HTTP requests until cancelled, on already bound sockets if given."""
+    service = SearchService(**service_kwargs)
+    await service.start()
+    service.retriever.warm_up(background=True)
+    if sockets is None:
+        server = make_app(service).listen(port, address=host)
+    else:
+        from tornado.httpserver import HTTPServer
+        server = HTTPServer(make_app(service))
+        server.add_sockets(sockets)
+    print(f"Search service listening on http://{host}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        server.stop()
+        await service.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve retrieve() over HTTP with micro-batching.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--max-batch-wait-ms", type=float, default=MAX_BATCH_WAIT_MS)
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING, help="Reject requests beyond this backlog")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT, help="Per-request timeout in seconds")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Thread pool size")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Pre-fork this many serving processes sharing indexes and models (0 = one per core)")
+    parser.add_argument("--threads", type=int,
+                        help="Model threads per process (default: cores divided by processes)")
+    parser.add_argument("--boosts", type=Path,
+                        help="JSON boost table ({feature: boost}, in fused score ranges; see src.features.BOOSTS)")
+    parser.add_argument("--languages", help="Comma-separated language shards to serve (default: all built)")
+    parser.add_argument("--semantic-cache-size", type=int,
+                        help="Recent queries whose results paraphrases may reuse (0 disables the semantic cache)")
+    parser.add_argument("--semantic-cache-threshold", type=float,
+                        help="Query embedding cosine similarity needed to reuse a recent query's results")
+    parser.add_argument("--otel", action="store_true",
+                        help="Export spans through the configured OpenTelemetry tracer provider")
+    args = parser.parse_args()
+
+    if args.otel and not enable_opentelemetry():
+        parser.error("--otel needs the opentelemetry-api package")
+
+    retriever_kwargs = {}
+    if args.boosts:
+        retriever_kwargs['boosts'] = load_boost_table(args.boosts)
+    if args.languages:
+        retriever_kwargs['languages'] = args.languages.split(",")
+    if args.semantic_cache_size is not None:
+        retriever_kwargs['semantic_cache_size'] = args.semantic_cache_size
+    if args.semantic_cache_threshold is not None:
+        retriever_kwargs['semantic_cache_threshold'] = args.semantic_cache_threshold
+    service_kwargs = dict(max_batch_size=args.max_batch_size, max_batch_wait_ms=args.max_batch_wait_ms,
+                          max_pending=args.max_pending, request_timeout=args.timeout, workers=args.workers)
+    if args.processes != 1:
+        from src.prefork import serve_prefork
+        serve_prefork(args.host, args.port, args.processes or None, args.threads, retriever_kwargs, **service_kwargs)
+    else:
+        retriever = Retriever(**retriever_kwargs) if retriever_kwargs else None
+        asyncio.run(serve(args.host, args.port, retriever=retriever, **service_kwargs))
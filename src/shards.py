@@ -0,0 +1,142 @@
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.chunk import file_language
+from src.chunk_store import ChunkStore
+from src.dedup import indexed_rows
+from src.features import store_fingerprint
+
+# Define paths: index/shards/<lang>/{rows.npy, bm25_native/, faiss_index/}
+ROOT = Path(__file__).parent.parent
+SHARDS_DIR = ROOT / "index" / "shards"
+
+def language_rows(chunks: ChunkStore, languages: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+    """
+    Return the indexed chunk store rows of each docs language (ascending),
+    optionally limited to some languages. Near-duplicates are left out (see src.dedup).
+    """
+    by_language: Dict[str, List[int]] = {}
+    for row in indexed_rows(chunks).tolist():
+        by_language.setdefault(file_language(chunks.get('source_file', row)), []).append(row)
+    if languages is not None:
+        languages = set(languages)
+        by_language = {lang: rows for lang, rows in by_language.items() if lang in languages}
+    return {lang: np.asarray(rows, dtype=np.int64) for lang, rows in sorted(by_language.items())}
+
+def built_languages(shards_dir: Path = SHARDS_DIR) -> List[str]:
+    """Languages recorded in shards/meta.json, whether or not they match the current chunk store."""
+    meta_file = Path(shards_dir) / "meta.json"
+    if not meta_file.exists():
+        return []
+    with open(meta_file, 'r', encoding='utf-8') as f:
+        return sorted(json.load(f)['languages'])
+
+def save_shard_rows(chunks: ChunkStore, rows: Dict[str, np.ndarray], shards_dir: Path = SHARDS_DIR) -> None:
+    """
+    Write each shard's rows.npy and record the shards in shards/meta.json.
+
+    Shards recorded against an older version of the chunk store are dropped
+    from the meta file, since their rows no longer line up.
+    """
+    shards_dir = Path(shards_dir)
+    meta_file = shards_dir / "meta.json"
+    fingerprint = store_fingerprint(chunks.store_dir)
+    meta = {'store': fingerprint, 'languages': {}}
+    if meta_file.exists():
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        if saved.get('store') == fingerprint:
+            meta = saved
+    for language, shard_rows in rows.items():
+        (shards_dir / language).mkdir(parents=True, exist_ok=True)
+        np.save(shards_dir / language / "rows.npy", shard_rows)
+        meta['languages'][language] = len(shard_rows)
+    with open(meta_file, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2, sort_keys=True)
+
+class LanguageShard:
+    """
+    Native BM25 and FAISS indexes over one language's chunk store rows.
+
+    BM25 postings are keyed by chunk store row and FAISS labels are chunk
+    keys, so both return chunk store rows.
+    """
+
+    def __init__(self, language: str, shard_dir: Path):
+        from src.bm25_native import NativeBM25
+        from src.index_faiss import load_index_meta, load_rescore_vectors, read_faiss_index
+
+        self.language = language
+        self.rows = np.load(Path(shard_dir) / "rows.npy")
+        self.bm25 = NativeBM25(Path(shard_dir) / "bm25_native")
+        faiss_dir = Path(shard_dir) / "faiss_index"
+        self.faiss_index = read_faiss_index(faiss_dir / "index.faiss")
+        self.faiss_meta = load_index_meta(faiss_dir)
+        self.faiss_vectors, self.vector_rows = None, None
+        if self.faiss_meta.get('rescore'):
+            self.faiss_vectors, self.vector_rows = load_rescore_vectors(faiss_dir)
+            if self.vector_rows is None:
+                # Shards always hold their vectors in shard row order
+                self.vector_rows = self.rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+def is_built(shard_dir: Path) -> bool:
+    """Check that a shard has rows, a native BM25 index and a FAISS index."""
+    shard_dir = Path(shard_dir)
+    return ((shard_dir / "rows.npy").exists() and (shard_dir / "bm25_native" / "meta.json").exists()
+            and (shard_dir / "faiss_index" / "index.faiss").exists())
+
+def load_shards(chunks: ChunkStore, shards_dir: Path = SHARDS_DIR,
+                languages: Optional[Iterable[str]] = None) -> Dict[str, LanguageShard]:
+    """
+    Open the built language shards, optionally only some languages.
+
+    Returns an empty dict when no shards are built or they were built for
+    another version of the chunk store; the caller then searches the
+    unsharded indexes.
+    """
+    meta_file = Path(shards_dir) / "meta.json"
+    if not meta_file.exists():
+        return {}
+    with open(meta_file, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('store') != store_fingerprint(chunks.store_dir):
+        print(f"Language shards in {shards_dir} were built for another chunk store; rebuild them with "
+              f"`python -m src.index_bm25 --shards` and `python -m src.index_faiss --shards`")
+        return {}
+
+    wanted = sorted(meta['languages'] if languages is None else languages)
+    shards = {}
+    for language in wanted:
+        if language in meta['languages'] and is_built(Path(shards_dir) / language):
+            shards[language] = LanguageShard(language, Path(shards_dir) / language)
+        else:
+            print(f"No complete shard for language {language!r} in {shards_dir}; not serving it")
+    return shards
+
+def merge_candidates(parts: List[Tuple[np.ndarray, np.ndarray]], limit: int,
+                     normalize: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merge (rows, scores) lists from several shards into the top `limit` by score (ties broken by row).
+
+    Scores that are not comparable across shards, such as BM25 scores (each
+    shard has its own IDF and document lengths), should be merged with
+    normalize=True: each shard's scores are then divided by its best score.
+    """
+    if len(parts) == 1:
+        rows, scores = parts[0]
+        return rows[:limit], scores[:limit]
+    if not parts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    rows = np.concatenate([p[0] for p in parts]).astype(np.int64)
+    if normalize:
+        parts = [(part_rows, part_scores / part_scores.max() if len(part_scores) and part_scores.max() > 0
+                  else part_scores) for part_rows, part_scores in parts]
+    scores = np.concatenate([p[1] for p in parts]).astype(np.float32)
+    order = np.lexsort((rows, -scores))[:limit]
+    return rows[order], scores[order]
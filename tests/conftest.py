@@ -0,0 +1,117 @@
+import hashlib
+import re
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from src.chunk_store import write_chunk_store
+
+TOPICS = {
+    'tokenizer': "load a tokenizer with AutoTokenizer and pad or truncate the batch of token ids",
+    'pipeline': "run inference with a pipeline for text classification or question answering",
+    'trainer': "fine tune a pretrained model with the Trainer and training arguments on your dataset",
+    'quantization': "quantize model weights to int8 or 4 bit to reduce memory at inference time",
+    'generation': "generate text with a language model using beam search sampling and a generation config",
+    'peft': "train adapters with LoRA so only a small number of parameters are updated",
+}
+SOURCES = ("source/en/quicktour.md", "source/en/model_doc/bert.md", "source/en/tasks/summarization.md",
+           "source/en/main_classes/trainer.md")
+
+def make_records(num_chunks: int = 48):
+    """Deterministic chunk records cycling through topics and source files."""
+    records = []
+    topics = list(TOPICS.items())
+    for i in range(num_chunks):
+        topic, text = topics[i % len(topics)]
+        source = SOURCES[(i // len(topics)) % len(SOURCES)]
+        content = f"{text}. Section {i} covers {topic} details and common {topic} errors."
+        if i % 3 == 0:
+            content += f"\n\n```python\nfrom transformers import {topic}_{i}\n```"
+        records.append({'id': f"{source}_{i}", 'source_file': source, 'content': content,
+                        'heading_path': f"{topic.title()} > Part {i}", 'chunk_index': i,
+                        'word_count': len(content.split()), 'token_count': len(content.split())})
+    return records
+
+def _words(text: str):
+    return re.findall(r"\w+", text.lower())
+
+class FakeEmbedder:
+    """Hashed bag-of-words embeddings standing in for the sentence transformer."""
+
+    dim = 64
+
+    def encode(self, texts, convert_to_numpy=True, normalize_embeddings=True, **kwargs):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in _words(text):
+                h = int(hashlib.md5(word.encode('utf-8')).hexdigest(), 16)
+                vectors[i, h % self.dim] += 1.0 if (h >> 20) & 1 else -1.0
+        if normalize_embeddings:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.where(norms > 0, norms, 1.0)
+        return vectors
+
+class FakeCrossEncoder:
+    """Word-overlap relevance standing in for the cross-encoder; counts the pairs it scores."""
+
+    def __init__(self):
+        self.pairs_scored = 0
+
+    def predict(self, pairs, batch_size=32, **kwargs):
+        self.pairs_scored += len(pairs)
+        scores = []
+        for query, passage in pairs:
+            query_words, passage_words = set(_words(query)), _words(passage)
+            overlap = sum(1 for w in passage_words if w in query_words)
+            # A small content hash keeps scores distinct
+            tiebreak = int(hashlib.md5(passage.encode('utf-8')).hexdigest()[:6], 16) / 16 ** 6 * 1e-3
+            scores.append(overlap / (1 + len(passage_words)) ** 0.5 + tiebreak)
+        return np.asarray(scores, dtype=np.float32)
+
+@pytest.fixture
+def store_dir(tmp_path) -> Path:
+    """A chunk store of make_records()."""
+    store_dir = tmp_path / "chunk_store"
+    write_chunk_store(make_records(), store_dir)
+    return store_dir
+
+@pytest.fixture
+def index_dirs(tmp_path, store_dir):
+    """Chunk store, native BM25 and flat FAISS index over make_records(), keyed like Retriever's arguments."""
+    import faiss
+
+    from src.bm25_native import build_native_bm25_index
+    from src.chunk_store import ChunkStore, chunk_key
+    from src.index_faiss import create_faiss_index
+
+    chunks = ChunkStore(store_dir)
+    rows = np.arange(len(chunks), dtype=np.int64)
+    build_native_bm25_index(store_dir, tmp_path / "bm25_native", rows=rows)
+    faiss_dir = tmp_path / "faiss_index"
+    faiss_dir.mkdir()
+    embeddings = FakeEmbedder().encode([chunks.content(row) for row in rows])
+    keys = np.asarray([chunk_key(chunks.get('id', int(row))) for row in rows], dtype=np.int64)
+    faiss.write_index(create_faiss_index(embeddings, keys), str(faiss_dir / "index.faiss"))
+    return {
+        'chunk_store_dir': store_dir,
+        'bm25_native_dir': tmp_path / "bm25_native",
+        'bm25_index_dir': tmp_path / "bm25_index",
+        'faiss_index_dir': faiss_dir,
+        'features_dir': tmp_path / "features",
+        'dedup_dir': tmp_path / "dedup",
+        'shards_dir': tmp_path / "shards",
+    }
+
+@pytest.fixture
+def make_retriever(index_dirs):
+    """Factory for Retrievers over index_dirs with fake models (and no bundles unless bundles_dir is given)."""
+    from src.retriever import Retriever
+
+    def make(**kwargs):
+        retriever = Retriever(**{'bundles_dir': None, 'bm25_backend': "native", 'model_batching': False,
+                                 **index_dirs, **kwargs})
+        retriever._models.update(embed_model=FakeEmbedder(), reranker=FakeCrossEncoder())
+        return retriever
+
+    return make
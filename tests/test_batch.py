@@ -0,0 +1,36 @@
+import pytest
+
+from src.retriever import RERANK_DEPTH, RERANK_STEP_SIZE
+
+# Every query reaches the cross-encoder
+NO_CACHES = {'result_cache_size': 0, 'semantic_cache_size': 0, 'rerank_cache_size': 0}
+
+QUERIES = [
+    "load a tokenizer and pad the batch",
+    "fine tune a model with the Trainer",
+    "quantize weights to int8",
+    "generate text with beam search",
+    "train LoRA adapters",
+    "text classification pipeline",
+]
+
+def ranking(results):
+    return [(r['id'], round(r['score'], 5)) for r in results]
+
+@pytest.mark.parametrize("rerank_budget_ms", [None, 0.0, 1e9])
+def test_batch_matches_single_queries(make_retriever, rerank_budget_ms):
+    single = make_retriever(rerank_budget_ms=rerank_budget_ms, **NO_CACHES)
+    batch = make_retriever(rerank_budget_ms=rerank_budget_ms, **NO_CACHES)
+    expected = [ranking(single.retrieve(query, top_k=5)) for query in QUERIES]
+    assert [ranking(results) for results in batch.retrieve_batch(QUERIES, top_k=5)] == expected
+    assert batch.reranker.pairs_scored == single.reranker.pairs_scored
+
+def test_zero_budget_scores_one_step_per_query(make_retriever):
+    retriever = make_retriever(rerank_budget_ms=0.0, **NO_CACHES)
+    retriever.retrieve_batch(QUERIES, top_k=5)
+    assert retriever.reranker.pairs_scored == len(QUERIES) * RERANK_STEP_SIZE
+
+def test_unbudgeted_batch_scores_every_pair(make_retriever):
+    retriever = make_retriever(**NO_CACHES)
+    retriever.retrieve_batch(QUERIES, top_k=5)
+    assert retriever.reranker.pairs_scored == len(QUERIES) * RERANK_DEPTH
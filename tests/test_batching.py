@@ -0,0 +1,106 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from src.batching import BatchedCrossEncoder, BatchedEncoder, BatchScheduler
+
+from conftest import FakeCrossEncoder, FakeEmbedder
+
+def wait_for(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+class GatedFn:
+    """Batch function whose first call blocks until released, so later submissions queue up behind it."""
+
+    def __init__(self, fail_on=None):
+        self.calls = []
+        self.release = threading.Event()
+        self.fail_on = fail_on
+
+    def __call__(self, items):
+        self.calls.append(list(items))
+        if len(self.calls) == 1:
+            self.release.wait(10)
+        if self.fail_on in items:
+            raise ValueError(f"cannot process {self.fail_on}")
+        return [item * 10 for item in items]
+
+def submit_in_order(scheduler, fn, submissions):
+    """
+    Submit each list from its own thread, in order: once the previous one is
+    queued, and the rest only once fn is running the first. Returns the
+    threads and the outcomes (results or exceptions) by index.
+    """
+    outcomes = {}
+
+    def submit(i, items):
+        try:
+            outcomes[i] = scheduler.submit(items)
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = []
+    for i, items in enumerate(submissions):
+        queued = scheduler.requests
+        threads.append(threading.Thread(target=submit, args=(i, items)))
+        threads[-1].start()
+        wait_for(lambda: scheduler.requests > queued)
+        if i == 0:
+            wait_for(lambda: fn.calls)
+    return threads, outcomes
+
+def test_queued_submissions_share_a_batch():
+    fn = GatedFn()
+    scheduler = BatchScheduler(fn, max_batch_size=16, max_wait_ms=50.0)
+    threads, outcomes = submit_in_order(scheduler, fn, [[0], [1, 2], [3], [4, 5, 6]])
+    fn.release.set()
+    for thread in threads:
+        thread.join(10)
+    assert fn.calls == [[0], [1, 2, 3, 4, 5, 6]]
+    assert outcomes == {0: [0], 1: [10, 20], 2: [30], 3: [40, 50, 60]}
+    stats = scheduler.stats()
+    assert (stats['requests'], stats['batches']) == (4, 2)
+
+def test_batches_respect_max_batch_size():
+    fn = GatedFn()
+    scheduler = BatchScheduler(fn, max_batch_size=4, max_wait_ms=50.0)
+    threads, outcomes = submit_in_order(scheduler, fn, [[0], [1, 2], [3], [4, 5, 6]])
+    fn.release.set()
+    for thread in threads:
+        thread.join(10)
+    # A caller's items are never split across batches
+    assert fn.calls == [[0], [1, 2, 3], [4, 5, 6]]
+    assert outcomes[3] == [40, 50, 60]
+
+def test_error_reaches_every_caller_in_the_batch():
+    fn = GatedFn(fail_on=2)
+    scheduler = BatchScheduler(fn, max_batch_size=16, max_wait_ms=50.0)
+    threads, outcomes = submit_in_order(scheduler, fn, [[0], [1], [2]])
+    fn.release.set()
+    for thread in threads:
+        thread.join(10)
+    assert outcomes[0] == [0]
+    assert isinstance(outcomes[1], ValueError) and outcomes[1] is outcomes[2]
+    # The worker keeps serving after a failed batch
+    assert scheduler.submit([3]) == [30]
+
+def test_empty_submission_skips_the_queue():
+    scheduler = BatchScheduler(lambda items: list(items))
+    assert scheduler.submit([]) == []
+    assert scheduler.stats()['requests'] == 0
+
+def test_model_proxies_match_the_models():
+    texts = ["load a tokenizer", "train LoRA adapters"]
+    pairs = [(text, "pad the batch of token ids") for text in texts]
+    encoder = BatchedEncoder(FakeEmbedder(), max_wait_ms=0.0)
+    reranker = BatchedCrossEncoder(FakeCrossEncoder(), max_wait_ms=0.0)
+    np.testing.assert_array_equal(encoder.encode(texts), FakeEmbedder().encode(texts))
+    np.testing.assert_array_equal(reranker.predict(pairs), FakeCrossEncoder().predict(pairs))
+    # Other attributes pass through to the model
+    assert encoder.dim == FakeEmbedder.dim
+    assert reranker.pairs_scored == len(pairs)
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from conftest import make_records
+from src.bm25_native import NativeBM25, analyze, build_native_bm25_index
+
+QUERIES = ["tokenizer", "load a tokenizer and pad the batch", "Trainer training arguments", "quantize int8 memory",
+           "LoRA adapters parameters", "beam search generation config", "pipeline question answering", "errors"]
+
+@pytest.fixture
+def whoosh_index(tmp_path, store_dir):
+    """A Whoosh index over the same chunks, built with the src.index_bm25 schema."""
+    from whoosh.index import create_in
+
+    from src.index_bm25 import create_schema
+
+    (tmp_path / "whoosh").mkdir()
+    ix = create_in(str(tmp_path / "whoosh"), create_schema())
+    writer = ix.writer()
+    for record in make_records():
+        writer.add_document(id=record['id'], content=record['content'], source_file=record['source_file'],
+                            chunk_index=record['chunk_index'], word_count=record['word_count'])
+    writer.commit()
+    return ix
+
+@pytest.fixture
+def native(tmp_path, store_dir):
+    return NativeBM25(build_native_bm25_index(store_dir, tmp_path / "bm25_native",
+                                              rows=np.arange(len(make_records()))))
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_scores_match_whoosh_bm25f(whoosh_index, native, query):
+    from whoosh import scoring
+    from whoosh.qparser import QueryParser
+
+    ids = [record['id'] for record in make_records()]
+    with whoosh_index.searcher(weighting=scoring.BM25F()) as searcher:
+        hits = searcher.search(QueryParser("content", whoosh_index.schema).parse(query), limit=None)
+        expected = {hit['id']: hit.score for hit in hits}
+    rows, scores = native.search(query, limit=len(ids))
+    assert {ids[row]: pytest.approx(float(score), rel=1e-4) for row, score in zip(rows, scores)} == expected
+
+def test_analyzer_matches_whoosh():
+    from whoosh.analysis import StandardAnalyzer
+
+    text = "Load the AutoTokenizer, e.g. model.generate() with 4-bit LoRA; a b C-3PO tbd X"
+    assert analyze(text) == [token.text for token in StandardAnalyzer()(text)]
+
+@pytest.mark.parametrize("limit", [1, 3, 10])
+def test_or_pruning_is_exact(native, limit):
+    for query in QUERIES:
+        term_ids, weights = np.unique([native.vocab[t] for t in analyze(query) if t in native.vocab],
+                                      return_counts=True)
+        everything = np.unique(np.concatenate([native._postings(t)[0] for t in term_ids]))
+        expected = native._top(everything, native._score(everything, term_ids, weights.astype(np.float32)), limit)
+        rows, scores = native.search(query, limit, operator="or")
+        assert rows.tolist() == expected[0].tolist()
+        assert scores.tolist() == pytest.approx(expected[1].tolist())
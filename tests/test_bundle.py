@@ -0,0 +1,127 @@
+import os
+import time
+
+import pytest
+
+import src.retriever as retriever_module
+from conftest import make_records
+from src.bm25_native import build_native_bm25_index
+from src.bundle import (activate_bundle, build_bundle, bundle_paths, current_version, list_bundles,
+                        prune_bundles, verify_bundle)
+from src.chunk_store import ChunkStore, write_chunk_store
+
+@pytest.fixture
+def staging_dirs(index_dirs):
+    """index_dirs keyed like src.bundle.STAGING_DIRS."""
+    return {name: index_dirs[f"{name}_dir"] for name in ("chunk_store", "bm25_index", "bm25_native", "faiss_index",
+                                                         "features", "dedup", "shards")}
+
+def build_versions(bundles_dir, staging_dirs, count: int):
+    """Build `count` bundles, each from a different chunk store."""
+    versions = []
+    for i in range(count):
+        write_chunk_store(make_records(10 + i), staging_dirs['chunk_store'])
+        versions.append(build_bundle(bundles_dir, staging_dirs))
+    return versions
+
+def age(path, seconds: float):
+    os.utime(path, (time.time() - seconds, time.time() - seconds))
+
+def test_build_and_verify(tmp_path, staging_dirs):
+    version = build_bundle(tmp_path / "bundles", staging_dirs)
+    manifest = list_bundles(tmp_path / "bundles")[0]
+    assert manifest['version'] == version
+    assert manifest['components'] == ["chunk_store", "bm25_native", "faiss_index"]
+    assert not list((tmp_path / "bundles").glob("*.tmp"))
+    verify_bundle(version, tmp_path / "bundles")
+    assert len(ChunkStore(bundle_paths(tmp_path / "bundles" / version).chunk_store)) == len(make_records())
+
+def test_verify_detects_changed_files(tmp_path, staging_dirs):
+    bundles_dir = tmp_path / "bundles"
+    version = build_bundle(bundles_dir, staging_dirs)
+    meta = bundles_dir / version / "chunk_store" / "meta.json"
+    meta.write_text(meta.read_text() + " ")
+    with pytest.raises(ValueError, match="chunk_store/meta.json"):
+        verify_bundle(version, bundles_dir)
+    with pytest.raises(ValueError):
+        activate_bundle(version, bundles_dir)
+    assert current_version(bundles_dir) is None
+
+def test_verify_detects_extra_files(tmp_path, staging_dirs):
+    bundles_dir = tmp_path / "bundles"
+    version = build_bundle(bundles_dir, staging_dirs)
+    (bundles_dir / version / "faiss_index" / "extra.bin").write_bytes(b"x")
+    with pytest.raises(ValueError, match="extra.bin"):
+        verify_bundle(version, bundles_dir)
+
+def test_activate(tmp_path, staging_dirs):
+    bundles_dir = tmp_path / "bundles"
+    first, second = build_versions(bundles_dir, staging_dirs, 2)
+    activate_bundle(first, bundles_dir)
+    activate_bundle(second, bundles_dir)
+    assert current_version(bundles_dir) == second
+    with pytest.raises(FileNotFoundError):
+        activate_bundle("missing", bundles_dir, verify=False)
+    assert current_version(bundles_dir) == second
+    assert not (bundles_dir / "current.tmp").exists()
+
+def test_prune_keeps_current_and_newest(tmp_path, staging_dirs):
+    bundles_dir = tmp_path / "bundles"
+    versions = build_versions(bundles_dir, staging_dirs, 4)
+    activate_bundle(versions[1], bundles_dir)
+    (bundles_dir / "leftover.tmp").mkdir()
+    for path in bundles_dir.iterdir():
+        age(path, 3600)
+    assert prune_bundles(1, bundles_dir) == [versions[0], versions[2]]
+    assert [m['version'] for m in list_bundles(bundles_dir)] == [versions[1], versions[3]]
+    assert not (bundles_dir / "leftover.tmp").exists()
+
+def test_prune_skips_recent_bundles(tmp_path, staging_dirs):
+    bundles_dir = tmp_path / "bundles"
+    versions = build_versions(bundles_dir, staging_dirs, 3)
+    (bundles_dir / "building.tmp").mkdir()
+    # Freshly built bundles and builds in progress are never pruned
+    assert prune_bundles(0, bundles_dir) == []
+    assert (bundles_dir / "building.tmp").exists()
+
+    for version in versions:
+        age(bundles_dir / version, 3600)
+    activate_bundle(versions[0], bundles_dir)
+    activate_bundle(versions[2], bundles_dir)
+    # versions[0] was current until now; a retriever may still be loading it
+    assert prune_bundles(0, bundles_dir) == [versions[1]]
+    assert prune_bundles(0, bundles_dir, grace=0) == [versions[0]]
+
+def test_retriever_swaps_in_activated_bundle(tmp_path, staging_dirs, make_retriever, monkeypatch):
+    monkeypatch.setattr(retriever_module, "VERSION_CHECK_INTERVAL", 0.0)
+    bundles_dir = tmp_path / "bundles"
+    first = build_bundle(bundles_dir, staging_dirs)
+    activate_bundle(first, bundles_dir)
+    retriever = make_retriever(bundles_dir=bundles_dir)
+    assert retriever.snapshot.version == first
+    assert retriever.retrieve("load a tokenizer")
+
+    # A bundle whose chunk store holds only the first ten records; FAISS hits on the others map to no row
+    write_chunk_store(make_records(10), staging_dirs['chunk_store'])
+    build_native_bm25_index(staging_dirs['chunk_store'], staging_dirs['bm25_native'])
+    second = build_bundle(bundles_dir, staging_dirs)
+    activate_bundle(second, bundles_dir)
+    retriever.retrieve("load a tokenizer")
+    deadline = time.monotonic() + 10
+    while retriever.snapshot.version != second:
+        assert time.monotonic() < deadline, "bundle not swapped in"
+        time.sleep(0.01)
+    assert len(retriever.chunk_store) == 10
+
+def test_concurrent_builds_keep_their_own_staging(tmp_path, staging_dirs):
+    bundles_dir = tmp_path / "bundles"
+    bundles_dir.mkdir()
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    # Another build's work in progress, with its manifest already written
+    other = bundles_dir / f"{stamp}.tmp"
+    other.mkdir()
+    (other / "manifest.json").write_text('{"version": "other", "created": 0}')
+    first = build_bundle(bundles_dir, staging_dirs)
+    assert (other / "manifest.json").exists()
+    assert [m['version'] for m in list_bundles(bundles_dir)] == [first]
+    assert sorted(p.name for p in bundles_dir.iterdir()) == sorted([first, other.name])
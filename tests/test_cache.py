@@ -0,0 +1,92 @@
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import src.cache as cache_module
+import src.retriever as retriever_module
+from src.cache import TTLCache, normalize_query
+
+QUERY = "load a tokenizer and pad the batch"
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A manual clock for src.cache: advance it with clock.now += seconds."""
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+def wait_for(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_normalize_query():
+    assert normalize_query("  Load a\tTokenizer \n") == "load a tokenizer"
+    assert normalize_query("café") == normalize_query("café")
+
+def test_lru_eviction():
+    cache = TTLCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['hits'] == 3 and cache.stats()['misses'] == 1
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache(maxsize=8, ttl=10.0)
+    cache.put("a", 1)
+    clock.now += 9.0
+    assert cache.get("a") == 1
+    clock.now += 1.0
+    assert cache.get("a", "expired") == "expired"
+    assert len(cache) == 0 and cache.stats()['evictions'] == 1
+
+def test_disabled_cache_stores_nothing():
+    cache = TTLCache(maxsize=0)
+    cache.put("a", 1)
+    assert len(cache) == 0 and cache.get("a") is None
+
+def test_repeat_query_is_served_from_cache(make_retriever):
+    retriever = make_retriever()
+    expected = retriever.retrieve(QUERY, top_k=3)
+    scored = retriever.reranker.pairs_scored
+    assert retriever.retrieve("  LOAD a tokenizer and pad the batch ", top_k=3) == expected
+    assert retriever.reranker.pairs_scored == scored
+    assert retriever.cache_stats()['results']['hits'] == 1
+    # Different settings are a different entry
+    retriever.retrieve(QUERY, top_k=3, alpha=0.2)
+    assert retriever.cache_stats()['results']['misses'] == 2
+
+def test_result_cache_expires(make_retriever, clock):
+    retriever = make_retriever(result_cache_ttl=60.0, semantic_cache_size=0)
+    retriever.retrieve(QUERY)
+    clock.now += 59.0
+    retriever.retrieve(QUERY)
+    clock.now += 2.0
+    retriever.retrieve(QUERY)
+    stats = retriever.cache_stats()['results']
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 2, 1)
+
+def test_index_version_change_clears_results(make_retriever, index_dirs, monkeypatch):
+    monkeypatch.setattr(retriever_module, "VERSION_CHECK_INTERVAL", 0.0)
+    retriever = make_retriever()
+    retriever.retrieve(QUERY)
+    served = retriever._snapshot
+    assert len(retriever.result_cache) == 1
+    path = index_dirs['faiss_index_dir'] / "index.faiss"
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    retriever.retrieve("fine tune a model with the Trainer")
+    wait_for(lambda: retriever._snapshot is not served)
+    wait_for(lambda: len(retriever.result_cache) == 0)
+    # Query embeddings do not depend on the index and are kept
+    assert len(retriever.query_embedding_cache) == 2
+    scored = retriever.reranker.pairs_scored
+    retriever.retrieve(QUERY)
+    assert retriever.reranker.pairs_scored > scored
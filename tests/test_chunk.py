@@ -0,0 +1,62 @@
+import re
+
+import pytest
+
+from src import chunk
+from src.chunk import chunk_markdown, configure_chunker, split_markdown_blocks
+
+@pytest.fixture(autouse=True)
+def word_tokenizer(tmp_path):
+    """Chunk with a whitespace/punctuation word tokenizer (one token per word), then restore the config."""
+    from tokenizers import Tokenizer
+    from tokenizers.models import WordLevel
+    from tokenizers.pre_tokenizers import WhitespaceSplit
+
+    tokenizer = Tokenizer(WordLevel({"[UNK]": 0}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = WhitespaceSplit()
+    path = tmp_path / "tokenizer.json"
+    tokenizer.save(str(path))
+    saved = (chunk._tokenizer_name, chunk._max_tokens)
+    configure_chunker(str(path), 40)
+    yield
+    configure_chunker(*saved)
+
+def words(n: int, prefix: str = "w") -> str:
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+def ends_on_heading(content: str) -> bool:
+    return bool(re.match(r"#{1,6}\s", content.split("\n\n")[-1]))
+
+def test_blocks_keep_heading_paths():
+    blocks = split_markdown_blocks("# Title\n\nintro\n\n## Setup\n\n```bash\n# not a heading\n```")
+    assert [(path, kind) for path, kind, _ in blocks] == [
+        (("Title",), "heading"), (("Title",), "text"), (("Title", "Setup"), "heading"), (("Title", "Setup"), "code")]
+
+def test_chunks_stay_within_budget():
+    text = "\n\n".join(f"## Section {i}\n\n{words(25, f's{i}_')}" for i in range(6))
+    chunks = chunk_markdown(text)
+    assert all(c['token_count'] <= 40 for c in chunks)
+    assert " ".join(c['content'] for c in chunks).split() == text.split()
+
+def test_headings_are_carried_to_the_block_they_introduce():
+    # The second section's heading does not fit after the first section's text
+    text = f"# Guide\n\n{words(30, 'a')}\n\n## Install\n\n{words(20, 'b')}"
+    chunks = chunk_markdown(text, min_tokens=100)
+    assert [c['content'].split("\n\n")[0] for c in chunks] == ["# Guide", "## Install"]
+    assert chunks[1]['heading_path'] == "Guide > Install"
+    assert not any(ends_on_heading(c['content']) for c in chunks)
+
+def test_block_too_long_for_its_headings_is_split_behind_them():
+    # Heading (3 tokens) + 38-token paragraph exceeds the 40-token budget, though the paragraph fits alone
+    text = f"# Guide\n\n{words(30, 'a')}\n\n## Install steps\n\n{words(38, 'b')}"
+    chunks = chunk_markdown(text, min_tokens=100)
+    assert not any(ends_on_heading(c['content']) for c in chunks)
+    assert not any(c['content'].startswith("#") and len(c['content'].split("\n\n")) == 1 for c in chunks)
+    install = next(c for c in chunks if c['content'].startswith("## Install steps"))
+    assert install['token_count'] == 40
+    assert " ".join(c['content'] for c in chunks).split() == text.split()
+
+def test_headings_alone_when_nothing_fits_behind_them():
+    heading = "# " + words(39, 'h')
+    chunks = chunk_markdown(f"{heading}\n\n{words(10, 'a')}")
+    assert [c['content'] for c in chunks] == [heading, words(10, 'a')]
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from conftest import make_records
+from src.chunk_store import ChunkStore, ChunkStoreWriter, chunk_key, replace_dir, write_chunk_store
+
+def test_round_trip(store_dir):
+    records = make_records()
+    store = ChunkStore(store_dir)
+    assert len(store) == len(records)
+    assert list(store.iter_records()) == records
+    assert store.get('token_count', 5) == records[5]['token_count']
+    assert bytes(store.view('content', 3)) == records[3]['content'].encode('utf-8')
+
+def test_rows_for_keys(store_dir):
+    records = make_records()
+    store = ChunkStore(store_dir)
+    keys = [chunk_key(records[row]['id']) for row in (7, 0, 41)] + [chunk_key("missing.md_0")]
+    assert store.rows_for_keys(keys).tolist() == [7, 0, 41, -1]
+    assert store.rows_for_keys(np.zeros((2, 3), dtype=np.int64)).shape == (2, 3)
+    assert store.row_of(records[12]['id']) == 12
+    assert store.row_of("missing.md_0") is None
+
+def test_missing_columns_get_defaults(tmp_path):
+    record = {'id': "a.md_0", 'source_file': "a.md", 'content': "text ünïcode", 'chunk_index': 0, 'word_count': 2}
+    write_chunk_store([record], tmp_path / "store")
+    assert ChunkStore(tmp_path / "store").record(0) == {**record, 'heading_path': "", 'token_count': 0}
+
+def test_rewrite_replaces_the_store(store_dir):
+    write_chunk_store(make_records(5), store_dir)
+    store = ChunkStore(store_dir)
+    assert len(store) == 5
+    assert not store_dir.with_name(store_dir.name + ".tmp").exists()
+    assert store.rows_for_keys([chunk_key(make_records()[20]['id'])]).tolist() == [-1]
+
+def test_failed_write_keeps_the_old_store(store_dir):
+    with pytest.raises(RuntimeError):
+        with ChunkStoreWriter(store_dir) as writer:
+            writer.add(make_records(1)[0])
+            raise RuntimeError("interrupted")
+    assert len(ChunkStore(store_dir)) == len(make_records())
+    assert not store_dir.with_name(store_dir.name + ".tmp").exists()
+
+def test_empty_store(tmp_path):
+    write_chunk_store([], tmp_path / "store")
+    store = ChunkStore(tmp_path / "store")
+    assert len(store) == 0
+    assert store.rows_for_keys([1, 2]).tolist() == [-1, -1]
+
+def test_replace_dir(tmp_path):
+    target, new = tmp_path / "index", tmp_path / "index.tmp"
+    target.mkdir()
+    (target / "stale.npy").write_bytes(b"old")
+    new.mkdir()
+    (new / "meta.json").write_text("{}")
+    assert replace_dir(new, target) == target
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["index"]
+    assert [p.name for p in target.iterdir()] == ["meta.json"]
@@ -0,0 +1,81 @@
+import json
+
+import numpy as np
+import pytest
+
+from src.chunk_store import ChunkStore, write_chunk_store
+from src.dedup import (ChunkDedup, build_dedup, dedup_stats, duplicate_ids, find_duplicates, indexed_rows,
+                       minhash_signature)
+
+TEXT = ("The tokenizer splits raw text into tokens and maps them to ids. Padding makes every sequence in the "
+        "batch the same length, and truncation cuts sequences longer than the model accepts. Attention masks "
+        "tell the model which tokens are padding, so they are ignored when the outputs are computed.")
+OTHER = ("Quantization stores model weights as int8 or 4 bit values to cut memory use at inference time. "
+         "Calibration data picks the scale of each layer, and some layers are kept in half precision.")
+
+def record(i, source, content):
+    return {'id': f"{source}_{i}", 'source_file': source, 'content': content, 'chunk_index': i,
+            'word_count': len(content.split()), 'token_count': len(content.split())}
+
+@pytest.fixture
+def chunks(tmp_path):
+    """Rows 1, 3 and 4 near-duplicate row 0 (row 3 in another language); row 5 is empty."""
+    records = [
+        record(0, "source/en/preprocessing.md", TEXT),
+        record(1, "source/en/tokenizer_summary.md", TEXT.replace("computed", "returned")),
+        record(2, "source/en/quantization.md", OTHER),
+        record(3, "source/de/preprocessing.md", TEXT),
+        record(4, "source/en/pad_truncation.md", TEXT + " See the padding guide."),
+        record(5, "source/en/empty.md", ""),
+    ]
+    write_chunk_store(records, tmp_path / "chunk_store")
+    return ChunkStore(tmp_path / "chunk_store")
+
+def test_signature_agreement_estimates_jaccard():
+    same = (minhash_signature(TEXT) == minhash_signature(TEXT.upper())).mean()
+    near = (minhash_signature(TEXT) == minhash_signature(TEXT + " See the padding guide.")).mean()
+    different = (minhash_signature(TEXT) == minhash_signature(OTHER)).mean()
+    assert same == 1.0
+    assert 0.8 <= near < 1.0
+    assert different < 0.1
+
+def test_near_duplicates_collapse_within_a_language(chunks):
+    assert find_duplicates(chunks).tolist() == [0, 0, 2, 3, 0, 5]
+
+def test_scope_all_collapses_translations(chunks):
+    assert find_duplicates(chunks, scope="all").tolist() == [0, 0, 2, 0, 0, 5]
+
+def test_threshold_and_scope(chunks):
+    assert find_duplicates(chunks, threshold=1.01).tolist() == list(range(6))
+    with pytest.raises(ValueError):
+        find_duplicates(chunks, scope="everything")
+
+def test_stats(chunks):
+    stats = dedup_stats(chunks, find_duplicates(chunks, scope="all"))
+    assert (stats['num_duplicates'], stats['num_indexed'], stats['num_clusters']) == (3, 3, 1)
+    assert stats['duplicates_by_language'] == {'de': 1, 'en': 2}
+    assert stats['duplicate_tokens'] == sum(chunks.get('token_count', row) for row in (1, 3, 4))
+
+def test_build_and_load(chunks, tmp_path):
+    dedup_dir = tmp_path / "dedup"
+    build_dedup(chunks.store_dir, dedup_dir)
+    dedup = ChunkDedup(chunks, dedup_dir)
+    assert dedup.indexed_rows().tolist() == [0, 2, 3, 5]
+    assert dedup.duplicate_rows().tolist() == [1, 4]
+    assert dedup.aliases(0).tolist() == [1, 4]
+    assert dedup.aliases(2).tolist() == []
+    assert indexed_rows(chunks, dedup_dir).tolist() == [0, 2, 3, 5]
+    assert duplicate_ids(chunks, dedup_dir) == {chunks.get('id', 1), chunks.get('id', 4)}
+
+def test_missing_dedup_keeps_every_row(chunks, tmp_path):
+    assert ChunkDedup(chunks, tmp_path / "dedup").indexed_rows().tolist() == list(range(6))
+
+def test_stale_dedup_is_recomputed(chunks, tmp_path):
+    dedup_dir = tmp_path / "dedup"
+    build_dedup(chunks.store_dir, dedup_dir, scope="all")
+    meta = json.loads((dedup_dir / "meta.json").read_text())
+    meta['store'] = "another store"
+    (dedup_dir / "meta.json").write_text(json.dumps(meta))
+    # A stale canonical.npy must not be used
+    np.save(dedup_dir / "canonical.npy", np.arange(len(chunks), dtype=np.int64))
+    assert ChunkDedup(chunks, dedup_dir).indexed_rows().tolist() == [0, 2, 5]
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from src.features import BOOSTS
+from src.fusion import fuse_scores, fused_score_scale
+
+def ranked_scores(num_candidates: int):
+    """Decreasing BM25 and FAISS scores for a list of candidates, best first."""
+    sparse_scores = np.linspace(25.0, 1.0, num_candidates).astype(np.float32)
+    dense_scores = np.linspace(0.9, 0.2, num_candidates).astype(np.float32)
+    return sparse_scores, dense_scores
+
+def boosted_row(retriever):
+    """A row with every default boost, and one with none."""
+    boosts = retriever._get("boosts")
+    full = sum(BOOSTS.values())
+    return int(np.flatnonzero(np.isclose(boosts, full))[0]), int(np.flatnonzero(boosts == 0)[0])
+
+@pytest.mark.parametrize("mode", ["minmax", "zscore", "rrf"])
+def test_relevant_unboosted_chunk_beats_weak_boosted_chunk(make_retriever, mode):
+    retriever = make_retriever()
+    boosted, plain = boosted_row(retriever)
+    # The unboosted chunk tops both candidate lists, the boosted one is last on both
+    others = [row for row in np.flatnonzero(retriever._get("boosts") == 0) if row != plain][:8]
+    rows = np.array([plain] + others + [boosted], dtype=np.int64)
+    sparse, dense = ranked_scores(len(rows))
+    settings = retriever.search_settings(5, 0.5, fusion=mode, sparse_depth=len(rows), dense_depth=len(rows))
+    pool = [row for row, _ in retriever._fuse_candidates((rows, sparse), (rows, dense), settings)]
+    assert pool[0] == plain
+    # The boost lifts the weak chunk past near-ties only, not into the top of the pool
+    assert pool.index(boosted) > len(pool) // 2
+
+@pytest.mark.parametrize("mode", ["minmax", "zscore", "rrf", "sum"])
+def test_boost_breaks_ties(make_retriever, mode):
+    retriever = make_retriever()
+    boosted, plain = boosted_row(retriever)
+    rows = np.array([plain, boosted], dtype=np.int64)
+    scores = np.array([1.0, 1.0], dtype=np.float32)
+    settings = retriever.search_settings(5, 0.5, fusion=mode)
+    pool = retriever._fuse_candidates((rows, scores), (rows, scores), settings)
+    assert [row for row, _ in pool] == [boosted, plain]
+
+def test_fused_scores_stay_on_the_normalized_scale(make_retriever):
+    retriever = make_retriever()
+    rows = np.arange(len(retriever.chunk_store), dtype=np.int64)
+    sparse, dense = ranked_scores(len(rows))
+    settings = retriever.search_settings(5, 0.7, fusion="minmax")
+    pool = retriever._fuse_candidates((rows, sparse), (rows, dense), settings)
+    assert max(score for _, score in pool) <= 1.0 + sum(BOOSTS.values()) + 1e-6
+
+def test_fused_score_scale():
+    assert fused_score_scale("minmax") == 1.0
+    assert fused_score_scale("rrf", depth=50, rrf_k=60) == pytest.approx(1 / 61 - 1 / 110)
+    with pytest.raises(ValueError):
+        fused_score_scale("max")
+
+def test_minmax_fusion_is_normalized_and_weighted_by_alpha():
+    sparse_rows, sparse_scores = np.array([3, 1, 2]), np.array([30.0, 20.0, 10.0])
+    dense_rows, dense_scores = np.array([2, 4]), np.array([0.8, 0.4])
+    rows, fused = fuse_scores(sparse_rows, sparse_scores, dense_rows, dense_scores, 0.25, "minmax")
+    assert rows.tolist() == [1, 2, 3, 4]
+    # sparse: 3 -> 1, 1 -> 0.5, 2 -> 0; dense: 2 -> 1, 4 -> 0; missing sides count as 0
+    assert fused.tolist() == pytest.approx([0.75 * 0.5, 0.25 * 1.0, 0.75 * 1.0, 0.0])
+    assert fused.min() >= 0.0 and fused.max() <= 1.0
+
+@pytest.mark.parametrize("mode", ["minmax", "zscore", "rrf"])
+def test_alpha_selects_one_side(mode):
+    rows = np.arange(5)
+    sparse_scores = np.array([5.0, 4.0, 3.0, 2.0, 1.0])
+    dense_scores = sparse_scores[::-1] / 10
+    for alpha, expected in ((0.0, [0, 1, 2, 3, 4]), (1.0, [4, 3, 2, 1, 0])):
+        _, fused = fuse_scores(rows, sparse_scores, rows, dense_scores, alpha, mode)
+        assert np.argsort(-fused, kind='stable').tolist() == expected
+
+def test_alpha_moves_the_rerank_pool(make_retriever):
+    retriever = make_retriever()
+    # Unboosted candidates ranked in opposite orders by BM25 and FAISS
+    rows = np.flatnonzero(retriever._get("boosts") == 0)[:20].astype(np.int64)
+    sparse, dense = ranked_scores(len(rows))
+    pools = {}
+    for alpha in (0.1, 0.9):
+        settings = retriever.search_settings(5, alpha, fusion="minmax")
+        pool = retriever._fuse_candidates((rows, sparse), (rows[::-1].copy(), dense), settings)
+        pools[alpha] = [row for row, _ in pool]
+    assert pools[0.1][:5] == rows[:5].tolist()
+    assert pools[0.9][:5] == rows[::-1][:5].tolist()
+
+def test_fused_stage_scores_are_normalized(make_retriever):
+    retriever = make_retriever()
+    stages = dict(retriever.retrieve_progressive("load a tokenizer and pad the batch", top_k=5, fusion="minmax"))
+    assert all(0.0 <= r['score'] <= 1.0 + sum(BOOSTS.values()) + 1e-6 for r in stages['fused'])
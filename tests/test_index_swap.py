@@ -0,0 +1,58 @@
+import os
+import time
+
+import pytest
+
+import src.retriever as retriever_module
+
+QUERY = "load a tokenizer and pad the batch"
+
+@pytest.fixture(autouse=True)
+def check_version_every_query(monkeypatch):
+    monkeypatch.setattr(retriever_module, "VERSION_CHECK_INTERVAL", 0.0)
+
+def touch(path):
+    """Change a file's mtime, and so the working indexes' version."""
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+def wait_for(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_changed_working_indexes_are_reloaded(make_retriever, index_dirs):
+    retriever = make_retriever()
+    retriever.retrieve(QUERY)
+    served = retriever._snapshot
+    touch(index_dirs['faiss_index_dir'] / "index.faiss")
+    retriever.retrieve(QUERY)
+    wait_for(lambda: retriever._snapshot is not served)
+    assert retriever.is_loaded("faiss")
+    assert retriever._index_version == retriever.index_version()
+
+def test_failed_swap_is_retried(make_retriever, index_dirs, monkeypatch):
+    retriever = make_retriever()
+    retriever.retrieve(QUERY)
+    served = retriever._snapshot
+    load_faiss = retriever._load_faiss
+    failures = []
+
+    def flaky_load_faiss(paths):
+        if not failures:
+            failures.append(paths)
+            raise OSError("index.faiss is being written")
+        return load_faiss(paths)
+
+    monkeypatch.setattr(retriever, "_load_faiss", flaky_load_faiss)
+    touch(index_dirs['faiss_index_dir'] / "index.faiss")
+    retriever.retrieve(QUERY)
+    wait_for(lambda: failures and retriever._loading_version is None)
+    assert retriever._snapshot is served
+    assert retriever._index_version != retriever.index_version()
+
+    # The same on-disk version is loaded again at the next check
+    retriever.retrieve(QUERY)
+    wait_for(lambda: retriever._snapshot is not served)
+    assert retriever._index_version == retriever.index_version()
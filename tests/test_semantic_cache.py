@@ -0,0 +1,109 @@
+import os
+import time
+
+import pytest
+
+import src.retriever as retriever_module
+from src.cache import SemanticCache
+
+from conftest import FakeEmbedder
+
+QUERY = "load a tokenizer and pad the batch"
+# Cosine similarity to QUERY under FakeEmbedder: 0.91 and 0.86
+PARAPHRASE = "how to load a tokenizer and pad the batch"
+NEAR_MISS = "load a tokenizer and pad the batches"
+OTHER = "fine tune a model with the Trainer"
+
+@pytest.fixture(autouse=True)
+def check_version_every_query(monkeypatch):
+    monkeypatch.setattr(retriever_module, "VERSION_CHECK_INTERVAL", 0.0)
+
+def embed(*texts):
+    return FakeEmbedder().encode(list(texts))
+
+def wait_for(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_lookup_by_similarity_and_key():
+    cache = SemanticCache(maxsize=8, threshold=0.9)
+    query, paraphrase, near_miss = embed(QUERY, PARAPHRASE, NEAR_MISS)
+    cache.put(query, "settings", ["results"])
+    assert cache.get(paraphrase, "settings") == ["results"]
+    assert cache.get(near_miss, "settings") is None
+    assert cache.get(query, "other settings") is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 2
+
+def test_lru_eviction_and_clear():
+    cache = SemanticCache(maxsize=2, threshold=0.99)
+    first, second, third = embed(QUERY, OTHER, "train LoRA adapters")
+    cache.put(first, None, 1)
+    cache.put(second, None, 2)
+    assert cache.get(first, None) == 1
+    cache.put(third, None, 3)
+    assert cache.get(second, None) is None
+    assert cache.get(first, None) == 1 and cache.get(third, None) == 3
+    assert cache.stats()['evictions'] == 1
+    cache.clear()
+    assert len(cache) == 0 and cache.get(first, None) is None
+
+def test_disabled_cache_stores_nothing():
+    cache = SemanticCache(maxsize=0)
+    cache.put(embed(QUERY)[0], None, 1)
+    assert len(cache) == 0 and cache.get(embed(QUERY)[0], None) is None
+
+def test_paraphrase_above_threshold_reuses_results(make_retriever):
+    retriever = make_retriever(result_cache_size=0, semantic_cache_threshold=0.9)
+    expected = retriever.retrieve(QUERY)
+    scored = retriever.reranker.pairs_scored
+    assert retriever.retrieve(PARAPHRASE) == expected
+    assert retriever.reranker.pairs_scored == scored
+    assert retriever.semantic_cache.stats()['hits'] == 1
+
+def test_query_below_threshold_is_computed(make_retriever):
+    retriever = make_retriever(result_cache_size=0, semantic_cache_threshold=0.9)
+    retriever.retrieve(QUERY)
+    scored = retriever.reranker.pairs_scored
+    retriever.retrieve(NEAR_MISS)
+    assert retriever.reranker.pairs_scored > scored
+    assert retriever.semantic_cache.stats()['hits'] == 0
+    assert len(retriever.semantic_cache) == 2
+
+def test_index_swap_clears_cache(make_retriever, index_dirs):
+    retriever = make_retriever(result_cache_size=0, semantic_cache_threshold=0.9)
+    retriever.retrieve(QUERY)
+    served = retriever._snapshot
+    assert len(retriever.semantic_cache) == 1
+    path = index_dirs['faiss_index_dir'] / "index.faiss"
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    retriever.retrieve(OTHER)
+    wait_for(lambda: retriever._snapshot is not served)
+    wait_for(lambda: len(retriever.semantic_cache) == 0)
+    scored = retriever.reranker.pairs_scored
+    retriever.retrieve(PARAPHRASE)
+    assert retriever.reranker.pairs_scored > scored
+
+@pytest.mark.parametrize("queries", [
+    [QUERY, PARAPHRASE, OTHER, NEAR_MISS],
+    [NEAR_MISS, QUERY, PARAPHRASE, OTHER, QUERY],
+])
+def test_batch_with_paraphrases_matches_single_queries(make_retriever, queries):
+    single = make_retriever(result_cache_size=0, semantic_cache_threshold=0.9)
+    batch = make_retriever(result_cache_size=0, semantic_cache_threshold=0.9)
+    expected = [single.retrieve(query) for query in queries]
+    assert batch.retrieve_batch(queries) == expected
+    assert batch.reranker.pairs_scored == single.reranker.pairs_scored
+    assert len(batch.semantic_cache) == len(single.semantic_cache)
+
+def test_duplicates_map_to_most_similar_earlier_query(make_retriever):
+    retriever = make_retriever(semantic_cache_threshold=0.8)
+    queries = [QUERY, NEAR_MISS, PARAPHRASE, OTHER]
+    settings = retriever.search_settings()
+    # NEAR_MISS reuses QUERY, so PARAPHRASE can only reuse QUERY as well
+    assert retriever._semantic_duplicates(queries, embed(*queries), settings) == [0, 0, 0, 3]
+    assert retriever._semantic_duplicates(queries, embed(*queries), settings, [4, 5, 6, 7]) == [4, 4, 4, 7]
+    disabled = make_retriever(semantic_cache_size=0)
+    assert disabled._semantic_duplicates(queries, embed(*queries), settings) == [0, 1, 2, 3]
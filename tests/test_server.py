@@ -0,0 +1,98 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.retriever import FUSED_STAGE, RERANKED_STAGE
+from src.server import SearchService, ServiceOverloaded
+
+QUERY = "load a tokenizer and pad the batch"
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+async def collect(service, query=QUERY, **kwargs):
+    return [stage async for stage, _ in service.search_stream(query, 3, 0.5, **kwargs)]
+
+def test_search_and_stream(make_retriever):
+    async def main():
+        service = SearchService(make_retriever(), max_batch_wait_ms=1.0)
+        await service.start()
+        try:
+            results = await service.search(QUERY, top_k=3)
+            stages = await collect(service, "fine tune with the Trainer")
+            return results, stages, service.pending
+        finally:
+            await service.stop()
+
+    results, stages, pending = run(main())
+    assert len(results) == 3
+    assert stages == [FUSED_STAGE, RERANKED_STAGE]
+    assert pending == 0
+
+def test_stream_timeout_releases_its_slot(make_retriever):
+    retriever = make_retriever()
+    release, closed = threading.Event(), threading.Event()
+
+    def slow_progressive(query, top_k, alpha, **kwargs):
+        try:
+            yield FUSED_STAGE, []
+            release.wait(10)
+            yield RERANKED_STAGE, []
+        finally:
+            closed.set()
+
+    retriever.retrieve_progressive = slow_progressive
+
+    async def main():
+        service = SearchService(retriever, request_timeout=0.1, max_pending=1)
+        await service.start()
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await collect(service)
+            pending, timeouts = service.pending, service.counters['timeouts']
+            # The slot is free again while the timed-out stage still runs
+            with pytest.raises(asyncio.TimeoutError):
+                await collect(service)
+            release.set()
+            await asyncio.get_running_loop().run_in_executor(None, closed.wait, 10)
+            return pending, timeouts
+        finally:
+            await service.stop()
+
+    pending, timeouts = run(main())
+    assert (pending, timeouts) == (0, 1)
+    assert closed.is_set()
+
+def test_overloaded_stream_is_rejected(make_retriever):
+    async def main():
+        service = SearchService(make_retriever(), max_pending=0)
+        await service.start()
+        try:
+            with pytest.raises(ServiceOverloaded):
+                await collect(service)
+            return service.pending
+        finally:
+            await service.stop()
+
+    assert run(main()) == 0
+
+def test_paraphrases_in_one_batch_share_results(make_retriever):
+    queries = [QUERY, "how to load a tokenizer and pad the batch", "fine tune with the Trainer"]
+    single = make_retriever(result_cache_size=0, semantic_cache_threshold=0.9)
+    expected = [single.retrieve(query, top_k=3, alpha=0.5) for query in queries]
+    retriever = make_retriever(result_cache_size=0, semantic_cache_threshold=0.9)
+
+    async def main():
+        service = SearchService(retriever, max_batch_wait_ms=50.0)
+        await service.start()
+        try:
+            results = await asyncio.gather(*(service.search(query, top_k=3, alpha=0.5) for query in queries))
+            return results, service.counters['batches']
+        finally:
+            await service.stop()
+
+    results, batches = run(main())
+    assert batches == 1
+    assert results == expected
+    assert retriever.reranker.pairs_scored == single.reranker.pairs_scored
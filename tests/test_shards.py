@@ -0,0 +1,25 @@
+import numpy as np
+
+from src.shards import merge_candidates
+
+def part(rows, scores):
+    return np.asarray(rows, dtype=np.int64), np.asarray(scores, dtype=np.float32)
+
+def test_merge_orders_by_score_and_breaks_ties_by_row():
+    rows, scores = merge_candidates([part([5, 1], [0.9, 0.5]), part([3, 0], [0.9, 0.7])], 3)
+    assert rows.tolist() == [3, 5, 0]
+    assert scores.tolist() == [np.float32(0.9), np.float32(0.9), np.float32(0.7)]
+
+def test_normalized_merge_compares_shards_by_their_best_hit():
+    # A small shard's BM25 scores run much higher than a large shard's
+    small, large = part([10, 11], [40.0, 20.0]), part([1, 2, 3], [8.0, 7.5, 2.0])
+    assert merge_candidates([small, large], 3)[0].tolist() == [10, 11, 1]
+    rows, scores = merge_candidates([small, large], 3, normalize=True)
+    assert rows.tolist() == [1, 10, 2]
+    assert scores.max() == 1.0
+
+def test_merge_single_and_empty():
+    rows, scores = merge_candidates([part([4, 2, 7], [3.0, 2.0, 1.0])], 2)
+    assert rows.tolist() == [4, 2]
+    assert len(merge_candidates([], 5)[0]) == 0
+    assert merge_candidates([part([], []), part([1], [2.0])], 5, normalize=True)[0].tolist() == [1]